@@ -0,0 +1,66 @@
+import asyncio
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.config import get_settings
+from app.profiler import Profile, ProfilerBusy
+
+router = APIRouter(prefix="/debug", tags=["debug"], include_in_schema=False)
+
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)) -> None:
+    """Allow the request only with the configured debug token."""
+    settings = get_settings()
+    if not settings.debug_token:
+        # Hide the endpoints entirely unless a token is configured
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_debug_token or not hmac.compare_digest(x_debug_token, settings.debug_token):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+@router.get("/profile", dependencies=[Depends(require_debug_token)])
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: Optional[float] = Query(None, ge=1),
+    allocations: bool = False
+):
+    """Sample every thread's stack for ``seconds``.
+
+    Returns collapsed stacks as plain text for flamegraph tools. With
+    ``allocations=true`` returns JSON holding the stacks and the top
+    allocation growth by source line over the same window.
+    """
+    settings = get_settings()
+    if seconds > settings.profile_max_seconds:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be at most {settings.profile_max_seconds:g}"
+        )
+
+    run = Profile(
+        interval=(interval_ms or settings.profile_interval_ms) / 1000,
+        allocations=allocations
+    )
+    try:
+        await run.astart()
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await run.astop()
+
+    if not allocations:
+        return PlainTextResponse(
+            run.sampler.collapsed(),
+            headers={"X-Profile-Samples": str(run.sampler.samples)}
+        )
+    return JSONResponse({
+        "duration_seconds": round(run.duration, 3),
+        "samples": run.sampler.samples,
+        "stacks": run.sampler.collapsed(),
+        "allocations": run.allocations.diff
+    })
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from app import events
+from app.config import get_settings
+
+router = APIRouter(prefix="/api/v1/events", tags=["events"])
+
+
+def get_device_id(
+    device_id: Optional[str] = Query(None, description="For EventSource, which cannot send headers"),
+    x_device_id: Optional[str] = Header(None)
+) -> str:
+    """Extract device ID from header or query string."""
+    device_id = x_device_id or device_id
+    if not device_id:
+        raise HTTPException(status_code=400, detail="X-Device-Id header or device_id parameter required")
+    return device_id
+
+
+@router.get("")
+async def stream_events(device_id: str = Depends(get_device_id)):
+    """Server-Sent Events stream of the device's friend, interaction and health changes.
+
+    Events: friend.created, friend.updated, friend.deleted,
+    interaction.created and health.transition, each with a JSON payload;
+    resync when events were dropped and the client should refetch.
+    """
+    try:
+        events.bus.check(device_id)
+    except events.TooManyConnections as e:
+        status_code = 503 if e.scope == "server" else 429
+        raise HTTPException(status_code=status_code, detail=str(e), headers={"Retry-After": "30"})
+
+    # The body subscribes when it starts, so nothing leaks if it never does
+    return StreamingResponse(
+        events.stream(device_id, get_settings().events_heartbeat_seconds),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Callable, Iterator, List, Optional, Tuple
 
-from app.database import get_db
+from app.config import get_settings
+from app.database import get_db, get_session_factory
+from app import request_stats
+from app.request_stats import TimedRoute
+from app.responses import FastJSONResponse, fast_responses_enabled, json_array_chunks
 from app.schemas import (
-    FriendCreate, FriendUpdate, FriendResponse, FriendDetailResponse,
+    FriendCreate, FriendUpdate, FriendResponse, FriendSummary, FriendDetailResponse,
     InteractionCreate, InteractionResponse, DashboardResponse
 )
 from app.services import friend_service, interaction_service
 
-router = APIRouter(prefix="/api/v1/friends", tags=["friends"])
+router = APIRouter(prefix="/api/v1/friends", tags=["friends"], route_class=TimedRoute)
 
 
 def get_device_id(x_device_id: Optional[str] = Header(None)) -> str:
@@ -19,13 +24,55 @@ def get_device_id(x_device_id: Optional[str] = Header(None)) -> str:
     return x_device_id
 
 
-@router.get("", response_model=List[FriendResponse])
+def get_fields(
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated friend fields to return. Defaults to every field."
+    )
+) -> Tuple[str, ...]:
+    """Parse the sparse fieldset for list views."""
+    try:
+        return friend_service.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def stream_friends(
+    session_factory: Callable[[], Session],
+    device_id: str,
+    fields: Tuple[str, ...]
+) -> Iterator[bytes]:
+    """Friends as a JSON array, encoded batch by batch as rows are read.
+    
+    Opens its own session: the request's ``get_db`` session is closed as
+    soon as the endpoint returns, before the body is sent.
+    """
+    db = session_factory()
+    try:
+        batches = friend_service.iter_friend_rows(db, device_id, fields, get_settings().stream_batch_size)
+        yield from json_array_chunks(batches)
+    finally:
+        db.close()
+
+
+@router.get("", response_model=List[FriendSummary], response_model_exclude_unset=True)
 def list_friends(
     device_id: str = Depends(get_device_id),
-    db: Session = Depends(get_db)
+    fields: Tuple[str, ...] = Depends(get_fields),
+    stream: bool = Query(False, description="Stream the array as rows are read, for very large lists"),
+    db: Session = Depends(get_db),
+    session_factory: Callable[[], Session] = Depends(get_session_factory)
 ):
     """List all friends for the current device."""
-    return friend_service.get_friends(db, device_id)
+    if stream:
+        request_stats.allow_repeated_queries()  # One keyset query per batch
+        return StreamingResponse(
+            stream_friends(session_factory, device_id, fields),
+            media_type="application/json"
+        )
+    if fast_responses_enabled():
+        return FastJSONResponse(friend_service.get_friend_rows(db, device_id, fields))
+    return friend_service.get_friend_summaries(db, device_id, fields)
 
 
 @router.post("", response_model=FriendResponse, status_code=201)
@@ -36,16 +83,38 @@ def create_friend(
 ):
     """Create a new friend."""
     friend = friend_service.create_friend(db, device_id, friend_data)
-    return friend_service.get_friends(db, device_id)[-1]  # Return with health status
+    response = friend_service.get_friend_response(db, friend)  # Return with health status
+    if fast_responses_enabled():
+        return FastJSONResponse(response, status_code=201)
+    return response
 
 
-@router.get("/dashboard", response_model=DashboardResponse)
+@router.get("/dashboard", response_model=DashboardResponse, response_model_exclude_unset=True)
 def get_dashboard(
     device_id: str = Depends(get_device_id),
+    fields: Tuple[str, ...] = Depends(get_fields),
     db: Session = Depends(get_db)
 ):
-    """Get friendship dashboard overview."""
-    friends = friend_service.get_friends(db, device_id)
+    """Get friendship dashboard overview.
+    
+    ``fields`` selects what each listed friend holds; ``health_status`` is
+    always included since the dashboard is grouped by it.
+    """
+    fields = friend_service.with_fields(fields, "health_status")
+    if fast_responses_enabled():
+        friends = friend_service.get_friend_rows(db, device_id, fields)
+        by_status = {"red": [], "yellow": [], "green": []}
+        for friend in friends:
+            by_status[friend["health_status"]].append(friend)
+        return FastJSONResponse({
+            "total_friends": len(friends),
+            "need_contact_today": by_status["red"][:5],
+            "need_contact_this_week": by_status["yellow"][:5],
+            "healthy_friendships": len(by_status["green"]),
+            "at_risk_friendships": len(by_status["red"]) + len(by_status["yellow"])
+        })
+    
+    friends = friend_service.get_friend_summaries(db, device_id, fields)
     
     need_today = [f for f in friends if f.health_status == "red"]
     need_week = [f for f in friends if f.health_status == "yellow"]
@@ -72,28 +141,19 @@ def get_friend(
     if not friend:
         raise HTTPException(status_code=404, detail="Friend not found")
     
-    # Get health status
-    friends = friend_service.get_friends(db, device_id)
-    friend_with_status = next((f for f in friends if f.id == friend_id), None)
-    
-    # Get interactions
+    # Get interactions; the newest one also gives the health status
     interactions = interaction_service.get_interactions(db, friend_id)
     interaction_responses = [
         interaction_service.interaction_to_response(i) for i in interactions
     ]
+    last_interaction = interactions[0].contacted_at if interactions else None
+    friend_with_status = friend_service.to_friend_response(friend, last_interaction)
+    
+    if fast_responses_enabled():
+        return FastJSONResponse({**friend_with_status.model_dump(), "interactions": interaction_responses})
     
     return FriendDetailResponse(
-        id=friend.id,
-        name=friend.name,
-        nickname=friend.nickname,
-        relation_type=friend.relation_type,
-        contact_frequency=friend.contact_frequency,
-        notes=friend.notes,
-        created_at=friend.created_at,
-        updated_at=friend.updated_at,
-        last_interaction=friend_with_status.last_interaction if friend_with_status else None,
-        health_status=friend_with_status.health_status if friend_with_status else "unknown",
-        days_since_contact=friend_with_status.days_since_contact if friend_with_status else None,
+        **friend_with_status.model_dump(),
         interactions=interaction_responses
     )
 
@@ -111,8 +171,10 @@ def update_friend(
         raise HTTPException(status_code=404, detail="Friend not found")
     
     friend_service.update_friend(db, friend, friend_data)
-    friends = friend_service.get_friends(db, device_id)
-    return next((f for f in friends if f.id == friend_id), None)
+    response = friend_service.get_friend_response(db, friend)
+    if fast_responses_enabled():
+        return FastJSONResponse(response)
+    return response
 
 
 @router.delete("/{friend_id}", status_code=204)
@@ -142,4 +204,7 @@ def log_interaction(
         raise HTTPException(status_code=404, detail="Friend not found")
     
     interaction = interaction_service.create_interaction(db, friend_id, interaction_data)
-    return interaction_service.interaction_to_response(interaction)
+    response = interaction_service.interaction_to_response(interaction)
+    if fast_responses_enabled():
+        return FastJSONResponse(response, status_code=201)
+    return response
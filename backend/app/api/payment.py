@@ -1,27 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, Header, Request
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import datetime
 import json
 import hmac
 import hashlib
+import uuid
 import httpx
 
 from app.database import get_db
+from app.request_stats import TimedRoute
 from app.models import PaymentTransaction
 from app.schemas import CheckoutRequest, CheckoutResponse, TokenStatus
-from app.services import token_service
+from app.services import token_service, webhook_inbox
+from app.services.creem_client import CreemClient
 from app.config import get_settings
-from app.metrics import payment_success, payment_revenue_cents
+from app.metrics import webhook_events
 
-router = APIRouter(prefix="/api/v1", tags=["payment"])
+router = APIRouter(prefix="/api/v1", tags=["payment"], route_class=TimedRoute)
 
-# Product configuration
-PRODUCTS = {
-    "starter": {"tokens": 10, "price_cents": 499},
-    "popular": {"tokens": 30, "price_cents": 999},
-    "pro": {"tokens": 100, "price_cents": 2499}
-}
+
+def get_creem_client(request: Request) -> CreemClient:
+    """The shared Creem client built at startup."""
+    return request.app.state.creem_client
 
 
 def get_device_id(x_device_id: Optional[str] = Header(None)) -> str:
@@ -47,69 +47,49 @@ def get_tokens(
 @router.post("/checkout", response_model=CheckoutResponse)
 async def create_checkout(
     request: CheckoutRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    creem: CreemClient = Depends(get_creem_client)
 ):
     """Create a Creem checkout session."""
-    settings = get_settings()
-    
-    if not settings.creem_api_key:
-        raise HTTPException(status_code=500, detail="Payment not configured")
-    
-    if request.product_sku not in PRODUCTS:
+    product = creem.catalog.get(request.product_sku)
+    if not product:
         raise HTTPException(status_code=400, detail="Invalid product")
     
-    # Parse product IDs from config
-    try:
-        product_ids = json.loads(settings.creem_product_ids)
-    except json.JSONDecodeError:
-        product_ids = {}
-    
-    creem_product_id = product_ids.get(request.product_sku)
-    if not creem_product_id:
-        raise HTTPException(status_code=500, detail="Product not configured in Creem")
+    if not creem.configured:
+        raise HTTPException(status_code=500, detail="Payment not configured")
     
     # Create Creem checkout
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.creem.io/v1/checkouts",
-                headers={
-                    "x-api-key": settings.creem_api_key,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "product_id": creem_product_id,
-                    "success_url": request.success_url,
-                    "metadata": {
-                        "device_id": request.device_id,
-                        "product_sku": request.product_sku
-                    }
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Store pending transaction
-            transaction = PaymentTransaction(
-                device_id=request.device_id,
-                creem_checkout_id=data.get("id"),
-                product_sku=request.product_sku,
-                tokens_granted=PRODUCTS[request.product_sku]["tokens"],
-                amount_cents=PRODUCTS[request.product_sku]["price_cents"],
-                status="pending"
-            )
-            db.add(transaction)
-            db.commit()
-            
-            return CheckoutResponse(
-                checkout_url=data.get("checkout_url"),
-                checkout_id=data.get("id")
-            )
-            
+        data = await creem.create_checkout(
+            product,
+            success_url=request.success_url,
+            metadata={
+                "device_id": request.device_id,
+                "product_sku": request.product_sku
+            },
+            idempotency_key=str(uuid.uuid4())
+        )
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=500, detail=f"Payment provider error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Checkout failed: {str(e)}")
+    
+    # Store pending transaction
+    transaction = PaymentTransaction(
+        device_id=request.device_id,
+        creem_checkout_id=data.get("id"),
+        product_sku=product.sku,
+        tokens_granted=product.tokens,
+        amount_cents=product.price_cents,
+        status="pending"
+    )
+    db.add(transaction)
+    db.commit()
+    
+    return CheckoutResponse(
+        checkout_url=data.get("checkout_url"),
+        checkout_id=data.get("id")
+    )
 
 
 @router.post("/webhook/creem")
@@ -117,59 +97,54 @@ async def creem_webhook(
     request: Request,
     db: Session = Depends(get_db)
 ):
-    """Handle Creem payment webhooks."""
+    """Handle Creem payment webhooks.
+    
+    Events are only verified and stored here; the webhook worker applies
+    them in the background so the provider gets its acknowledgement fast.
+    """
     settings = get_settings()
     
     # Verify webhook signature
     signature = request.headers.get("creem-signature")
     body = await request.body()
     
-    if settings.creem_webhook_secret and signature:
+    if settings.creem_webhook_secret:
         expected_sig = hmac.new(
             settings.creem_webhook_secret.encode(),
             body,
             hashlib.sha256
         ).hexdigest()
         
-        if not hmac.compare_digest(signature, expected_sig):
+        if not signature or not hmac.compare_digest(signature, expected_sig):
+            webhook_events.labels(tool="friend-keeper", result="invalid").inc()
             raise HTTPException(status_code=401, detail="Invalid signature")
     
     try:
         payload = json.loads(body)
     except json.JSONDecodeError:
+        webhook_events.labels(tool="friend-keeper", result="invalid").inc()
         raise HTTPException(status_code=400, detail="Invalid JSON")
     
     event_type = payload.get("event_type")
     
+    if event_type not in webhook_inbox.HANDLED_EVENTS:
+        webhook_events.labels(tool="friend-keeper", result="ignored").inc()
+        return {"status": "ignored"}
+    
     if event_type == "checkout.completed":
-        checkout_data = payload.get("object", {})
-        checkout_id = checkout_data.get("id")
-        metadata = checkout_data.get("metadata", {})
-        
-        device_id = metadata.get("device_id")
-        product_sku = metadata.get("product_sku")
-        
-        if not device_id or not product_sku:
+        metadata = payload.get("object", {}).get("metadata", {})
+        if not metadata.get("device_id") or not metadata.get("product_sku"):
+            webhook_events.labels(tool="friend-keeper", result="invalid").inc()
             return {"status": "missing metadata"}
-        
-        # Find and update transaction
-        transaction = db.query(PaymentTransaction).filter(
-            PaymentTransaction.creem_checkout_id == checkout_id
-        ).first()
-        
-        if transaction:
-            transaction.status = "completed"
-            transaction.completed_at = datetime.utcnow()
-            
-            # Grant tokens
-            token_service.add_tokens(db, device_id, transaction.tokens_granted)
-            
-            # Record metrics
-            payment_success.labels(tool="friend-keeper", product_sku=product_sku).inc()
-            payment_revenue_cents.labels(tool="friend-keeper").inc(transaction.amount_cents)
-            
-            db.commit()
-        
-        return {"status": "ok"}
     
-    return {"status": "ignored"}
+    event_id = webhook_inbox.event_id_for(payload, body)
+    if not webhook_inbox.record_event(db, event_id, event_type, body):
+        webhook_events.labels(tool="friend-keeper", result="duplicate").inc()
+        return {"status": "duplicate"}
+    
+    webhook_events.labels(tool="friend-keeper", result="queued").inc()
+    worker = getattr(request.app.state, "webhook_worker", None)
+    if worker:
+        worker.notify()
+    
+    return {"status": "ok"}
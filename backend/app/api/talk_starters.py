@@ -3,11 +3,19 @@ from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.database import get_db
-from app.schemas import TalkStarterRequest, TalkStarterResponse
-from app.services import friend_service, interaction_service, llm_service, token_service
+from app import request_stats
+from app.request_stats import TimedRoute
+from app.config import get_settings
+from app.schemas import (
+    TalkStarterRequest, TalkStarterResponse,
+    TalkStarterBatchRequest, TalkStarterBatchItem, TalkStarterBatchResponse
+)
+from app.services import (
+    friend_service, interaction_service, llm_service, starter_cache_service, token_service
+)
 from app.metrics import talk_starters_generated, tokens_consumed, free_trial_used
 
-router = APIRouter(prefix="/api/v1/talk-starters", tags=["talk-starters"])
+router = APIRouter(prefix="/api/v1/talk-starters", tags=["talk-starters"], route_class=TimedRoute)
 
 
 def get_device_id(x_device_id: Optional[str] = Header(None)) -> str:
@@ -17,6 +25,11 @@ def get_device_id(x_device_id: Optional[str] = Header(None)) -> str:
     return x_device_id
 
 
+def summarize_context(context: str) -> str:
+    """Shorten interaction context for echoing back to the client."""
+    return context[:200] + "..." if len(context) > 200 else context
+
+
 @router.post("", response_model=TalkStarterResponse)
 async def generate_talk_starters(
     request: TalkStarterRequest,
@@ -25,7 +38,9 @@ async def generate_talk_starters(
 ):
     """Generate AI-powered conversation starters for a friend."""
     # Check tokens
-    if not token_service.can_generate(db, device_id):
+    with request_stats.phase("tokens"):
+        can_generate = token_service.can_generate(db, device_id)
+    if not can_generate:
         raise HTTPException(
             status_code=402,
             detail={
@@ -42,25 +57,126 @@ async def generate_talk_starters(
     # Get interaction context
     context = interaction_service.get_interaction_context(db, friend.id)
     
-    # Generate starters
-    starters = await llm_service.generate_talk_starters(
-        friend_name=friend.name,
-        relation_type=friend.relation_type.value,
-        interaction_context=context,
-        language=request.language
-    )
+    # Serve pre-generated starters when available, otherwise generate
+    starters = starter_cache_service.take_cached_starters(db, friend.id, request.language, context)
+    if starters is None:
+        starters = await llm_service.generate_talk_starters(
+            friend_name=friend.name,
+            relation_type=friend.relation_type.value,
+            interaction_context=context,
+            language=request.language
+        )
+        starter_cache_service.store_starters(
+            db, friend.id, request.language, context, starters, served=True
+        )
     
     # Consume token
-    tokens_remaining, free_remaining = token_service.get_token_status(db, device_id)
-    if tokens_remaining > 0:
-        tokens_consumed.labels(tool="friend-keeper").inc()
-    else:
-        free_trial_used.labels(tool="friend-keeper").inc()
-    
-    token_service.use_generation(db, device_id)
+    with request_stats.phase("tokens"):
+        tokens_remaining, free_remaining = token_service.get_token_status(db, device_id)
+        if tokens_remaining > 0:
+            tokens_consumed.labels(tool="friend-keeper").inc()
+        else:
+            free_trial_used.labels(tool="friend-keeper").inc()
+        
+        token_service.use_generation(db, device_id)
     talk_starters_generated.labels(tool="friend-keeper").inc()
     
     return TalkStarterResponse(
         starters=starters,
-        context_used=context[:200] + "..." if len(context) > 200 else context
+        context_used=summarize_context(context)
+    )
+
+
+@router.post("/batch", response_model=TalkStarterBatchResponse)
+async def generate_talk_starters_batch(
+    request: TalkStarterBatchRequest,
+    device_id: str = Depends(get_device_id),
+    db: Session = Depends(get_db)
+):
+    """Generate conversation starters for several friends with a single LLM call."""
+    settings = get_settings()
+    
+    # Drop duplicates but keep the requested order
+    friend_ids = list(dict.fromkeys(request.friend_ids))
+    if len(friend_ids) > settings.talk_starter_batch_max:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.talk_starter_batch_max} friends per batch"
+        )
+    
+    friends = friend_service.get_friends_by_ids(db, friend_ids, device_id)
+    if len(friends) != len(friend_ids):
+        raise HTTPException(status_code=404, detail="Friend not found")
+    
+    # Debit the whole batch up front so a failed debit never costs an LLM call
+    with request_stats.phase("tokens"):
+        debited = token_service.use_generations(db, device_id, len(friends))
+    if debited is None:
+        raise HTTPException(
+            status_code=402,
+            detail={
+                "error": "Not enough generations remaining for this batch. Please purchase more.",
+                "code": "payment_required"
+            }
+        )
+    paid, free = debited
+    
+    contexts = {
+        friend.id: interaction_service.get_interaction_context(db, friend.id)
+        for friend in friends
+    }
+    
+    starters = {}
+    for friend in friends:
+        cached = starter_cache_service.take_cached_starters(
+            db, friend.id, request.language, contexts[friend.id]
+        )
+        if cached is not None:
+            starters[friend.id] = cached
+    
+    uncached = [friend for friend in friends if friend.id not in starters]
+    if uncached:
+        starters.update(await llm_service.generate_talk_starters_batch(
+            friends=[
+                {
+                    "id": friend.id,
+                    "name": friend.name,
+                    "relation_type": friend.relation_type.value,
+                    "context": contexts[friend.id]
+                }
+                for friend in uncached
+            ],
+            language=request.language
+        ))
+        for friend in uncached:
+            starter_cache_service.store_starters(
+                db, friend.id, request.language, contexts[friend.id], starters[friend.id], served=True
+            )
+    
+    # Canned starters (no LLM configured, or the call failed) are free:
+    # give back free trial uses first, since paid tokens were spent first
+    canned = sum(
+        1 for friend in uncached
+        if starters[friend.id] in (llm_service.DEFAULT_STARTERS, llm_service.FALLBACK_STARTERS)
+    )
+    refund_free = min(canned, free)
+    refund_paid = canned - refund_free
+    with request_stats.phase("tokens"):
+        token_service.refund_generations(db, device_id, refund_paid, refund_free)
+    
+    if paid - refund_paid:
+        tokens_consumed.labels(tool="friend-keeper").inc(paid - refund_paid)
+    if free - refund_free:
+        free_trial_used.labels(tool="friend-keeper").inc(free - refund_free)
+    talk_starters_generated.labels(tool="friend-keeper").inc(len(friends) - canned)
+    
+    return TalkStarterBatchResponse(
+        results=[
+            TalkStarterBatchItem(
+                friend_id=friend.id,
+                starters=starters[friend.id],
+                context_used=summarize_context(contexts[friend.id])
+            )
+            for friend in friends
+        ]
     )
@@ -0,0 +1,186 @@
+"""Negotiated gzip / brotli response compression.
+
+``CompressionMiddleware`` picks an encoding from the request's
+``Accept-Encoding`` (brotli first when the ``brotli`` package is
+installed, then gzip) and compresses text and JSON responses:
+
+* Whole bodies of at least ``COMPRESSION_MIN_SIZE`` bytes are compressed
+  in one go; smaller ones are sent as they are, since the framing costs
+  more than it saves.
+* Streamed bodies are compressed incrementally, with a flush after every
+  chunk so the client still gets each chunk as soon as it is produced.
+
+Responses that already carry a ``Content-Encoding``, event streams and
+non-text types are passed through untouched.
+"""
+import zlib
+from typing import Optional
+
+from app.config import get_settings
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip only without it
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml"
+)
+# Must reach the client unbuffered, chunk by chunk
+EXCLUDED_TYPES = ("text/event-stream",)
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Encodings and their q-values from an Accept-Encoding header."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header: str, brotli_available: bool = brotli is not None) -> Optional[str]:
+    """The best encoding both sides support, or None to send the body as-is."""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli_available else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Compressor:
+    """Incremental compressor for one response body."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gzip = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk and flush it, so it can be sent right away."""
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.finish()
+        return self._gzip.compress(data) + self._gzip.flush()
+
+
+class CompressionMiddleware:
+    """Compresses responses according to the client's Accept-Encoding."""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: Optional[int] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None
+    ):
+        settings = get_settings()
+        self.app = app
+        self.minimum_size = settings.compression_min_size if minimum_size is None else minimum_size
+        self.gzip_level = settings.compression_gzip_level if gzip_level is None else gzip_level
+        self.brotli_quality = settings.compression_brotli_quality if brotli_quality is None else brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoding = choose_encoding(value.decode("latin-1"))
+                break
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+                passthrough = (
+                    b"content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or content_type.startswith(EXCLUDED_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    # Whole body known and too small to be worth it
+                    passthrough = True
+                    await send(self._with_headers(start_message, None, None))
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                if not more_body:
+                    compressed = compressor.finish(body)
+                    await send(self._with_headers(start_message, encoding, len(compressed)))
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send(self._with_headers(start_message, encoding, None))
+
+            if more_body:
+                chunk = compressor.compress(body) if body else b""
+            else:
+                chunk = compressor.finish(body)
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _with_headers(message, encoding: Optional[str], length: Optional[int]):
+        """The start message with Vary set and, when compressing, encoding and length adjusted."""
+        headers = [
+            (name, value) for name, value in message.get("headers", [])
+            if not (encoding and name.lower() == b"content-length")
+        ]
+        vary = [value for name, value in headers if name.lower() == b"vary"]
+        if not any(b"accept-encoding" in value.lower() for value in vary):
+            headers.append((b"vary", b"Accept-Encoding"))
+        if encoding:
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+            if length is not None:
+                headers.append((b"content-length", str(length).encode("latin-1")))
+        return {**message, "headers": headers}
@@ -9,22 +9,129 @@ class Settings(BaseSettings):
     app_name: str = "FriendKeeper"
     tool_name: str = "friend-keeper"
     debug: bool = False
+    fast_responses: bool = False  # orjson responses without response_model re-validation
+    stream_batch_size: int = 500  # Rows per chunk of a streamed list
+    compression_enabled: bool = True  # gzip / brotli, as the client accepts
+    compression_min_size: int = 1024  # Smaller whole bodies are sent as-is
+    compression_gzip_level: int = 6  # 1 (fastest) to 9 (smallest)
+    compression_brotli_quality: int = 4  # 0 (fastest) to 11 (smallest)
     
     # Database
     database_url: str = "sqlite:///./app.db"
+    database_pool_size: int = 5  # Connections kept open per worker process
+    database_max_overflow: int = 10
+    threadpool_size: int = 40  # Threads running sync endpoints per worker process
     
     # LLM Proxy
     llm_proxy_url: str = "https://llm-proxy.densematrix.ai"
     llm_proxy_key: str = ""
+    llm_model: str = "gpt-4o-mini"
+    llm_endpoints: str = "[]"  # JSON list of {"url", "key", "model", "weight", "name"}
+    llm_endpoint_timeout_seconds: float = 15.0  # Per attempt, before failing over
+    llm_ewma_alpha: float = 0.3
+    llm_eject_error_rate: float = 0.5
+    llm_eject_seconds: float = 30.0
+    llm_timeout_seconds: float = 30.0
+    llm_max_in_flight: int = 16
+    llm_queue_timeout_seconds: float = 2.0  # Wait for an in-flight slot before falling back
+    llm_breaker_error_rate: float = 0.5
+    llm_breaker_min_calls: int = 10
+    llm_breaker_window_seconds: float = 60.0
+    llm_breaker_open_seconds: float = 30.0
+    llm_hedge_enabled: bool = False
+    llm_hedge_quantile: float = 0.95
+    llm_hedge_min_delay_seconds: float = 0.5
+    llm_hedge_min_samples: int = 20
     
     # Creem Payment
     creem_api_key: str = ""
     creem_webhook_secret: str = ""
     creem_product_ids: str = "{}"  # JSON string
+    creem_api_url: str = "https://api.creem.io"
+    creem_timeout_seconds: float = 30.0
+    creem_max_connections: int = 20
+    creem_max_retries: int = 2
+    creem_retry_base_seconds: float = 0.2
+    webhook_worker_enabled: bool = True
+    webhook_batch_size: int = 50
+    webhook_poll_interval_seconds: float = 5.0
+    webhook_max_attempts: int = 8
+    webhook_retry_base_seconds: float = 10.0  # Doubles per attempt
+    webhook_retry_max_seconds: float = 3600.0
+    reconcile_older_than_minutes: int = 60
+    reconcile_chunk_size: int = 200
+    reconcile_concurrency: int = 8
+    
+    # Metrics
+    server_timing_enabled: bool = False  # Add a Server-Timing header to responses
+    slow_query_ms: float = 200.0  # 0 disables the slow-query log
+    query_detector_mode: str = "off"  # off, log or raise (repeated statements per request)
+    query_repeat_threshold: int = 10
+    debug_token: str = ""  # Required in X-Debug-Token; /debug is off while empty
+    profile_max_seconds: float = 60.0
+    profile_interval_ms: float = 10.0  # Between stack samples; at least 1
+    
+    # Tracing
+    tracing_enabled: bool = False
+    tracing_sample_rate: float = 1.0  # Share of new traces recorded
+    tracing_file: str = "./traces/spans.jsonl"  # Each process writes spans.<pid>.jsonl
+    tracing_max_bytes: int = 10_000_000
+    tracing_backup_count: int = 5
+    health_metrics_enabled: bool = True
+    health_metrics_interval_seconds: int = 300
     
     # Free trial
     free_trial_count: int = 3
     
+    # Talk starters
+    talk_starter_batch_max: int = 10
+    context_raw_interactions: int = 2  # Interactions kept out of the rolling summary
+    context_top_k: int = 4  # Most relevant interactions included verbatim
+    context_char_budget: int = 1200
+    context_recency_weight: float = 0.3
+    context_recency_half_life_days: float = 60.0
+    context_index_cache_size: int = 512  # Friends with a warm relevance index
+    context_index_max_interactions: int = 400  # Newest interactions indexed per friend
+    context_line_token_budget: int = 80  # Per raw interaction
+    summary_token_budget: int = 300  # Rolling summary of older interactions
+    summary_rebuild_window: int = 50
+    
+    # Talk starter pre-generation
+    pregen_enabled: bool = False
+    pregen_concurrency: int = 2
+    pregen_queue_size: int = 500
+    pregen_lookahead_days: int = 2
+    pregen_scan_interval_seconds: int = 900
+    pregen_offpeak_hours: str = "1-6"  # UTC hours, start-end
+    pregen_default_language: str = "en"
+    starter_cache_ttl_hours: int = 72
+    
+    # Reminders
+    reminder_scheduler_enabled: bool = False
+    reminder_sinks: str = "file"  # Comma-separated: file, webhook
+    reminder_file: str = "./reminders/transitions.jsonl"
+    reminder_webhook_url: str = ""
+    reminder_webhook_timeout_seconds: float = 5.0
+    reminder_batch_size: int = 500  # Due transitions checked per query
+    reminder_max_sleep_seconds: float = 60.0
+    reminder_rebuild_interval_seconds: int = 3600  # Picks up other workers' writes
+    reminder_rebuild_batch_size: int = 1000  # Friends loaded per rebuild query
+    reminder_lock_file: str = "./reminders/scheduler.lock"  # One scheduler per host; empty disables
+    
+    # Dashboard event streams
+    events_max_connections: int = 1000  # Per worker process
+    events_max_per_device: int = 5
+    events_queue_size: int = 100  # Per stream; a full queue makes the client resync
+    events_heartbeat_seconds: float = 15.0
+    
+    # Daily digest job
+    digest_workers: int = 4  # Processes; 0 runs chunks in the calling process
+    digest_chunk_size: int = 200  # Devices per chunk
+    digest_due_soon_days: int = 2  # Friends turning red within this many days
+    digest_sink: str = "table"  # table or file
+    digest_output_dir: str = "./digests"  # File sink, one JSONL file per chunk
+    digest_checkpoint_file: str = "./digests/checkpoint.json"
+    
     class Config:
         env_file = ".env"
 
@@ -5,9 +5,14 @@ from app.config import get_settings
 
 settings = get_settings()
 
+pool_args = {}
+if ":memory:" not in settings.database_url:
+    pool_args = {"pool_size": settings.database_pool_size, "max_overflow": settings.database_max_overflow}
+
 engine = create_engine(
     settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
+    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
+    **pool_args
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -15,9 +20,22 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def get_session_factory():
+    """Session factory for work that outlives the request's ``get_db`` session,
+    such as streamed response bodies."""
+    return SessionLocal
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def create_missing_indexes(bind=engine) -> None:
+    """Create indexes added to existing tables, which create_all skips."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
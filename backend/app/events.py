@@ -0,0 +1,184 @@
+"""In-process pub/sub for per-device change events.
+
+Friend and interaction writes, and the reminder scheduler's health
+transitions, are published to the device they belong to; every
+``/api/v1/events`` stream subscribed to that device gets a copy. Writes
+run in threadpool threads, so ``publish`` hands delivery to the event
+loop with ``call_soon_threadsafe`` and never blocks the writer.
+
+Each subscriber has a bounded queue. A subscriber that falls behind does
+not slow down publishers or other subscribers: once its queue is full,
+further events are dropped and the stream tells the client to resync
+(refetch) instead. Connections are capped per process and per device.
+
+Fan-out is per process, so event streams require a single worker process
+(``WEB_CONCURRENCY=1``, the image default): with several workers a
+stream would only see the writes its own worker handled, and nothing
+would tell it about the others.
+"""
+import asyncio
+import itertools
+import json
+from typing import Dict, List, Optional, Set
+
+from app.config import get_settings
+from app.metrics import event_stream_connections, event_stream_events
+
+CLOSE = object()  # Queued to end a stream
+
+
+class TooManyConnections(Exception):
+    """Raised when a connection cap is reached."""
+
+    def __init__(self, scope: str):
+        super().__init__(f"Too many event stream connections ({scope})")
+        self.scope = scope
+
+
+class Subscription:
+    """One connected event stream."""
+
+    __slots__ = ("device_id", "queue", "overflowed")
+
+    def __init__(self, device_id: str, queue_size: int):
+        self.device_id = device_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+
+class EventBus:
+    """Fans events out to the subscriptions of each device."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def check(self, device_id: str) -> None:
+        """Raise TooManyConnections if another stream for the device would exceed a cap."""
+        settings = get_settings()
+        if self._count >= settings.events_max_connections:
+            event_stream_events.labels(tool="friend-keeper", result="rejected").inc()
+            raise TooManyConnections("server")
+        if len(self._subscribers.get(device_id, ())) >= settings.events_max_per_device:
+            event_stream_events.labels(tool="friend-keeper", result="rejected").inc()
+            raise TooManyConnections("device")
+
+    def subscribe(self, device_id: str) -> Subscription:
+        """Register a stream; call from the event loop. Raises TooManyConnections at a cap."""
+        self.check(device_id)
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(device_id, get_settings().events_queue_size)
+        self._subscribers.setdefault(device_id, set()).add(subscription)
+        self._count += 1
+        event_stream_connections.labels(tool="friend-keeper").set(self._count)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.device_id)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.device_id]
+        self._count -= 1
+        event_stream_connections.labels(tool="friend-keeper").set(self._count)
+
+    def publish(self, device_id: str, event_type: str, data: dict) -> None:
+        """Send an event to the device's streams; safe from any thread."""
+        # Plain dict read: cheap enough to do on every write
+        if device_id not in self._subscribers or self._loop is None:
+            return
+        event = {"id": next(self._ids), "type": event_type, "data": data}
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._deliver(device_id, event)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._deliver, device_id, event)
+
+    def _deliver(self, device_id: str, event: dict) -> None:
+        for subscription in self._subscribers.get(device_id, ()):
+            try:
+                subscription.queue.put_nowait(event)
+                event_stream_events.labels(tool="friend-keeper", result="delivered").inc()
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+                event_stream_events.labels(tool="friend-keeper", result="dropped").inc()
+
+    def close(self) -> None:
+        """End every stream after the events already queued; call from the event loop."""
+        for subscribers in list(self._subscribers.values()):
+            for subscription in subscribers:
+                if subscription.queue.full():
+                    subscription.queue.get_nowait()
+                    subscription.overflowed = True
+                subscription.queue.put_nowait(CLOSE)
+
+
+bus = EventBus()
+
+
+def publish(device_id: str, event_type: str, data: dict) -> None:
+    bus.publish(device_id, event_type, data)
+
+
+def format_event(event: dict) -> bytes:
+    """An event in Server-Sent Events framing."""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n".encode()
+
+
+async def stream(device_id: str, heartbeat_seconds: float):
+    """SSE body for a device's events, with keep-alive comments while idle.
+
+    Subscribes only once iteration starts, so a response that is never
+    sent holds no connection slot, and unsubscribes when the client
+    disconnects or the bus is closed. Callers check the caps first with
+    ``bus.check``; a stream that loses a race for the last slot sends an
+    ``error`` event and a 30 second ``retry:``, matching the ``Retry-After``
+    of a refused connection, so the client does not reconnect in a loop.
+    """
+    try:
+        subscription = bus.subscribe(device_id)
+    except TooManyConnections as e:
+        yield b"retry: 30000\n\n"
+        yield f"event: error\ndata: {json.dumps({'error': str(e), 'scope': e.scope})}\n\n".encode()
+        return
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if event is CLOSE:
+                return
+            if subscription.overflowed:
+                # Events were lost; the queue holds only part of the story
+                while not subscription.queue.empty():
+                    if subscription.queue.get_nowait() is CLOSE:
+                        return
+                subscription.overflowed = False
+                yield b"event: resync\ndata: {}\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        bus.unsubscribe(subscription)
+
+
+class TransitionSink:
+    """Reminder scheduler sink that pushes health transitions to connected streams."""
+
+    def emit(self, events: List[dict]) -> None:
+        for event in events:
+            publish(event["device_id"], "health.transition", event)
+
+    def close(self) -> None:
+        pass
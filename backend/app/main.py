@@ -1,22 +1,88 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+import anyio.to_thread
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import time
-import re
 
 from app.config import get_settings
-from app.database import engine, Base
-from app.api import friends, talk_starters, payment
-from app.metrics import metrics_router, http_requests, http_request_duration, crawler_visits
+from app.database import engine, Base, create_missing_indexes
+from app.api import debug, events as events_api, friends, talk_starters, payment
+from app.metrics import metrics_router, mark_process_dead
+from app import events, tracing
+from app.compression import CompressionMiddleware
+from app.middleware import MetricsMiddleware
+from app.request_stats import install_query_hooks
+from app.services.pregeneration_worker import PregenerationWorker
+from app.services.webhook_inbox import WebhookWorker
+from app.services import creem_client, llm_router
+from app.services.health_metrics import HealthMetricsReconciler
+from app.services.reminder_scheduler import ReminderScheduler
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+create_missing_indexes()
+install_query_hooks()
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build shared clients and start and stop background workers."""
+    tracing.configure()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+    
+    # Raises on a bad product configuration, so the app does not boot
+    app.state.creem_client = creem_client.build_client()
+    # Raises on a bad LLM_ENDPOINTS, likewise
+    llm_router.get_router(settings)
+    
+    pregen_worker = None
+    if settings.pregen_enabled:
+        pregen_worker = PregenerationWorker()
+        pregen_worker.start()
+    app.state.pregen_worker = pregen_worker
+    
+    webhook_worker = None
+    if settings.webhook_worker_enabled:
+        webhook_worker = WebhookWorker()
+        webhook_worker.start()
+    app.state.webhook_worker = webhook_worker
+    
+    health_reconciler = None
+    if settings.health_metrics_enabled:
+        health_reconciler = HealthMetricsReconciler()
+        health_reconciler.start()
+    
+    reminder_scheduler = None
+    if settings.reminder_scheduler_enabled:
+        # Raises on a bad sink configuration, so the app does not boot
+        reminder_scheduler = ReminderScheduler()
+        reminder_scheduler.add_sink(events.TransitionSink())
+        reminder_scheduler.start()
+    app.state.reminder_scheduler = reminder_scheduler
+    
+    yield
+    
+    # End event streams still open, so their connections close cleanly
+    events.bus.close()
+    if pregen_worker:
+        await pregen_worker.stop()
+    if webhook_worker:
+        await webhook_worker.stop()
+    if health_reconciler:
+        await health_reconciler.stop()
+    if reminder_scheduler:
+        await reminder_scheduler.stop()
+    await app.state.creem_client.aclose()
+    mark_process_dead()
+    tracing.shutdown()
+
+
 app = FastAPI(
     title="FriendKeeper API",
     description="Help ADHD individuals track and maintain friendships",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS
@@ -28,49 +94,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Bot patterns for crawler detection
-BOT_PATTERNS = ["Googlebot", "bingbot", "Baiduspider", "YandexBot", "DuckDuckBot", "Slurp", "facebookexternalhit"]
-
-
-@app.middleware("http")
-async def metrics_middleware(request: Request, call_next):
-    """Track HTTP metrics and crawler visits."""
-    start_time = time.time()
-    
-    # Check for crawlers
-    ua = request.headers.get("user-agent", "")
-    for bot in BOT_PATTERNS:
-        if bot.lower() in ua.lower():
-            crawler_visits.labels(tool=settings.tool_name, bot=bot).inc()
-            break
-    
-    response = await call_next(request)
-    
-    # Record metrics (simplified endpoint)
-    duration = time.time() - start_time
-    endpoint = re.sub(r'/\d+', '/{id}', request.url.path)
-    
-    http_requests.labels(
-        tool=settings.tool_name,
-        endpoint=endpoint,
-        method=request.method,
-        status=response.status_code
-    ).inc()
-    
-    http_request_duration.labels(
-        tool=settings.tool_name,
-        endpoint=endpoint,
-        method=request.method
-    ).observe(duration)
-    
-    return response
+# Compression innermost, then metrics so durations include compressing,
+# then tracing outermost so the request span covers everything
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
 
 
 # Include routers
 app.include_router(friends.router)
+app.include_router(events_api.router)
 app.include_router(talk_starters.router)
 app.include_router(payment.router)
 app.include_router(metrics_router)
+app.include_router(debug.router)
 
 
 @app.get("/")
@@ -1,5 +1,15 @@
+"""Prometheus metrics.
+
+With several worker processes, set ``PROMETHEUS_MULTIPROC_DIR`` to an
+empty directory shared by the workers: each process then writes its
+samples there and ``/metrics`` merges them. Every gauge declares how its
+per-process values combine (``multiprocess_mode``); the ``live*`` modes
+drop values of workers that have exited.
+"""
 import os
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, Gauge, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+)
 from fastapi import APIRouter
 from fastapi.responses import Response
 
@@ -18,6 +28,39 @@ http_request_duration = Histogram(
     ["tool", "endpoint", "method"]
 )
 
+http_request_db_queries = Histogram(
+    "http_request_db_queries",
+    "Database queries per HTTP request",
+    ["tool", "endpoint", "method"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+)
+
+http_request_db_duration = Histogram(
+    "http_request_db_duration_seconds",
+    "Cumulative database time per HTTP request",
+    ["tool", "endpoint", "method"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+http_request_phase_duration = Histogram(
+    "http_request_phase_duration_seconds",
+    "Time per request spent in a phase (llm, tokens, serialize)",
+    ["tool", "endpoint", "phase"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+slow_queries = Counter(
+    "db_slow_queries_total",
+    "Queries slower than SLOW_QUERY_MS",
+    ["tool"]
+)
+
+repeated_queries = Counter(
+    "db_repeated_query_requests_total",
+    "Requests that ran one statement shape more than QUERY_REPEAT_THRESHOLD times",
+    ["tool", "endpoint"]
+)
+
 # Business metrics
 talk_starters_generated = Counter(
     "talk_starters_generated_total",
@@ -79,14 +122,194 @@ crawler_visits = Counter(
 active_friendships = Gauge(
     "active_friendships",
     "Number of active friendships being tracked",
-    ["tool"]
+    ["tool"],
+    multiprocess_mode="livemostrecent"
+)
+
+friendship_health = Gauge(
+    "friendship_health",
+    "Friendships per health status (green, yellow, red)",
+    ["tool", "status"],
+    multiprocess_mode="livemostrecent"
+)
+
+# Talk starter pre-generation metrics
+starter_cache_lookups = Counter(
+    "talk_starter_cache_lookups_total",
+    "Talk starter cache lookups on the interactive path",
+    ["tool", "result"]
+)
+
+pregen_queue_depth = Gauge(
+    "pregen_queue_depth",
+    "Friends waiting for talk starter pre-generation",
+    ["tool"],
+    multiprocess_mode="livesum"
+)
+
+pregen_queue_lag = Histogram(
+    "pregen_queue_lag_seconds",
+    "Time a pre-generation job waits in the queue",
+    ["tool"],
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+)
+
+pregen_jobs = Counter(
+    "pregen_jobs_total",
+    "Talk starter pre-generation jobs",
+    ["tool", "result"]
+)
+
+# LLM call resilience metrics
+llm_calls = Counter(
+    "llm_calls_total",
+    "LLM calls by outcome (success, error, timeout, rejected, circuit_open)",
+    ["tool", "outcome"]
+)
+
+llm_call_duration = Histogram(
+    "llm_call_duration_seconds",
+    "Duration of successful LLM calls, including hedges",
+    ["tool"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30)
+)
+
+llm_in_flight = Gauge(
+    "llm_in_flight",
+    "LLM calls currently in flight",
+    ["tool"],
+    multiprocess_mode="livesum"
+)
+
+llm_circuit_state = Gauge(
+    "llm_circuit_state",
+    "1 for the current LLM circuit breaker state, 0 for the others",
+    ["tool", "state"],
+    multiprocess_mode="livemax"
+)
+
+llm_circuit_transitions = Counter(
+    "llm_circuit_transitions_total",
+    "LLM circuit breaker transitions by target state",
+    ["tool", "state"]
+)
+
+llm_hedges = Counter(
+    "llm_hedges_total",
+    "Hedged LLM requests sent, and how many answered first",
+    ["tool", "result"]
+)
+
+# LLM routing metrics
+llm_route_decisions = Counter(
+    "llm_route_decisions_total",
+    "LLM endpoint attempts by routing reason (primary, failover, probe)",
+    ["tool", "endpoint", "reason"]
+)
+
+llm_endpoint_latency = Histogram(
+    "llm_endpoint_latency_seconds",
+    "Latency of successful requests per LLM endpoint",
+    ["tool", "endpoint"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30)
+)
+
+llm_endpoint_healthy = Gauge(
+    "llm_endpoint_healthy",
+    "1 if the LLM endpoint is in rotation, 0 while ejected",
+    ["tool", "endpoint"],
+    multiprocess_mode="livemin"
+)
+
+llm_endpoint_ejections = Counter(
+    "llm_endpoint_ejections_total",
+    "Times an LLM endpoint was ejected for errors",
+    ["tool", "endpoint"]
+)
+
+# Webhook inbox metrics
+webhook_events = Counter(
+    "webhook_events_total",
+    "Payment webhook deliveries by result (queued, duplicate, ignored, invalid)",
+    ["tool", "result"]
+)
+
+webhook_processed = Counter(
+    "webhook_processed_total",
+    "Inbox events processed by result (processed, retry, failed)",
+    ["tool", "result"]
+)
+
+webhook_inbox_depth = Gauge(
+    "webhook_inbox_depth",
+    "Inbox events waiting to be processed",
+    ["tool"],
+    multiprocess_mode="livemostrecent"
+)
+
+webhook_processing_lag = Histogram(
+    "webhook_processing_lag_seconds",
+    "Time from webhook receipt to successful processing",
+    ["tool"],
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 3600)
+)
+
+# Payment reconciliation metrics
+reconcile_transactions = Counter(
+    "payment_reconcile_transactions_total",
+    "Pending transactions checked by reconciliation, by result",
+    ["tool", "result"]
+)
+
+# Reminder metrics
+reminder_queue_size = Gauge(
+    "reminder_queue_size",
+    "Friends with a scheduled health transition",
+    ["tool"],
+    multiprocess_mode="livemax"
+)
+
+reminder_transitions = Counter(
+    "reminder_transitions_total",
+    "Health transitions emitted to reminder sinks, by new status",
+    ["tool", "status"]
+)
+
+# Event stream metrics
+event_stream_connections = Gauge(
+    "event_stream_connections",
+    "Open dashboard event streams",
+    ["tool"],
+    multiprocess_mode="livesum"
+)
+
+event_stream_events = Counter(
+    "event_stream_events_total",
+    "Event stream deliveries by result (delivered, dropped, rejected)",
+    ["tool", "result"]
 )
 
 # Router for /metrics endpoint
 metrics_router = APIRouter()
 
 
+def multiprocess_enabled() -> bool:
+    """Whether metrics are shared across worker processes."""
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def mark_process_dead(pid: int = None) -> None:
+    """Drop an exiting worker's live gauge values from the shared directory."""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
 @metrics_router.get("/metrics")
-async def metrics():
+def metrics():
     """Prometheus metrics endpoint."""
+    if multiprocess_enabled():
+        # Merge the samples every worker wrote to the shared directory
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
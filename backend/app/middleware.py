@@ -0,0 +1,111 @@
+"""ASGI middleware for request metrics and crawler detection.
+
+Written against the raw ASGI interface rather than ``@app.middleware``,
+which wraps every request and response in extra objects and a task.
+"""
+import re
+import time
+from functools import lru_cache
+from typing import Optional
+
+from app import query_monitor, request_stats
+from app.config import get_settings
+from app.metrics import (
+    http_requests, http_request_duration, http_request_db_queries, http_request_db_duration,
+    http_request_phase_duration, crawler_visits
+)
+
+# Bot patterns for crawler detection
+BOT_PATTERNS = ["Googlebot", "bingbot", "Baiduspider", "YandexBot", "DuckDuckBot", "Slurp", "facebookexternalhit"]
+
+_BOT_RE = re.compile("|".join(re.escape(bot) for bot in BOT_PATTERNS), re.IGNORECASE)
+_BOT_NAMES = {bot.lower(): bot for bot in BOT_PATTERNS}
+
+# Label for requests no route matched, so random 404 paths share one series
+UNMATCHED = "unmatched"
+
+
+@lru_cache(maxsize=1024)
+def detect_bot(user_agent: str) -> Optional[str]:
+    """Name of the crawler in a user agent string, if any."""
+    match = _BOT_RE.search(user_agent)
+    return _BOT_NAMES[match.group().lower()] if match else None
+
+
+class MetricsMiddleware:
+    """Records request count and duration per route template, and crawler visits.
+
+    Also collects the per-request DB and phase breakdown (see
+    ``request_stats``) and, if enabled, reports it in a ``Server-Timing``
+    header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.tool = get_settings().tool_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        server_timing = get_settings().server_timing_enabled
+        stats = request_stats.begin()
+        start_time = stats.start
+        for name, value in scope["headers"]:
+            if name == b"user-agent":
+                bot = detect_bot(value.decode("latin-1"))
+                if bot:
+                    crawler_visits.labels(tool=self.tool, bot=bot).inc()
+                break
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if stats.endpoint_done is not None:
+                    stats.add_phase("serialize", time.perf_counter() - stats.endpoint_done)
+                if server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            endpoint = getattr(route, "path", UNMATCHED)
+            method = scope["method"]
+            http_requests.labels(
+                tool=self.tool,
+                endpoint=endpoint,
+                method=method,
+                status=status
+            ).inc()
+            http_request_duration.labels(
+                tool=self.tool,
+                endpoint=endpoint,
+                method=method
+            ).observe(time.perf_counter() - start_time)
+            http_request_db_queries.labels(
+                tool=self.tool,
+                endpoint=endpoint,
+                method=method
+            ).observe(stats.db_queries)
+            http_request_db_duration.labels(
+                tool=self.tool,
+                endpoint=endpoint,
+                method=method
+            ).observe(stats.db_seconds)
+            for phase, seconds in stats.phases.items():
+                http_request_phase_duration.labels(
+                    tool=self.tool,
+                    endpoint=endpoint,
+                    phase=phase
+                ).observe(seconds)
+        if stats.statements:
+            query_monitor.check_request(stats.statements, endpoint)
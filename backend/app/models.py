@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Date, DateTime, Text, ForeignKey, Index, UniqueConstraint, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -34,13 +34,15 @@ class Friend(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     interactions = relationship("Interaction", back_populates="friend", cascade="all, delete-orphan")
+    cached_starters = relationship("TalkStarterCache", cascade="all, delete-orphan")
+    interaction_summary = relationship("InteractionSummary", uselist=False, cascade="all, delete-orphan")
 
 
 class Interaction(Base):
     __tablename__ = "interactions"
     
     id = Column(Integer, primary_key=True, index=True)
-    friend_id = Column(Integer, ForeignKey("friends.id"), nullable=False)
+    friend_id = Column(Integer, ForeignKey("friends.id"), index=True, nullable=False)
     contacted_at = Column(DateTime, default=datetime.utcnow)
     summary = Column(Text, nullable=True)
     next_topics = Column(Text, nullable=True)  # JSON array of topics
@@ -49,6 +51,29 @@ class Interaction(Base):
     friend = relationship("Friend", back_populates="interactions")
 
 
+class InteractionSummary(Base):
+    __tablename__ = "interaction_summaries"
+    
+    friend_id = Column(Integer, ForeignKey("friends.id"), primary_key=True)
+    summary = Column(Text, nullable=False, default="")  # One compact line per folded interaction
+    token_count = Column(Integer, default=0)  # Approximate, see summary_service.approx_token_count
+    folded_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class TalkStarterCache(Base):
+    __tablename__ = "talk_starter_cache"
+    __table_args__ = (UniqueConstraint("friend_id", "language"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    friend_id = Column(Integer, ForeignKey("friends.id"), nullable=False)
+    language = Column(String(10), nullable=False)
+    context_hash = Column(String(64), nullable=False)  # Fingerprint of the interaction context used
+    starters = Column(Text, nullable=False)  # JSON array of starters
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)  # Set to now once served
+
+
 class GenerationToken(Base):
     __tablename__ = "generation_tokens"
     
@@ -62,6 +87,7 @@ class GenerationToken(Base):
 
 class PaymentTransaction(Base):
     __tablename__ = "payment_transactions"
+    __table_args__ = (Index("ix_payment_transactions_status_created_at", "status", "created_at"),)
     
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(String(255), index=True, nullable=False)
@@ -72,3 +98,32 @@ class PaymentTransaction(Base):
     status = Column(String(50), default="pending")
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
+
+
+class WebhookEvent(Base):
+    __tablename__ = "webhook_inbox"
+    __table_args__ = (Index("ix_webhook_inbox_status_next_attempt", "status", "next_attempt_at"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(String(255), unique=True, nullable=False)  # Provider event ID, for dedup
+    event_type = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)  # Raw request body
+    status = Column(String(50), default="pending")  # pending, processed, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+
+class DeviceDigest(Base):
+    __tablename__ = "device_digests"
+    __table_args__ = (UniqueConstraint("device_id", "digest_date"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(String(255), nullable=False)
+    digest_date = Column(Date, nullable=False)
+    overdue_count = Column(Integer, default=0)
+    due_soon_count = Column(Integer, default=0)
+    payload = Column(Text, nullable=False)  # JSON digest, see digest_job.build_digests
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,195 @@
+"""In-process sampling profiler.
+
+A background thread wakes every few milliseconds and records the stack of
+every other thread from ``sys._current_frames()``: the event loop, the
+threadpool running sync endpoints and the background workers alike. The
+profiled code is never instrumented, so the overhead is one stack walk
+per thread per sample.
+
+Stacks are reported in collapsed format (``thread;outer;...;inner count``
+per line), which flamegraph.pl, speedscope and inferno read directly.
+``tracemalloc`` can additionally diff allocations between the start and
+end of the window.
+
+From async code use ``Profile.astart`` and ``Profile.astop``: the
+tracemalloc snapshots and the sampler join run on a dedicated thread, not
+on the event loop and not in the shared threadpool, which may be the very
+thing that is saturated.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+_busy = threading.Lock()
+# Snapshots and joins; one thread, so work queued here runs in order
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sampling-profiler-io")
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profile is requested while another one is running."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples all thread stacks until stopped."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, frame) -> str:
+        # Code objects repeat across samples; format each one once
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _frame_label(frame)
+        return label
+
+    def sample(self) -> None:
+        """Record the current stack of every thread except the profiler's own."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if names.get(ident, "").startswith("sampling-profiler"):
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(self._label(frame))
+                frame = frame.f_back
+            frames.append(names.get(ident, f"thread-{ident}"))
+            self.stacks[";".join(reversed(frames))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def collapsed(self) -> str:
+        """Stacks in collapsed format, most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class AllocationTracker:
+    """Diffs ``tracemalloc`` snapshots taken at start and stop."""
+
+    def __init__(self, limit: int = 25):
+        self.limit = limit
+        self._started = False
+        self._before: Optional[tracemalloc.Snapshot] = None
+        self.diff: List[dict] = []
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)
+        ))
+
+    def start(self) -> None:
+        # Leave tracing on if someone else (e.g. PYTHONTRACEMALLOC) started it
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        self._before = self._snapshot()
+
+    def stop(self) -> None:
+        after = self._snapshot()
+        if self._started:
+            tracemalloc.stop()
+        self.diff = [
+            {
+                "location": str(stat.traceback),
+                "size_diff_bytes": stat.size_diff,
+                "count_diff": stat.count_diff,
+                "size_bytes": stat.size
+            }
+            for stat in after.compare_to(self._before, "lineno")[:self.limit]
+        ]
+
+
+class Profile:
+    """One profiling window: stack samples and optionally allocations."""
+
+    def __init__(self, interval: float, allocations: bool = False):
+        self.sampler = SamplingProfiler(interval)
+        self.allocations = AllocationTracker() if allocations else None
+
+    def _acquire(self) -> None:
+        if not _busy.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        self.started_at = time.perf_counter()
+
+    def _abort(self) -> None:
+        """Undo a start that did not complete."""
+        try:
+            self.sampler.stop()
+            if self.allocations and self.allocations._started and tracemalloc.is_tracing():
+                tracemalloc.stop()
+        finally:
+            _busy.release()
+
+    def start(self) -> None:
+        """Start profiling. Raises ProfilerBusy if a profile is already running."""
+        self._acquire()
+        try:
+            if self.allocations:
+                self.allocations.start()
+            self.sampler.start()
+        except BaseException:
+            self._abort()
+            raise
+
+    def stop(self) -> None:
+        try:
+            self.sampler.stop()
+            if self.allocations:
+                self.allocations.stop()
+            self.duration = time.perf_counter() - self.started_at
+        finally:
+            _busy.release()
+
+    async def astart(self) -> None:
+        """Like ``start``, keeping the tracemalloc snapshot off the event loop.
+
+        A successful ``astart`` must be paired with ``astop``. If it fails
+        or is cancelled, the profile is undone once the snapshot finishes.
+        """
+        self._acquire()
+        try:
+            if self.allocations:
+                loop = asyncio.get_running_loop()
+                await asyncio.shield(loop.run_in_executor(_executor, self.allocations.start))
+            self.sampler.start()  # Only spawns the thread
+        except BaseException:
+            # Queued behind the snapshot, so it runs once that is done
+            _executor.submit(self._abort)
+            raise
+
+    async def astop(self) -> None:
+        """Like ``stop``, off the event loop; finishes even if the caller is cancelled."""
+        loop = asyncio.get_running_loop()
+        await asyncio.shield(loop.run_in_executor(_executor, self.stop))
@@ -0,0 +1,137 @@
+"""Slow-query log and repeated-statement (N+1) detector.
+
+Both work on statement *shapes*: SQL with literals and placeholder lists
+collapsed, so ``WHERE id = 3`` and ``WHERE id = 7`` count as one.
+
+* Queries slower than ``SLOW_QUERY_MS`` are aggregated per shape. The
+  first time a shape is slow its query plan is captured (``EXPLAIN QUERY
+  PLAN`` on SQLite, ``EXPLAIN`` elsewhere) and logged with it.
+* With ``QUERY_DETECTOR_MODE`` set to ``log`` or ``raise``, each request
+  counts its statements per shape. A shape that runs more than
+  ``QUERY_REPEAT_THRESHOLD`` times in one request is reported, and in
+  ``raise`` mode (used by the test suite) the request fails.
+
+The hooks are driven from ``request_stats``.
+"""
+import logging
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.metrics import repeated_queries, slow_queries
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class RepeatedQueryError(RuntimeError):
+    """Raised in ``raise`` mode when a request repeats a statement too often."""
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(statement: str) -> str:
+    """Reduce a statement to its shape."""
+    shape = _STRING_RE.sub("?", statement)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _WHITESPACE_RE.sub(" ", shape).strip()
+    return _PLACEHOLDER_LIST_RE.sub("(?...)", shape)
+
+
+class SlowQueryLog:
+    """Slow queries aggregated by shape."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+
+    def record(self, shape: str, seconds: float) -> Optional[dict]:
+        """Add one slow execution. Returns the entry if the shape is new."""
+        with self.lock:
+            entry = self.entries.get(shape)
+            if entry is not None:
+                entry["count"] += 1
+                entry["total_seconds"] += seconds
+                entry["max_seconds"] = max(entry["max_seconds"], seconds)
+                return None
+            entry = self.entries[shape] = {
+                "shape": shape,
+                "count": 1,
+                "total_seconds": seconds,
+                "max_seconds": seconds,
+                "plan": None
+            }
+            return entry
+
+    def report(self) -> List[dict]:
+        """Slow shapes, worst total time first."""
+        with self.lock:
+            entries = [dict(entry) for entry in self.entries.values()]
+        return sorted(entries, key=lambda e: e["total_seconds"], reverse=True)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def explain(conn, statement: str, parameters) -> Optional[str]:
+    """Capture the plan of a SELECT on the connection that ran it."""
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        # Raw DBAPI cursor, so the EXPLAIN does not go through the hooks again
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception as e:
+        return f"unavailable: {e}"
+    return "\n".join(" ".join(str(col) for col in row) for row in rows)
+
+
+def observe_query(conn, statement: str, parameters, seconds: float, executemany: bool) -> None:
+    """Log a query if it was slow."""
+    threshold_ms = get_settings().slow_query_ms
+    if threshold_ms <= 0 or seconds * 1000 < threshold_ms:
+        return
+    shape = normalize_sql(statement)
+    slow_queries.labels(tool="friend-keeper").inc()
+    entry = slow_query_log.record(shape, seconds)
+    if entry is None:
+        return
+    entry["plan"] = None if executemany else explain(conn, statement, parameters)
+    logger.warning("Slow query (%.1f ms): %s\nPlan:\n%s", seconds * 1000, shape, entry["plan"])
+
+
+def detector_enabled() -> bool:
+    return get_settings().query_detector_mode in ("log", "raise")
+
+
+def repeated_shapes(statements: Dict[str, int]) -> List[Tuple[str, int]]:
+    """Shapes run more often than the threshold, most repeated first."""
+    threshold = get_settings().query_repeat_threshold
+    offenders = [(shape, count) for shape, count in statements.items() if count > threshold]
+    return sorted(offenders, key=lambda item: item[1], reverse=True)
+
+
+def check_request(statements: Dict[str, int], endpoint: str) -> None:
+    """Report repeated statements of one request; raise in ``raise`` mode."""
+    offenders = repeated_shapes(statements)
+    if not offenders:
+        return
+    repeated_queries.labels(tool="friend-keeper", endpoint=endpoint).inc()
+    details = "; ".join(f"{count}x {shape}" for shape, count in offenders)
+    logger.warning("Repeated queries in %s: %s", endpoint, details)
+    if get_settings().query_detector_mode == "raise":
+        raise RepeatedQueryError(f"Repeated queries in {endpoint}: {details}")
@@ -0,0 +1,144 @@
+"""Per-request breakdown of where time goes.
+
+``MetricsMiddleware`` opens a ``RequestStats`` for each request and keeps
+it in a contextvar. SQLAlchemy engine hooks add every query's count and
+duration to it, ``phase()`` spans time named sections (LLM call, token
+checks), and ``TimedRoute`` marks when the endpoint function returned so
+the rest, up to the response start, counts as serialization.
+
+The contextvar is copied into the threadpool that runs sync endpoints and
+dependencies, and the stats object is shared, so their queries count too.
+"""
+import asyncio
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import query_monitor
+
+
+class RequestStats:
+    """Query count, DB time and named phase durations for one request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.phases: Dict[str, float] = {}
+        self.endpoint_done: Optional[float] = None
+        # Executions per statement shape, only counted while the detector is on
+        self.statements: Optional[Dict[str, int]] = {} if query_monitor.detector_enabled() else None
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Value for a ``Server-Timing`` header, durations in milliseconds."""
+        metrics = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"']
+        for name, seconds in self.phases.items():
+            metrics.append(f"{name};dur={seconds * 1000:.1f}")
+        metrics.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def begin() -> RequestStats:
+    """Start collecting stats for the current request."""
+    stats = RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def current() -> Optional[RequestStats]:
+    """Stats of the request being handled, if any."""
+    return _current.get()
+
+
+def allow_repeated_queries() -> None:
+    """Stop counting statement shapes for the current request.
+
+    For endpoints that repeat a statement on purpose, such as a streamed
+    list that reads one batch per query.
+    """
+    stats = _current.get()
+    if stats is not None:
+        stats.statements = None
+
+
+@contextmanager
+def phase(name: str):
+    """Time a section of request handling under ``name``."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_phase(name, time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._request_stats_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_request_stats_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    stats = _current.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+        if stats.statements is not None:
+            shape = query_monitor.normalize_sql(statement)
+            stats.statements[shape] = stats.statements.get(shape, 0) + 1
+    query_monitor.observe_query(conn, statement, parameters, elapsed, executemany)
+
+
+def install_query_hooks() -> None:
+    """Attribute queries on every engine to the current request."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _mark_done() -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.endpoint_done = time.perf_counter()
+
+
+class TimedRoute(APIRoute):
+    """Route that records when its endpoint function returns."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        call = self.dependant.call
+        # The request handler picks sync vs async from the call, so keep its kind
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def timed(*args, **kw):
+                try:
+                    return await call(*args, **kw)
+                finally:
+                    _mark_done()
+        else:
+            @functools.wraps(call)
+            def timed(*args, **kw):
+                try:
+                    return call(*args, **kw)
+                finally:
+                    _mark_done()
+        # The handler built by APIRoute reads dependant.call on each request
+        self.dependant.call = timed
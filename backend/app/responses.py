@@ -0,0 +1,52 @@
+"""Fast JSON responses.
+
+With ``FAST_RESPONSES`` on, endpoints return ``FastJSONResponse`` instead
+of a model for FastAPI to handle. FastAPI passes ``Response`` objects
+through untouched, so the ``response_model`` (still declared, for the
+OpenAPI schema) is not validated a second time against data the service
+layer has just built, and orjson does the encoding instead of
+``jsonable_encoder`` followed by the stdlib ``json``.
+
+Output is byte-for-byte what the default path produces for the same data:
+orjson writes naive datetimes and str enums exactly as Pydantic does.
+
+``json_array_chunks`` produces the same bytes for a streamed list, one
+chunk per batch of rows.
+"""
+from typing import Iterable, Iterator, List
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.config import get_settings
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson; accepts Pydantic models as-is."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default)
+
+
+def fast_responses_enabled() -> bool:
+    return get_settings().fast_responses
+
+
+def json_array_chunks(batches: Iterable[List]) -> Iterator[bytes]:
+    """Encode batches of items as one JSON array, a chunk per batch."""
+    yield b"["
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        chunk = b",".join(orjson.dumps(item, default=_default) for item in batch)
+        yield chunk if first else b"," + chunk
+        first = False
+    yield b"]"
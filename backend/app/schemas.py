@@ -71,6 +71,21 @@ class FriendResponse(BaseModel):
         from_attributes = True
 
 
+class FriendSummary(BaseModel):
+    """A friend in a list view, holding only the fields that were asked for."""
+    id: int
+    name: Optional[str] = None
+    nickname: Optional[str] = None
+    relation_type: Optional[RelationType] = None
+    contact_frequency: Optional[ContactFrequency] = None
+    notes: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    last_interaction: Optional[datetime] = None
+    health_status: Optional[str] = None
+    days_since_contact: Optional[int] = None
+
+
 class FriendDetailResponse(FriendResponse):
     interactions: List[InteractionResponse] = []
 
@@ -86,6 +101,19 @@ class TalkStarterResponse(BaseModel):
     context_used: str
 
 
+class TalkStarterBatchRequest(BaseModel):
+    friend_ids: List[int] = Field(..., min_length=1)
+    language: str = "en"
+
+
+class TalkStarterBatchItem(TalkStarterResponse):
+    friend_id: int
+
+
+class TalkStarterBatchResponse(BaseModel):
+    results: List[TalkStarterBatchItem]
+
+
 # Token schemas
 class TokenStatus(BaseModel):
     tokens_remaining: int
@@ -106,7 +134,7 @@ class CheckoutResponse(BaseModel):
 # Dashboard
 class DashboardResponse(BaseModel):
     total_friends: int
-    need_contact_today: List[FriendResponse]
-    need_contact_this_week: List[FriendResponse]
+    need_contact_today: List[FriendSummary]
+    need_contact_this_week: List[FriendSummary]
     healthy_friendships: int
     at_risk_friendships: int
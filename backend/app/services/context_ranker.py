@@ -0,0 +1,292 @@
+"""Relevance ranking of a friend's interactions for prompt context.
+
+Each friend gets an in-memory TF-IDF index over their interactions
+(summary plus follow-up topics), stored as flat NumPy arrays so scoring
+every interaction is a couple of vectorized passes. Indexes are built
+lazily and caught up from the database by interaction ID, both on use and
+right after an insert, so once warm no request re-reads a friend's full
+history and interactions written by other workers are still picked up.
+
+Only a friend's newest ``CONTEXT_INDEX_MAX_INTERACTIONS`` interactions
+are indexed, so one friend with a long history cannot pin unbounded
+memory; older ones reach the prompt through the rolling summary. Recency
+is measured in whole days, so the ranked context (and with it the
+starter cache's context hash) only changes when data does or a day
+passes.
+"""
+import json
+import math
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import Interaction
+from app.services import summary_service
+
+_TERM_RE = re.compile(rf"[{summary_service.CJK_CHARS}]|[^\W_{summary_service.CJK_CHARS}]{{2,}}")
+
+STOPWORDS = frozenset("""
+    about after again also and any are been but can did for from had has have her his how
+    into its just like more not now our out she some that the their them then there they
+    this was were what when which who will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms, one term per CJK character."""
+    return [term for term in _TERM_RE.findall(text.lower()) if term not in STOPWORDS]
+
+
+def _topics(interaction: Interaction) -> List[str]:
+    if not interaction.next_topics:
+        return []
+    try:
+        return list(json.loads(interaction.next_topics))
+    except json.JSONDecodeError:
+        return []
+
+
+class FriendIndex:
+    """TF-IDF index over one friend's interactions."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything indexed so far."""
+        self.last_id = 0
+        self.dropped = 0  # Interactions up to last_id that are not (or no longer) indexed
+        self.vocab: Dict[str, int] = {}
+        self.df = np.zeros(0, dtype=np.float64)
+        self.lines: List[List[str]] = []  # Formatted context lines per interaction
+        self.summary_lines: List[str] = []  # Each interaction's line in the rolling summary
+        self.topics: List[List[str]] = []
+        # Flat sparse storage: one entry per (interaction, term) pair
+        self.doc_of = np.zeros(0, dtype=np.int32)
+        self.term_of = np.zeros(0, dtype=np.int32)
+        self.tf = np.zeros(0, dtype=np.float64)
+        self.timestamps = np.zeros(0, dtype=np.float64)
+        self._pending: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def add(self, interaction: Interaction) -> None:
+        """Index one interaction. Interactions must arrive in ID order."""
+        if interaction.id <= self.last_id:
+            return
+        settings = get_settings()
+        topics = _topics(interaction)
+        counts: Dict[int, int] = {}
+        for term in tokenize(" ".join([interaction.summary or ""] + topics)):
+            term_id = self.vocab.setdefault(term, len(self.vocab))
+            counts[term_id] = counts.get(term_id, 0) + 1
+
+        self._pending.append((
+            len(self.lines),
+            counts,
+            interaction.contacted_at.timestamp()
+        ))
+        self.lines.append(
+            summary_service.format_interaction(interaction, settings.context_line_token_budget)
+        )
+        self.summary_lines.append(summary_service.summary_line(interaction))
+        self.topics.append(topics)
+        self.last_id = interaction.id
+
+    def _consolidate(self) -> None:
+        """Move pending interactions into the NumPy arrays in one copy."""
+        if not self._pending:
+            return
+        docs, terms, tfs, stamps = [], [], [], []
+        for doc, counts, stamp in self._pending:
+            docs.extend([doc] * len(counts))
+            terms.extend(counts.keys())
+            tfs.extend(1.0 + math.log(count) for count in counts.values())
+            stamps.append(stamp)
+
+        new_terms = np.array(terms, dtype=np.int32)
+        self.doc_of = np.concatenate([self.doc_of, np.array(docs, dtype=np.int32)])
+        self.term_of = np.concatenate([self.term_of, new_terms])
+        self.tf = np.concatenate([self.tf, np.array(tfs, dtype=np.float64)])
+        self.timestamps = np.concatenate([self.timestamps, np.array(stamps, dtype=np.float64)])
+
+        df = np.zeros(len(self.vocab), dtype=np.float64)
+        df[:len(self.df)] = self.df
+        df += np.bincount(new_terms, minlength=len(self.vocab))
+        self.df = df
+        self._pending = []
+
+    def trim(self, keep: int) -> None:
+        """Drop all but the newest ``keep`` interactions, and terms only they used."""
+        cut = len(self.lines) - keep
+        if cut <= 0:
+            return
+        self._consolidate()
+        mask = self.doc_of >= cut
+        used_terms, term_of = np.unique(self.term_of[mask], return_inverse=True)
+        terms = {term_id: term for term, term_id in self.vocab.items()}
+        self.vocab = {terms[int(term_id)]: i for i, term_id in enumerate(used_terms)}
+        self.doc_of = self.doc_of[mask] - cut
+        self.term_of = term_of.astype(np.int32)
+        self.tf = self.tf[mask]
+        self.timestamps = self.timestamps[cut:]
+        self.df = np.bincount(self.term_of, minlength=len(self.vocab)).astype(np.float64)
+        del self.lines[:cut], self.summary_lines[:cut], self.topics[:cut]
+        self.dropped += cut
+
+    def open_topics(self, limit: int = 3) -> List[str]:
+        """Follow-up topics from the newest interactions that have any."""
+        topics = []
+        found = 0
+        for doc_topics in reversed(self.topics):
+            if doc_topics:
+                topics.extend(doc_topics)
+                found += 1
+                if found >= limit:
+                    break
+        return topics
+
+    def score(self, query_terms: List[str], now: Optional[datetime] = None) -> np.ndarray:
+        """Score every interaction by cosine similarity to the query plus recency."""
+        settings = get_settings()
+        self._consolidate()
+        n_docs = len(self.lines)
+        if n_docs == 0:
+            return np.zeros(0)
+
+        # Whole days, so scores do not drift between requests
+        now_ts = math.floor((now or datetime.utcnow()).timestamp() / 86400.0) * 86400.0
+        age_days = np.maximum(now_ts - self.timestamps, 0.0) / 86400.0
+        scores = settings.context_recency_weight * np.exp2(-age_days / settings.context_recency_half_life_days)
+
+        query = np.zeros(len(self.vocab), dtype=np.float64)
+        for term in query_terms:
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                query[term_id] += 1.0
+        if not query.any():
+            return scores
+
+        idf = np.log((1.0 + n_docs) / (1.0 + self.df)) + 1.0
+        query = np.where(query > 0, (1.0 + np.log(np.maximum(query, 1.0))) * idf, 0.0)
+        weights = self.tf * idf[self.term_of]
+
+        dots = np.bincount(self.doc_of, weights=weights * query[self.term_of], minlength=n_docs)
+        norms = np.sqrt(np.bincount(self.doc_of, weights=weights * weights, minlength=n_docs))
+        similarity = dots / (norms * np.linalg.norm(query) + 1e-12)
+        return scores + similarity
+
+    def select(self, top_k: int, char_budget: int, now: Optional[datetime] = None) -> List[List[str]]:
+        """Pick the best interactions that fit the character budget, newest first."""
+        return [self.lines[doc] for doc in self.select_docs(top_k, char_budget, now)]
+
+    def select_docs(self, top_k: int, char_budget: int, now: Optional[datetime] = None) -> List[int]:
+        """Positions of the interactions ``select`` picks, newest first."""
+        scores = self.score(tokenize(" ".join(self.open_topics())), now)
+        if len(scores) == 0:
+            return []
+
+        # Only the best few candidates can make it in; avoid a full sort
+        candidates = min(len(scores), top_k * 4)
+        best = np.argpartition(-scores, candidates - 1)[:candidates]
+        best = best[np.argsort(-scores[best], kind="stable")]
+
+        chosen = []
+        used = 0
+        for doc in best:
+            size = sum(len(line) + 1 for line in self.lines[doc])
+            if used + size > char_budget:
+                continue
+            chosen.append(int(doc))
+            used += size
+            if len(chosen) >= top_k:
+                break
+
+        return sorted(chosen, reverse=True)
+
+
+_indexes: "OrderedDict[int, FriendIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _cached_index(friend_id: int, create: bool) -> Optional[FriendIndex]:
+    with _indexes_lock:
+        index = _indexes.get(friend_id)
+        if index is not None:
+            _indexes.move_to_end(friend_id)
+        elif create:
+            index = _indexes[friend_id] = FriendIndex()
+            while len(_indexes) > get_settings().context_index_cache_size:
+                _indexes.popitem(last=False)
+        return index
+
+
+def _catch_up(db: Session, friend_id: int, index: FriendIndex) -> None:
+    max_interactions = get_settings().context_index_max_interactions
+    with index.lock:
+        if index.last_id:
+            # SQLite may reuse IDs of deleted friends; a count mismatch means
+            # the index belongs to a friend that no longer exists
+            indexed = db.query(func.count(Interaction.id)).filter(
+                Interaction.friend_id == friend_id,
+                Interaction.id <= index.last_id
+            ).scalar()
+            if indexed != len(index) + index.dropped:
+                index.reset()
+
+        # Never read more than the window, however far behind the index is
+        newer = db.query(Interaction).filter(
+            Interaction.friend_id == friend_id,
+            Interaction.id > index.last_id
+        ).order_by(Interaction.id.desc()).limit(max_interactions).all()
+        if not newer:
+            return
+        skipped = db.query(func.count(Interaction.id)).filter(
+            Interaction.friend_id == friend_id,
+            Interaction.id > index.last_id,
+            Interaction.id < newer[-1].id
+        ).scalar()
+        if skipped:
+            # Too far behind: everything indexed so far is older than the window
+            index.trim(0)
+            index.dropped += skipped
+        for interaction in reversed(newer):
+            index.add(interaction)
+        # Trim in steps, so a friend at the cap does not rebuild on every insert
+        if len(index) > max_interactions + max_interactions // 4:
+            index.trim(max_interactions)
+
+
+def get_index(db: Session, friend_id: int) -> FriendIndex:
+    """Get a friend's index, catching up on interactions written elsewhere."""
+    index = _cached_index(friend_id, create=True)
+    _catch_up(db, friend_id, index)
+    return index
+
+
+def refresh_index(db: Session, friend_id: int) -> None:
+    """Catch a loaded index up after an insert; unloaded indexes are built on first use."""
+    index = _cached_index(friend_id, create=False)
+    if index is not None:
+        _catch_up(db, friend_id, index)
+
+
+def evict(friend_id: int) -> None:
+    """Drop a friend's index, e.g. when the friend is deleted."""
+    with _indexes_lock:
+        _indexes.pop(friend_id, None)
+
+
+def clear() -> None:
+    """Drop all indexes."""
+    with _indexes_lock:
+        _indexes.clear()
@@ -0,0 +1,171 @@
+"""Client for the Creem payments API.
+
+One instance is built at startup and shared: it holds a pooled
+``httpx.AsyncClient`` so calls reuse keep-alive connections, and the
+product catalog, validated once so a bad ``CREEM_PRODUCT_IDS`` stops the
+app from booting instead of failing each checkout.
+
+Lookups are retried with jittered exponential back-off. Checkout creation
+is retried too, but always with the same idempotency key, so the provider
+can collapse a retry whose first attempt did reach it.
+"""
+import asyncio
+import json
+import random
+import uuid
+from typing import Dict, Optional
+
+import httpx
+
+from app import tracing
+from app.config import get_settings
+
+# Product configuration
+PRODUCTS = {
+    "starter": {"tokens": 10, "price_cents": 499},
+    "popular": {"tokens": 30, "price_cents": 999},
+    "pro": {"tokens": 100, "price_cents": 2499}
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CatalogError(ValueError):
+    """Raised at startup when the product configuration is invalid."""
+
+
+class Product:
+    """A purchasable token pack and its Creem product ID."""
+
+    def __init__(self, sku: str, tokens: int, price_cents: int, creem_product_id: Optional[str]):
+        self.sku = sku
+        self.tokens = tokens
+        self.price_cents = price_cents
+        self.creem_product_id = creem_product_id
+
+
+def build_catalog(product_ids_json: str, require_ids: bool) -> Dict[str, Product]:
+    """Merge ``PRODUCTS`` with the configured Creem product IDs.
+
+    With ``require_ids`` (payments configured) every product needs an ID.
+    """
+    try:
+        product_ids = json.loads(product_ids_json)
+    except json.JSONDecodeError as e:
+        raise CatalogError(f"CREEM_PRODUCT_IDS is not valid JSON: {e}")
+    if not isinstance(product_ids, dict):
+        raise CatalogError("CREEM_PRODUCT_IDS must be a JSON object of SKU to product ID")
+
+    unknown = set(product_ids) - set(PRODUCTS)
+    if unknown:
+        raise CatalogError(f"CREEM_PRODUCT_IDS has unknown SKUs: {', '.join(sorted(unknown))}")
+
+    catalog = {}
+    for sku, product in PRODUCTS.items():
+        creem_product_id = product_ids.get(sku)
+        if creem_product_id is not None and (not isinstance(creem_product_id, str) or not creem_product_id):
+            raise CatalogError(f"Creem product ID for {sku} must be a non-empty string")
+        if require_ids and not creem_product_id:
+            raise CatalogError(f"No Creem product ID configured for {sku}")
+        catalog[sku] = Product(sku, product["tokens"], product["price_cents"], creem_product_id)
+    return catalog
+
+
+class CreemClient:
+    """Thin async wrapper around the Creem REST API."""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.creem.io",
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        catalog: Optional[Dict[str, Product]] = None,
+        max_retries: int = 2,
+        retry_base_seconds: float = 0.2,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.api_key = api_key
+        self.catalog = catalog if catalog is not None else build_catalog("{}", require_ids=False)
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.http = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers={"x-api-key": api_key},
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            transport=transport
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request, retrying connection errors and retryable statuses."""
+        headers = kwargs.pop("headers", {})
+        for attempt in range(self.max_retries + 1):
+            try:
+                with tracing.span("creem.request", method=method, path=path, attempt=attempt) as span:
+                    response = await self.http.request(
+                        method, path, headers={**headers, **tracing.outbound_headers()}, **kwargs
+                    )
+                    if span:
+                        span.set("http.status_code", response.status_code)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+            # Full jitter keeps retries from many workers from lining up
+            await asyncio.sleep(random.uniform(0, self.retry_base_seconds * 2 ** attempt))
+
+    async def get_checkout(self, checkout_id: str) -> dict:
+        """Fetch a checkout session, including its ``status``."""
+        response = await self._request("GET", "/v1/checkouts", params={"checkout_id": checkout_id})
+        return response.json()
+
+    async def create_checkout(
+        self,
+        product: Product,
+        success_url: str,
+        metadata: dict,
+        idempotency_key: Optional[str] = None
+    ) -> dict:
+        """Create a checkout session for a catalog product."""
+        idempotency_key = idempotency_key or str(uuid.uuid4())
+        response = await self._request(
+            "POST",
+            "/v1/checkouts",
+            headers={"Idempotency-Key": idempotency_key},
+            json={
+                "product_id": product.creem_product_id,
+                "request_id": idempotency_key,
+                "success_url": success_url,
+                "metadata": metadata
+            }
+        )
+        return response.json()
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+
+def build_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> CreemClient:
+    """Build a client and its catalog from settings. Raises CatalogError if misconfigured."""
+    settings = get_settings()
+    return CreemClient(
+        api_key=settings.creem_api_key,
+        base_url=settings.creem_api_url,
+        timeout=settings.creem_timeout_seconds,
+        max_connections=settings.creem_max_connections,
+        catalog=build_catalog(settings.creem_product_ids, require_ids=bool(settings.creem_api_key)),
+        max_retries=settings.creem_max_retries,
+        retry_base_seconds=settings.creem_retry_base_seconds,
+        transport=transport
+    )
@@ -0,0 +1,319 @@
+"""Daily "who to contact" digest for every device.
+
+For each device the digest lists its overdue friends (red, or never
+contacted) and the friends turning red within ``DIGEST_DUE_SOON_DAYS``,
+each with any unexpired pre-generated talk starters from the starter
+cache. Devices without such friends get no digest.
+
+Devices are enumerated in keyset-paginated chunks of ``DIGEST_CHUNK_SIZE``
+(served by the ``friends.device_id`` index) and each chunk is built by a
+worker process from one streamed query, so neither side holds more than a
+chunk of friends. Digests go to the ``device_digests`` table or to one
+JSON Lines file per chunk; both are overwritten when a chunk is rebuilt,
+so re-runs are harmless.
+
+After every chunk the last device of the longest run of finished chunks
+is written to ``DIGEST_CHECKPOINT_FILE``. An interrupted run started again
+on the same day continues from there; ``--restart`` starts over.
+
+Run it nightly from cron or by hand::
+
+    python -m app.services.digest_job --workers 4
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import Base, SessionLocal, engine
+from app.models import DeviceDigest, Friend, Interaction, TalkStarterCache
+from app.services import friend_service
+
+logger = logging.getLogger(__name__)
+
+SINKS = ("table", "file")
+STARTER_LOOKUP_BATCH = 500  # Friend IDs per starter cache query
+
+
+class DigestReport:
+    """Counts of what one digest run did."""
+
+    def __init__(self):
+        self.devices = 0
+        self.digests = 0
+        self.friends = 0  # Listed across all digests
+        self.chunks = 0
+        self.resumed_after: Optional[str] = None
+        self.duration_seconds = 0.0
+
+    def add(self, counts: Tuple[int, int, int]) -> None:
+        devices, digests, friends = counts
+        self.devices += devices
+        self.digests += digests
+        self.friends += friends
+        self.chunks += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "devices": self.devices,
+            "digests": self.digests,
+            "friends": self.friends,
+            "chunks": self.chunks,
+            "resumed_after": self.resumed_after,
+            "duration_seconds": round(self.duration_seconds, 3),
+            "devices_per_second": round(self.devices / self.duration_seconds, 1) if self.duration_seconds else 0.0
+        }
+
+
+def _friend_rows(db: Session, device_ids: List[str], batch_size: int):
+    last_contact = select(func.max(Interaction.contacted_at)).where(
+        Interaction.friend_id == Friend.id
+    ).correlate(Friend).scalar_subquery().label("last_contact")
+    statement = select(
+        Friend.id, Friend.device_id, Friend.name, Friend.nickname, Friend.contact_frequency, last_contact
+    ).where(Friend.device_id.in_(device_ids)).order_by(Friend.device_id, Friend.id)
+    return db.execute(statement.execution_options(yield_per=batch_size))
+
+
+def _cached_starters(db: Session, friend_ids: List[int], now: datetime) -> Dict[int, List[str]]:
+    """Each friend's newest unexpired starters, in whatever language they were generated in."""
+    starters = {}
+    for i in range(0, len(friend_ids), STARTER_LOOKUP_BATCH):
+        rows = db.query(TalkStarterCache.friend_id, TalkStarterCache.starters).filter(
+            TalkStarterCache.friend_id.in_(friend_ids[i:i + STARTER_LOOKUP_BATCH]),
+            TalkStarterCache.expires_at > now
+        ).order_by(TalkStarterCache.created_at, TalkStarterCache.id)
+        # Oldest first, so the newest entry per friend wins
+        starters.update((friend_id, json.loads(value)) for friend_id, value in rows)
+    return starters
+
+
+def build_digests(
+    db: Session,
+    device_ids: List[str],
+    now: datetime,
+    due_soon_days: int,
+    batch_size: int = 1000
+) -> List[dict]:
+    """Digests for the devices that have overdue or due-soon friends."""
+    due_soon_until = now + timedelta(days=due_soon_days)
+    digests = []
+    for device_id, rows in groupby(_friend_rows(db, device_ids, batch_size), key=lambda row: row.device_id):
+        overdue, due_soon = [], []
+        for row in rows:
+            red_at = None
+            if row.last_contact is not None:
+                _, red_at = friend_service.get_transition_times(row.last_contact, row.contact_frequency)
+                if red_at > due_soon_until:
+                    continue
+            entry = {
+                "id": row.id,
+                "name": row.name,
+                "nickname": row.nickname,
+                "last_contact": row.last_contact.isoformat() if row.last_contact else None,
+                "days_since_contact": (now - row.last_contact).days if row.last_contact else None,
+                "red_at": red_at.isoformat() if red_at else None,
+                "talk_starters": []
+            }
+            (overdue if red_at is None or red_at <= now else due_soon).append(entry)
+        if overdue or due_soon:
+            # Never contacted first, then longest without contact; due soon by due time
+            overdue.sort(key=lambda e: (e["last_contact"] is not None, e["last_contact"] or ""))
+            due_soon.sort(key=lambda e: e["red_at"])
+            digests.append({
+                "device_id": device_id,
+                "digest_date": now.date().isoformat(),
+                "overdue": overdue,
+                "due_soon": due_soon
+            })
+
+    entries = [entry for digest in digests for entry in digest["overdue"] + digest["due_soon"]]
+    starters = _cached_starters(db, [entry["id"] for entry in entries], now)
+    for entry in entries:
+        entry["talk_starters"] = starters.get(entry["id"], [])
+    return digests
+
+
+def write_table(db: Session, digest_date: date, device_ids: List[str], digests: List[dict]) -> None:
+    """Replace the chunk's digests for the day in ``device_digests``."""
+    db.query(DeviceDigest).filter(
+        DeviceDigest.digest_date == digest_date,
+        DeviceDigest.device_id.in_(device_ids)
+    ).delete(synchronize_session=False)
+    db.add_all([
+        DeviceDigest(
+            device_id=digest["device_id"],
+            digest_date=digest_date,
+            overdue_count=len(digest["overdue"]),
+            due_soon_count=len(digest["due_soon"]),
+            payload=json.dumps(digest)
+        )
+        for digest in digests
+    ])
+    db.commit()
+
+
+def write_file(output_dir: str, digest_date: date, device_ids: List[str], digests: List[dict]) -> str:
+    """Write the chunk's digests to ``<output_dir>/<date>/<chunk>.jsonl``, replacing any earlier file."""
+    directory = os.path.join(output_dir, digest_date.isoformat())
+    os.makedirs(directory, exist_ok=True)
+    name = hashlib.sha1(device_ids[0].encode()).hexdigest()[:16]
+    path = os.path.join(directory, f"{name}.jsonl")
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        for digest in digests:
+            f.write(json.dumps(digest) + "\n")
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def process_chunk(session_factory: Callable[[], Session], device_ids: List[str], options: dict) -> Tuple[int, int, int]:
+    """Build and write one chunk's digests. Returns (devices, digests, friends listed)."""
+    now = options["now"]
+    db = session_factory()
+    try:
+        digests = build_digests(db, device_ids, now, options["due_soon_days"])
+        if options["sink"] == "table":
+            write_table(db, now.date(), device_ids, digests)
+        else:
+            write_file(options["output_dir"], now.date(), device_ids, digests)
+    finally:
+        db.close()
+    friends = sum(len(d["overdue"]) + len(d["due_soon"]) for d in digests)
+    return len(device_ids), len(digests), friends
+
+
+def _process_chunk_in_worker(device_ids: List[str], options: dict) -> Tuple[int, int, int]:
+    return process_chunk(SessionLocal, device_ids, options)
+
+
+def device_chunks(session_factory: Callable[[], Session], after: Optional[str], chunk_size: int) -> Iterator[List[str]]:
+    """Device IDs in order, after ``after``, a chunk at a time."""
+    while True:
+        db = session_factory()
+        try:
+            query = select(Friend.device_id).distinct().order_by(Friend.device_id).limit(chunk_size)
+            if after is not None:
+                query = query.where(Friend.device_id > after)
+            device_ids = list(db.scalars(query))
+        finally:
+            db.close()
+        if not device_ids:
+            return
+        yield device_ids
+        if len(device_ids) < chunk_size:
+            return
+        after = device_ids[-1]
+
+
+def load_checkpoint(path: str, digest_date: date) -> Optional[dict]:
+    """The checkpoint of an earlier run for the same day, if any."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return checkpoint if checkpoint.get("digest_date") == digest_date.isoformat() else None
+
+
+def save_checkpoint(path: str, digest_date: date, after: Optional[str], done: bool = False) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"digest_date": digest_date.isoformat(), "after": after, "done": done}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def run_digests(
+    session_factory: Callable[[], Session] = SessionLocal,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    sink: Optional[str] = None,
+    checkpoint_file: Optional[str] = None,
+    restart: bool = False,
+    now: Optional[datetime] = None
+) -> DigestReport:
+    """Build today's digest for every device, resuming from the checkpoint.
+
+    With ``workers`` 0 chunks run in this process with ``session_factory``;
+    otherwise worker processes open their own ``SessionLocal`` sessions.
+    """
+    settings = get_settings()
+    workers = settings.digest_workers if workers is None else workers
+    chunk_size = chunk_size or settings.digest_chunk_size
+    checkpoint_file = checkpoint_file or settings.digest_checkpoint_file
+    options = {
+        "now": now or datetime.utcnow(),
+        "sink": sink or settings.digest_sink,
+        "due_soon_days": settings.digest_due_soon_days,
+        "output_dir": settings.digest_output_dir
+    }
+    if options["sink"] not in SINKS:
+        raise ValueError(f"Unknown digest sink: {options['sink']}")
+    digest_date = options["now"].date()
+
+    report = DigestReport()
+    checkpoint = None if restart else load_checkpoint(checkpoint_file, digest_date)
+    if checkpoint and checkpoint["done"]:
+        logger.info("Digests for %s are already complete", digest_date)
+        return report
+    after = checkpoint["after"] if checkpoint else None
+    report.resumed_after = after
+    start = time.perf_counter()
+
+    chunks = device_chunks(session_factory, after, chunk_size)
+    if workers == 0:
+        for device_ids in chunks:
+            report.add(process_chunk(session_factory, device_ids, options))
+            save_checkpoint(checkpoint_file, digest_date, device_ids[-1])
+    else:
+        # Chunks finish out of order; the checkpoint only moves past a
+        # chunk once every chunk before it has finished too
+        in_flight: deque = deque()
+
+        def advance() -> None:
+            last_device = None
+            while in_flight and in_flight[0][1].done():
+                last_device, future = in_flight.popleft()
+                report.add(future.result())
+            if last_device is not None:
+                save_checkpoint(checkpoint_file, digest_date, last_device)
+
+        context = multiprocessing.get_context("spawn")  # Fresh engines, no forked connections
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            for device_ids in chunks:
+                in_flight.append((device_ids[-1], pool.submit(_process_chunk_in_worker, device_ids, options)))
+                if len(in_flight) >= 2 * workers:
+                    wait([in_flight[0][1]])
+                advance()
+            while in_flight:
+                wait([in_flight[0][1]])
+                advance()
+
+    save_checkpoint(checkpoint_file, digest_date, None, done=True)
+    report.duration_seconds = time.perf_counter() - start
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the daily who-to-contact digest for every device.")
+    parser.add_argument("--workers", type=int, help="Worker processes; 0 runs in this process")
+    parser.add_argument("--chunk-size", type=int, help="Devices per chunk")
+    parser.add_argument("--sink", choices=SINKS)
+    parser.add_argument("--restart", action="store_true", help="Ignore today's checkpoint")
+    args = parser.parse_args()
+    Base.metadata.create_all(bind=engine)
+    report = run_digests(workers=args.workers, chunk_size=args.chunk_size, sink=args.sink, restart=args.restart)
+    print(json.dumps(report.as_dict()))
@@ -1,10 +1,14 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import func, or_, and_, select as db_select
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Sequence, Tuple
+import math
 
+from app import events
 from app.models import Friend, Interaction, ContactFrequency
-from app.schemas import FriendCreate, FriendUpdate, FriendResponse
+from app.schemas import FriendCreate, FriendUpdate, FriendResponse, FriendSummary
+from app.services import context_ranker, health_metrics, reminder_scheduler
+from app.tracing import traced
 
 
 def get_frequency_days(frequency: ContactFrequency) -> int:
@@ -34,37 +38,214 @@ def calculate_health_status(last_interaction: Optional[datetime], frequency: Con
         return "red", days_since
 
 
-def get_friends(db: Session, device_id: str) -> List[FriendResponse]:
-    """Get all friends for a device with health status."""
-    friends = db.query(Friend).filter(Friend.device_id == device_id).all()
-    result = []
+def get_transition_times(last_interaction: datetime, frequency: ContactFrequency) -> Tuple[datetime, datetime]:
+    """Get the moments a friendship turns yellow and red, matching calculate_health_status."""
+    target_days = get_frequency_days(frequency)
+    yellow_at = last_interaction + timedelta(days=math.floor(target_days * 0.7) + 1)
+    red_at = last_interaction + timedelta(days=target_days + 1)
+    return yellow_at, red_at
+
+
+@traced
+def get_friends_nearing_transition(db: Session, within: timedelta, limit: int = 1000) -> List[Friend]:
+    """Get friends across all devices that turn yellow or red within the given window."""
+    now = datetime.utcnow()
+    last_contact = db.query(
+        Interaction.friend_id,
+        func.max(Interaction.contacted_at).label("last_contact")
+    ).group_by(Interaction.friend_id).subquery()
     
-    for friend in friends:
-        # Get last interaction
-        last_interaction = db.query(func.max(Interaction.contacted_at)).filter(
-            Interaction.friend_id == friend.id
-        ).scalar()
-        
-        health_status, days_since = calculate_health_status(last_interaction, friend.contact_frequency)
-        
-        friend_response = FriendResponse(
-            id=friend.id,
-            name=friend.name,
-            nickname=friend.nickname,
-            relation_type=friend.relation_type,
-            contact_frequency=friend.contact_frequency,
-            notes=friend.notes,
-            created_at=friend.created_at,
-            updated_at=friend.updated_at,
-            last_interaction=last_interaction,
-            health_status=health_status,
-            days_since_contact=days_since
-        )
-        result.append(friend_response)
+    conditions = []
+    for frequency in ContactFrequency:
+        # A transition at last + offset falls in [now, now + within)
+        # exactly when last falls in [now - offset, now + within - offset)
+        yellow_at, red_at = get_transition_times(now, frequency)
+        for offset in (yellow_at - now, red_at - now):
+            conditions.append(and_(
+                Friend.contact_frequency == frequency,
+                last_contact.c.last_contact >= now - offset,
+                last_contact.c.last_contact < now + within - offset
+            ))
     
-    return result
+    return db.query(Friend).join(
+        last_contact, last_contact.c.friend_id == Friend.id
+    ).filter(or_(*conditions)).limit(limit).all()
+
+
+def _last_contact_column():
+    """Correlated subquery for a friend's latest interaction, served by the friend_id index."""
+    return db_select(func.max(Interaction.contacted_at)).where(
+        Interaction.friend_id == Friend.id
+    ).correlate(Friend).scalar_subquery().label("last_contact")
+
+
+def to_friend_response(friend: Friend, last_interaction: Optional[datetime]) -> FriendResponse:
+    """Build the API representation of a friend with its health status."""
+    health_status, days_since = calculate_health_status(last_interaction, friend.contact_frequency)
+    return FriendResponse(
+        id=friend.id,
+        name=friend.name,
+        nickname=friend.nickname,
+        relation_type=friend.relation_type,
+        contact_frequency=friend.contact_frequency,
+        notes=friend.notes,
+        created_at=friend.created_at,
+        updated_at=friend.updated_at,
+        last_interaction=last_interaction,
+        health_status=health_status,
+        days_since_contact=days_since
+    )
+
+
+@traced
+def get_friends(db: Session, device_id: str) -> List[FriendResponse]:
+    """Get all friends for a device with health status, in one query."""
+    rows = db.query(Friend, _last_contact_column()).filter(
+        Friend.device_id == device_id
+    ).order_by(Friend.id).all()
+    return [to_friend_response(friend, last_interaction) for friend, last_interaction in rows]
+
+
+# Fields of a friend in API responses, in response order
+FRIEND_FIELDS = (
+    "id", "name", "nickname", "relation_type", "contact_frequency", "notes",
+    "created_at", "updated_at", "last_interaction", "health_status", "days_since_contact"
+)
+# Computed from the latest interaction rather than read from the friends table
+DERIVED_FIELDS = ("last_interaction", "health_status", "days_since_contact")
+
+
+def parse_fields(fields: Optional[str], required: Sequence[str] = ("id",)) -> Tuple[str, ...]:
+    """Turn a comma-separated ``fields=`` value into response fields, in response order.
+
+    ``None`` selects every field, so clients that do not ask for a projection
+    keep getting the full friend. Raises ValueError on unknown fields.
+    """
+    if fields is None:
+        requested = set(FRIEND_FIELDS)
+    else:
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested - set(FRIEND_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return with_fields(requested, *required)
+
+
+def with_fields(fields: Sequence[str], *extra: str) -> Tuple[str, ...]:
+    """``fields`` plus ``extra``, in response order."""
+    wanted = set(fields) | set(extra)
+    return tuple(field for field in FRIEND_FIELDS if field in wanted)
 
 
+def _columns_for(fields: Sequence[str]) -> list:
+    """Friend columns needed to produce ``fields``."""
+    names = [field for field in fields if field not in DERIVED_FIELDS]
+    if any(field in DERIVED_FIELDS for field in fields) and "contact_frequency" not in names:
+        names.append("contact_frequency")
+    return [getattr(Friend, name) for name in names]
+
+
+def _field_values(values: dict, last_interaction: Optional[datetime], fields: Sequence[str]) -> dict:
+    """Pick ``fields`` from column values, computing the derived ones."""
+    if any(field in DERIVED_FIELDS for field in fields):
+        health_status, days_since = calculate_health_status(last_interaction, values["contact_frequency"])
+        values = {
+            **values,
+            "last_interaction": last_interaction,
+            "health_status": health_status,
+            "days_since_contact": days_since
+        }
+    return {field: values[field] for field in fields}
+
+
+@traced
+def get_friend_summaries(db: Session, device_id: str, fields: Sequence[str]) -> List[FriendSummary]:
+    """Friends for a device holding only ``fields``, in one query.
+
+    Columns that are not needed are deferred, so they are never fetched;
+    the latest-contact subquery only runs when a derived field is wanted.
+    """
+    columns = _columns_for(fields)
+    needs_last = any(field in DERIVED_FIELDS for field in fields)
+    query = db.query(Friend, _last_contact_column()) if needs_last else db.query(Friend)
+    rows = query.options(load_only(*columns)).filter(
+        Friend.device_id == device_id
+    ).order_by(Friend.id).all()
+    if not needs_last:
+        rows = [(friend, None) for friend in rows]
+
+    names = [column.key for column in columns]
+    return [
+        FriendSummary(**_field_values({name: getattr(friend, name) for name in names}, last, fields))
+        for friend, last in rows
+    ]
+
+
+def _friend_rows_statement(device_id: str, fields: Sequence[str]):
+    """Select of just the columns ``fields`` need; also returns their names and
+    whether the last column is the latest contact."""
+    columns = _columns_for(fields)
+    needs_last = any(field in DERIVED_FIELDS for field in fields)
+    statement = db_select(*columns, _last_contact_column()) if needs_last else db_select(*columns)
+    statement = statement.where(Friend.device_id == device_id).order_by(Friend.id)
+    return statement, [column.key for column in columns], needs_last
+
+
+@traced
+def get_friend_rows(db: Session, device_id: str, fields: Sequence[str] = FRIEND_FIELDS) -> List[dict]:
+    """Like ``get_friend_summaries``, but as plain dicts built from row tuples.
+
+    Skips ORM identity-map bookkeeping and Pydantic models entirely, for
+    responses encoded straight to JSON.
+    """
+    statement, names, needs_last = _friend_rows_statement(device_id, fields)
+    return [
+        _field_values(dict(zip(names, row)), row[-1] if needs_last else None, fields)
+        for row in db.execute(statement)
+    ]
+
+
+def iter_friend_rows(
+    db: Session,
+    device_id: str,
+    fields: Sequence[str] = FRIEND_FIELDS,
+    batch_size: int = 500
+) -> Iterator[List[dict]]:
+    """Like ``get_friend_rows``, in batches of at most ``batch_size`` rows.
+
+    Only one batch is held at a time, so memory stays flat however many
+    friends the device has. Each batch is its own short keyset query
+    (``id > last id``) in its own transaction: no cursor or read lock is
+    held while a slow client drains the previous batch, so writers are
+    never blocked by a stream.
+    """
+    statement, names, needs_last = _friend_rows_statement(device_id, fields)
+    statement = statement.add_columns(Friend.id).limit(batch_size)
+    last_id = 0
+    while True:
+        rows = db.execute(statement.where(Friend.id > last_id)).all()
+        db.commit()  # Ends the read transaction between batches
+        if not rows:
+            return
+        yield [
+            _field_values(dict(zip(names, row)), row[-2] if needs_last else None, fields)
+            for row in rows
+        ]
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][-1]
+
+
+@traced
+def get_friend_response(db: Session, friend: Friend) -> FriendResponse:
+    """Get one friend's API representation with health status."""
+    last_interaction = db.query(func.max(Interaction.contacted_at)).filter(
+        Interaction.friend_id == friend.id
+    ).scalar()
+    return to_friend_response(friend, last_interaction)
+
+
+@traced
 def get_friend(db: Session, friend_id: int, device_id: str) -> Optional[Friend]:
     """Get a single friend by ID."""
     return db.query(Friend).filter(
@@ -73,6 +254,7 @@ def get_friend(db: Session, friend_id: int, device_id: str) -> Optional[Friend]:
     ).first()
 
 
+@traced
 def create_friend(db: Session, device_id: str, friend_data: FriendCreate) -> Friend:
     """Create a new friend."""
     friend = Friend(
@@ -86,25 +268,45 @@ def create_friend(db: Session, device_id: str, friend_data: FriendCreate) -> Fri
     db.add(friend)
     db.commit()
     db.refresh(friend)
+    # No interactions yet
+    health_metrics.record_transition(None, "red")
+    events.publish(device_id, "friend.created", {"friend_id": friend.id})
     return friend
 
 
+@traced
 def update_friend(db: Session, friend: Friend, friend_data: FriendUpdate) -> Friend:
     """Update a friend."""
     update_data = friend_data.model_dump(exclude_unset=True)
+    old_frequency = friend.contact_frequency
     for key, value in update_data.items():
         setattr(friend, key, value)
     db.commit()
     db.refresh(friend)
+    if friend.contact_frequency != old_frequency:
+        health_metrics.record_transition(
+            health_metrics.current_status(db, friend, old_frequency),
+            health_metrics.current_status(db, friend)
+        )
+        reminder_scheduler.frequency_changed(db, friend)
+    events.publish(friend.device_id, "friend.updated", {"friend_id": friend.id})
     return friend
 
 
+@traced
 def delete_friend(db: Session, friend: Friend) -> None:
     """Delete a friend."""
+    status = health_metrics.current_status(db, friend)
+    device_id = friend.device_id
     db.delete(friend)
     db.commit()
+    context_ranker.evict(friend.id)
+    health_metrics.record_transition(status, None)
+    reminder_scheduler.friend_deleted(friend.id)
+    events.publish(device_id, "friend.deleted", {"friend_id": friend.id})
 
 
+@traced
 def get_friends_needing_contact(db: Session, device_id: str, days_threshold: int = 0) -> List[FriendResponse]:
     """Get friends that need to be contacted (past their frequency threshold)."""
     friends = get_friends(db, device_id)
@@ -116,3 +318,14 @@ def get_friends_needing_contact(db: Session, device_id: str, days_threshold: int
             result.append(friend)
     
     return sorted(result, key=lambda x: x.days_since_contact or 999, reverse=True)
+
+
+@traced
+def get_friends_by_ids(db: Session, friend_ids: List[int], device_id: str) -> List[Friend]:
+    """Get several friends by ID in one query, in the order requested."""
+    friends = db.query(Friend).filter(
+        Friend.id.in_(friend_ids),
+        Friend.device_id == device_id
+    ).all()
+    by_id = {friend.id: friend for friend in friends}
+    return [by_id[friend_id] for friend_id in friend_ids if friend_id in by_id]
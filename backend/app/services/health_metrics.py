@@ -0,0 +1,151 @@
+"""Fleet-wide friendship health gauges.
+
+``active_friendships`` and ``friendship_health{status}`` are kept current
+incrementally: friend and interaction writes report the status change they
+caused via ``record_transition``. Health also drifts with time alone (a
+friend turns yellow without any write), so ``HealthMetricsReconciler``
+periodically resets the counts from one aggregate query. Neither path
+scans the friends table inside a request or a ``/metrics`` scrape.
+
+Until the first reconciliation there is no baseline, so increments are
+ignored. With several worker processes each worker keeps its own tally
+and the gauges report the most recently written one; they are exact
+after each reconciliation and approximate in between.
+"""
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.metrics import active_friendships, friendship_health
+from app.models import ContactFrequency, Friend, Interaction
+from app.services import friend_service
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("green", "yellow", "red")
+
+_counts: Optional[Dict[str, int]] = None
+_lock = threading.Lock()
+
+
+def _export() -> None:
+    active_friendships.labels(tool="friend-keeper").set(sum(_counts.values()))
+    for status in STATUSES:
+        friendship_health.labels(tool="friend-keeper", status=status).set(_counts[status])
+
+
+def record_transition(old_status: Optional[str], new_status: Optional[str]) -> None:
+    """Record a friend moving between statuses; None means "does not exist"."""
+    if old_status == new_status:
+        return
+    with _lock:
+        if _counts is None:
+            return
+        if old_status:
+            _counts[old_status] = max(0, _counts[old_status] - 1)
+        if new_status:
+            _counts[new_status] += 1
+        _export()
+
+
+def current_status(db: Session, friend: Friend, frequency: Optional[ContactFrequency] = None) -> str:
+    """A friend's health status from its latest interaction (one indexed lookup)."""
+    last_interaction = db.query(func.max(Interaction.contacted_at)).filter(
+        Interaction.friend_id == friend.id
+    ).scalar()
+    status, _ = friend_service.calculate_health_status(
+        last_interaction, frequency or friend.contact_frequency
+    )
+    return status
+
+
+def count_by_status(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Count friends per health status with a single aggregate query."""
+    now = now or datetime.utcnow()
+    last_contact = db.query(
+        Interaction.friend_id,
+        func.max(Interaction.contacted_at).label("last_contact")
+    ).group_by(Interaction.friend_id).subquery()
+
+    # Mirrors calculate_health_status via the transition offsets
+    green, yellow = [], []
+    for frequency in ContactFrequency:
+        yellow_at, red_at = friend_service.get_transition_times(now, frequency)
+        green.append((and_(
+            Friend.contact_frequency == frequency,
+            last_contact.c.last_contact > now - (yellow_at - now)
+        ), "green"))
+        yellow.append((and_(
+            Friend.contact_frequency == frequency,
+            last_contact.c.last_contact > now - (red_at - now)
+        ), "yellow"))
+    status = case(*green, *yellow, else_="red")
+
+    rows = db.query(status, func.count(Friend.id)).outerjoin(
+        last_contact, last_contact.c.friend_id == Friend.id
+    ).group_by(status).all()
+
+    counts = {s: 0 for s in STATUSES}
+    for row_status, count in rows:
+        counts[row_status] = count
+    return counts
+
+
+def reconcile(db: Session) -> Dict[str, int]:
+    """Reset the gauges from the database."""
+    global _counts
+    counts = count_by_status(db)
+    with _lock:
+        _counts = counts
+        _export()
+    return dict(counts)
+
+
+def reset() -> None:
+    """Forget the baseline, e.g. between tests."""
+    global _counts
+    with _lock:
+        _counts = None
+
+
+class HealthMetricsReconciler:
+    """Reconciles the health gauges on a timer, off the request path."""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self._tasks: List[asyncio.Task] = []
+
+    def _reconcile(self) -> Dict[str, int]:
+        db = self.session_factory()
+        try:
+            return reconcile(db)
+        finally:
+            db.close()
+
+    async def _loop(self) -> None:
+        settings = get_settings()
+        while True:
+            try:
+                await run_in_threadpool(self._reconcile)
+            except Exception:
+                logger.exception("Health metrics reconciliation error")
+            await asyncio.sleep(settings.health_metrics_interval_seconds)
+
+    def start(self) -> None:
+        """Start the timer; the first reconciliation runs right away."""
+        self._tasks = [asyncio.create_task(self._loop())]
+
+    async def stop(self) -> None:
+        """Cancel the timer."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -3,15 +3,18 @@ from datetime import datetime
 from typing import List, Optional
 import json
 
+from app import events
 from app.models import Interaction, Friend
 from app.schemas import InteractionCreate, InteractionResponse
+from app.config import get_settings
+from app.services import context_ranker, health_metrics, reminder_scheduler, summary_service
 
 
 def get_interactions(db: Session, friend_id: int, limit: int = 20) -> List[Interaction]:
     """Get interactions for a friend."""
     return db.query(Interaction).filter(
         Interaction.friend_id == friend_id
-    ).order_by(Interaction.contacted_at.desc()).limit(limit).all()
+    ).order_by(Interaction.contacted_at.desc(), Interaction.id.desc()).limit(limit).all()
 
 
 def create_interaction(db: Session, friend_id: int, interaction_data: InteractionCreate) -> Interaction:
@@ -21,6 +24,9 @@ def create_interaction(db: Session, friend_id: int, interaction_data: Interactio
     if interaction_data.next_topics:
         next_topics_json = json.dumps(interaction_data.next_topics)
     
+    friend = db.get(Friend, friend_id)
+    old_status = health_metrics.current_status(db, friend) if friend else None
+    
     interaction = Interaction(
         friend_id=friend_id,
         summary=interaction_data.summary,
@@ -30,28 +36,53 @@ def create_interaction(db: Session, friend_id: int, interaction_data: Interactio
     db.add(interaction)
     db.commit()
     db.refresh(interaction)
+    
+    summary_service.fold_overflow(db, friend_id)
+    context_ranker.refresh_index(db, friend_id)
+    if friend:
+        health_metrics.record_transition(old_status, health_metrics.current_status(db, friend))
+        reminder_scheduler.contact_logged(friend, interaction.contacted_at)
+        events.publish(friend.device_id, "interaction.created", {
+            "friend_id": friend_id,
+            "interaction_id": interaction.id
+        })
     return interaction
 
 
-def get_interaction_context(db: Session, friend_id: int, limit: int = 5) -> str:
-    """Get recent interaction context for AI talk starter generation."""
-    interactions = get_interactions(db, friend_id, limit)
+def get_interaction_context(db: Session, friend_id: int, limit: Optional[int] = None) -> str:
+    """Get interaction context for AI talk starter generation.
+    
+    Up to ``limit`` interactions are included verbatim, ranked by relevance
+    to the open follow-up topics and by recency within the character budget.
+    Older history is represented by the rolling summary, so the prompt stays
+    bounded however long the history gets.
+    """
+    settings = get_settings()
+    if limit is None:
+        limit = settings.context_top_k
     
-    if not interactions:
+    index = context_ranker.get_index(db, friend_id)
+    with index.lock:
+        docs = index.select_docs(limit, settings.context_char_budget)
+        selected = [index.lines[doc] for doc in docs]
+        selected_summary_lines = {index.summary_lines[doc] for doc in docs}
+        total = len(index)
+    
+    if not selected:
         return "No previous interactions recorded."
     
-    context_parts = []
-    for i, interaction in enumerate(interactions):
-        date_str = interaction.contacted_at.strftime("%Y-%m-%d")
-        summary = interaction.summary or "No summary"
-        context_parts.append(f"- {date_str}: {summary}")
-        
-        if interaction.next_topics:
-            try:
-                topics = json.loads(interaction.next_topics)
-                context_parts.append(f"  Topics to follow up: {', '.join(topics)}")
-            except json.JSONDecodeError:
-                pass
+    context_parts = [line for lines in selected for line in lines]
+    
+    if total > settings.context_raw_interactions:
+        summary = summary_service.get_summary(db, friend_id) or summary_service.rebuild_summary(db, friend_id)
+        # Older interactions ranked in verbatim are left out of the summary
+        earlier = [
+            line for line in summary.summary.split("\n")
+            if line and line not in selected_summary_lines
+        ]
+        if earlier:
+            context_parts.append("Earlier interactions:")
+            context_parts.extend(earlier)
     
     return "\n".join(context_parts)
 
@@ -0,0 +1,261 @@
+"""Resilience layer for outbound LLM calls.
+
+Every call goes through a ``ResilientCaller`` that combines three guards:
+
+* a semaphore bounding in-flight calls, so a slow proxy cannot tie up
+  every worker (callers that cannot get a slot quickly fail fast);
+* a circuit breaker that stops calling the proxy once the recent error
+  rate spikes and lets a single probe through after a cool-down;
+* optional hedging, which sends a second identical request when the
+  first one is slower than the recent p95 latency and takes whichever
+  answers first.
+
+Failures surface as exceptions; ``llm_service`` turns them into its
+fallback starters.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple, TypeVar
+
+from app.config import get_settings
+from app.metrics import (
+    llm_calls, llm_call_duration, llm_in_flight, llm_circuit_state,
+    llm_circuit_transitions, llm_hedges
+)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the LLM while the circuit is open."""
+
+
+class ConcurrencyLimitError(Exception):
+    """Raised when no in-flight slot frees up within the queue timeout."""
+
+
+class LatencyTracker:
+    """Keeps recent successful latencies to estimate percentiles."""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, quantile: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over a sliding time window."""
+
+    def __init__(
+        self,
+        error_rate: float,
+        min_calls: int,
+        window_seconds: float,
+        open_seconds: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.results: Deque[Tuple[float, bool]] = deque()
+        self._export_state()
+
+    def _export_state(self) -> None:
+        for state in (CLOSED, OPEN, HALF_OPEN):
+            llm_circuit_state.labels(tool="friend-keeper", state=state).set(1 if state == self.state else 0)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        self.state = state
+        if state == OPEN:
+            self.opened_at = self.clock()
+        if state != HALF_OPEN:
+            self.probe_in_flight = False
+        self.results.clear()
+        llm_circuit_transitions.labels(tool="friend-keeper", state=state).inc()
+        self._export_state()
+
+    def allow(self) -> bool:
+        """Check whether a call may go out now."""
+        if self.state == OPEN and self.clock() - self.opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        if self.state == OPEN:
+            return False
+        if self.state == HALF_OPEN:
+            # Only one probe at a time while half open
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def record(self, success: bool) -> None:
+        """Record the outcome of an allowed call."""
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED if success else OPEN)
+            return
+
+        now = self.clock()
+        self.results.append((now, success))
+        while self.results and self.results[0][0] < now - self.window_seconds:
+            self.results.popleft()
+
+        failures = sum(1 for _, ok in self.results if not ok)
+        if len(self.results) >= self.min_calls and failures / len(self.results) >= self.error_rate:
+            self._transition(OPEN)
+
+
+class ResilientCaller:
+    """Runs LLM calls through the concurrency limit, circuit breaker and hedging."""
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        queue_timeout: float,
+        call_timeout: float,
+        breaker: CircuitBreaker,
+        hedge_enabled: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.5,
+        hedge_min_samples: int = 20
+    ):
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.breaker = breaker
+        self.latency = LatencyTracker()
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long to wait before hedging, or None to not hedge."""
+        if not self.hedge_enabled or len(self.latency.samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latency.percentile(self.hedge_quantile))
+
+    async def _timed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        result = await fn()
+        self.latency.record(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable[T]]) -> T:
+        first = asyncio.ensure_future(self._timed(fn))
+        delay = self.hedge_delay()
+        pending = {first}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    llm_hedges.labels(tool="friend-keeper", result="sent").inc()
+                    pending.add(asyncio.ensure_future(self._timed(fn)))
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            llm_hedges.labels(tool="friend-keeper", result="won").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Call ``fn`` (one upstream request) under all guards."""
+        if not self.breaker.allow():
+            llm_calls.labels(tool="friend-keeper", outcome="circuit_open").inc()
+            raise CircuitOpenError("LLM circuit is open")
+
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Not the upstream's fault, but the probe slot must be released
+            if self.breaker.state == HALF_OPEN:
+                self.breaker.probe_in_flight = False
+            llm_calls.labels(tool="friend-keeper", outcome="rejected").inc()
+            raise ConcurrencyLimitError("Too many LLM calls in flight")
+
+        llm_in_flight.labels(tool="friend-keeper").inc()
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._hedged(fn), timeout=self.call_timeout)
+        except asyncio.TimeoutError:
+            self.breaker.record(False)
+            llm_calls.labels(tool="friend-keeper", outcome="timeout").inc()
+            raise
+        except asyncio.CancelledError:
+            if self.breaker.state == HALF_OPEN:
+                self.breaker.probe_in_flight = False
+            raise
+        except Exception:
+            self.breaker.record(False)
+            llm_calls.labels(tool="friend-keeper", outcome="error").inc()
+            raise
+        finally:
+            llm_in_flight.labels(tool="friend-keeper").dec()
+            self.semaphore.release()
+
+        self.breaker.record(True)
+        llm_calls.labels(tool="friend-keeper", outcome="success").inc()
+        llm_call_duration.labels(tool="friend-keeper").observe(time.perf_counter() - start)
+        return result
+
+
+_caller: Optional[ResilientCaller] = None
+
+
+def build_caller() -> ResilientCaller:
+    """Build a caller from settings."""
+    settings = get_settings()
+    return ResilientCaller(
+        max_in_flight=settings.llm_max_in_flight,
+        queue_timeout=settings.llm_queue_timeout_seconds,
+        call_timeout=settings.llm_timeout_seconds,
+        breaker=CircuitBreaker(
+            error_rate=settings.llm_breaker_error_rate,
+            min_calls=settings.llm_breaker_min_calls,
+            window_seconds=settings.llm_breaker_window_seconds,
+            open_seconds=settings.llm_breaker_open_seconds
+        ),
+        hedge_enabled=settings.llm_hedge_enabled,
+        hedge_quantile=settings.llm_hedge_quantile,
+        hedge_min_delay=settings.llm_hedge_min_delay_seconds,
+        hedge_min_samples=settings.llm_hedge_min_samples
+    )
+
+
+def get_caller() -> ResilientCaller:
+    """Get the process-wide caller, building it on first use."""
+    global _caller
+    if _caller is None:
+        _caller = build_caller()
+    return _caller
+
+
+def reset(caller: Optional[ResilientCaller] = None) -> None:
+    """Replace the process-wide caller (a fresh one from settings by default)."""
+    global _caller
+    _caller = caller
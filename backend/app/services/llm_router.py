@@ -0,0 +1,235 @@
+"""Latency-aware routing across several LLM upstreams.
+
+Endpoints come from ``LLM_ENDPOINTS`` (a JSON list of objects with
+``url`` and optional ``key``, ``model``, ``weight`` and ``name``); when it
+is empty the single ``LLM_PROXY_URL`` / ``LLM_MODEL`` pair is used.
+
+Each request picks a primary by "power of two choices": two endpoints are
+drawn at random in proportion to their weight and the one with the lower
+cost (EWMA latency inflated by EWMA error rate, divided by weight) wins.
+The remaining healthy endpoints, cheapest first, are the failover order
+within the same request. Endpoints whose error rate crosses the ejection
+threshold sit out for a back-off period and then receive a single probe
+request; a successful probe brings them back.
+"""
+import asyncio
+import json
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.metrics import (
+    llm_route_decisions, llm_endpoint_latency, llm_endpoint_healthy, llm_endpoint_ejections
+)
+
+T = TypeVar("T")
+
+
+class Endpoint:
+    """One upstream and its running health statistics."""
+
+    def __init__(self, name: str, url: str, key: str, model: str, weight: float = 1.0):
+        self.name = name
+        self.url = url.rstrip("/")
+        self.key = key
+        self.model = model
+        self.weight = max(weight, 0.001)
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error = 0.0
+        self.samples = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.probing = False
+
+    def cost(self, error_penalty: float) -> float:
+        # Untried endpoints look free so they get sampled quickly
+        latency = self.ewma_latency or 0.0
+        return latency * (1.0 + error_penalty * self.ewma_error) / self.weight
+
+
+class LLMRouter:
+    """Picks endpoints per request and keeps their health statistics."""
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        alpha: float = 0.3,
+        error_penalty: float = 4.0,
+        eject_error_rate: float = 0.5,
+        eject_min_samples: int = 3,
+        eject_seconds: float = 30.0,
+        max_eject_seconds: float = 600.0,
+        attempt_timeout: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None
+    ):
+        self.endpoints = endpoints
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.eject_error_rate = eject_error_rate
+        self.eject_min_samples = eject_min_samples
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.attempt_timeout = attempt_timeout
+        self.clock = clock
+        self.rng = rng or random.Random()
+        for endpoint in endpoints:
+            llm_endpoint_healthy.labels(tool="friend-keeper", endpoint=endpoint.name).set(1)
+
+    def is_ejected(self, endpoint: Endpoint) -> bool:
+        return endpoint.ejected_until > self.clock()
+
+    def plan(self) -> List[Endpoint]:
+        """Order endpoints for one request: probe or primary first, then failovers."""
+        healthy = []
+        probe = None
+        for endpoint in self.endpoints:
+            if endpoint.ejected_until == 0.0:
+                healthy.append(endpoint)
+            elif not self.is_ejected(endpoint) and not endpoint.probing and probe is None:
+                probe = endpoint
+
+        order = sorted(healthy, key=lambda e: e.cost(self.error_penalty))
+        if len(order) > 1:
+            first, second = self.rng.choices(order, weights=[e.weight for e in order], k=2)
+            primary = min((first, second), key=lambda e: e.cost(self.error_penalty))
+            order.remove(primary)
+            order.insert(0, primary)
+
+        if probe is not None:
+            probe.probing = True
+            order.insert(0, probe)
+        elif not order:
+            # Everything is ejected: probe the endpoint that comes back soonest
+            probe = min(self.endpoints, key=lambda e: e.ejected_until)
+            probe.probing = True
+            order = [probe]
+        return order
+
+    def record(self, endpoint: Endpoint, latency: float, success: bool) -> None:
+        """Update an endpoint's statistics after an attempt."""
+        was_probe = endpoint.probing
+        endpoint.probing = False
+        endpoint.samples += 1
+        endpoint.ewma_error = (1 - self.alpha) * endpoint.ewma_error + self.alpha * (0.0 if success else 1.0)
+        if success:
+            llm_endpoint_latency.labels(tool="friend-keeper", endpoint=endpoint.name).observe(latency)
+            if endpoint.ewma_latency is None:
+                endpoint.ewma_latency = latency
+            else:
+                endpoint.ewma_latency = (1 - self.alpha) * endpoint.ewma_latency + self.alpha * latency
+
+        if was_probe and success:
+            endpoint.ejected_until = 0.0
+            endpoint.ejections = 0
+            endpoint.ewma_error = 0.0
+            llm_endpoint_healthy.labels(tool="friend-keeper", endpoint=endpoint.name).set(1)
+        elif (was_probe and not success) or (
+            endpoint.ejected_until == 0.0
+            and endpoint.samples >= self.eject_min_samples
+            and endpoint.ewma_error >= self.eject_error_rate
+        ):
+            endpoint.ejections += 1
+            backoff = min(self.max_eject_seconds, self.eject_seconds * 2 ** (endpoint.ejections - 1))
+            endpoint.ejected_until = self.clock() + backoff
+            llm_endpoint_healthy.labels(tool="friend-keeper", endpoint=endpoint.name).set(0)
+            llm_endpoint_ejections.labels(tool="friend-keeper", endpoint=endpoint.name).inc()
+
+    async def request(self, send: Callable[[Endpoint], Awaitable[T]]) -> T:
+        """Send one logical request, failing over across endpoints until one succeeds."""
+        error: Optional[Exception] = None
+        for position, endpoint in enumerate(self.plan()):
+            if endpoint.ejected_until:
+                reason = "probe"
+            else:
+                reason = "primary" if position == 0 else "failover"
+            llm_route_decisions.labels(tool="friend-keeper", endpoint=endpoint.name, reason=reason).inc()
+
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(send(endpoint), timeout=self.attempt_timeout)
+            except Exception as e:
+                self.record(endpoint, time.perf_counter() - start, False)
+                error = e
+                continue
+            except BaseException:
+                # Cancelled (e.g. a hedge lost): no verdict on the endpoint
+                endpoint.probing = False
+                raise
+            self.record(endpoint, time.perf_counter() - start, True)
+            return result
+        raise error
+
+
+class EndpointConfigError(ValueError):
+    """Raised when LLM_ENDPOINTS is misconfigured."""
+
+
+def parse_endpoints(settings) -> List[Endpoint]:
+    """Build the endpoint list from settings. Raises EndpointConfigError if misconfigured."""
+    try:
+        configured = json.loads(settings.llm_endpoints or "[]")
+    except json.JSONDecodeError as e:
+        raise EndpointConfigError(f"LLM_ENDPOINTS is not valid JSON: {e}")
+    if not isinstance(configured, list):
+        raise EndpointConfigError("LLM_ENDPOINTS must be a JSON list of endpoint objects")
+
+    endpoints = []
+    for i, entry in enumerate(configured):
+        if not isinstance(entry, dict) or not isinstance(entry.get("url"), str) or not entry["url"]:
+            raise EndpointConfigError(f"LLM_ENDPOINTS entry {i} needs a non-empty \"url\"")
+        try:
+            weight = float(entry.get("weight", 1.0))
+        except (TypeError, ValueError):
+            raise EndpointConfigError(f"LLM_ENDPOINTS entry {i} has a non-numeric \"weight\"")
+        endpoints.append(Endpoint(
+            name=entry.get("name") or f"endpoint-{i}",
+            url=entry["url"],
+            key=entry.get("key", settings.llm_proxy_key),
+            model=entry.get("model", settings.llm_model),
+            weight=weight
+        ))
+
+    if not endpoints:
+        endpoints.append(Endpoint(
+            name="default",
+            url=settings.llm_proxy_url,
+            key=settings.llm_proxy_key,
+            model=settings.llm_model
+        ))
+    return endpoints
+
+
+_routers: Dict[tuple, LLMRouter] = {}
+
+
+def get_router(settings) -> LLMRouter:
+    """Get the router for the given settings, keeping statistics across requests.
+
+    Raises EndpointConfigError if LLM_ENDPOINTS is misconfigured.
+    """
+    config = (
+        settings.llm_endpoints, settings.llm_proxy_url, settings.llm_proxy_key, settings.llm_model,
+        settings.llm_ewma_alpha, settings.llm_eject_error_rate, settings.llm_eject_seconds,
+        settings.llm_endpoint_timeout_seconds
+    )
+    router = _routers.get(config)
+    if router is None:
+        router = _routers[config] = LLMRouter(
+            parse_endpoints(settings),
+            alpha=settings.llm_ewma_alpha,
+            eject_error_rate=settings.llm_eject_error_rate,
+            eject_seconds=settings.llm_eject_seconds,
+            attempt_timeout=settings.llm_endpoint_timeout_seconds
+        )
+    return router
+
+
+def has_credentials(settings) -> bool:
+    """Whether any endpoint has an API key, i.e. whether LLM calls can be made at all."""
+    return any(endpoint.key for endpoint in get_router(settings).endpoints)
+
+
+def reset() -> None:
+    """Forget all routers and their statistics."""
+    _routers.clear()
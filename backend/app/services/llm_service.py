@@ -1,9 +1,74 @@
 import httpx
-from typing import List
+from typing import Dict, List
 import json
+import logging
 import re
 
+from app import request_stats, tracing
 from app.config import get_settings
+from app.services import llm_resilience, llm_router
+
+logger = logging.getLogger(__name__)
+
+
+LANGUAGE_PROMPTS = {
+    "en": "English",
+    "zh": "Chinese (Simplified)",
+    "ja": "Japanese",
+    "de": "German",
+    "fr": "French",
+    "ko": "Korean",
+    "es": "Spanish"
+}
+
+# Returned when no endpoint has an API key
+DEFAULT_STARTERS = [
+    "How have you been lately?",
+    "What's new in your life?",
+    "Any exciting plans coming up?"
+]
+
+# Returned when the LLM call fails or returns nothing usable
+FALLBACK_STARTERS = [
+    "How have you been?",
+    "What's been keeping you busy lately?",
+    "I was thinking about our last conversation..."
+]
+
+
+async def _chat_completion(prompt: str, max_tokens: int = 500) -> str:
+    """Send a single-message chat completion to the LLM proxy and return the content.
+
+    The request goes through the resilience layer, which may reject it
+    outright (open circuit, no free slot) or send it twice (hedging), and
+    the router, which picks an upstream and fails over to the others.
+    """
+    settings = get_settings()
+    router = llm_router.get_router(settings)
+
+    async def send(endpoint: llm_router.Endpoint) -> str:
+        with tracing.span("llm.request", endpoint=endpoint.name, model=endpoint.model):
+            async with httpx.AsyncClient(timeout=settings.llm_timeout_seconds) as client:
+                response = await client.post(
+                    f"{endpoint.url}/v1/chat/completions",
+                    headers={
+                        "Authorization": f"Bearer {endpoint.key}",
+                        "Content-Type": "application/json",
+                        **tracing.outbound_headers()
+                    },
+                    json={
+                        "model": endpoint.model,
+                        "messages": [{"role": "user", "content": prompt}],
+                        "temperature": 0.8,
+                        "max_tokens": max_tokens
+                    }
+                )
+                response.raise_for_status()
+                data = response.json()
+                return data["choices"][0]["message"]["content"].strip()
+
+    with request_stats.phase("llm"), tracing.span("llm.chat_completion"):
+        return await llm_resilience.get_caller().call(lambda: router.request(send))
 
 
 async def generate_talk_starters(
@@ -14,27 +79,13 @@ async def generate_talk_starters(
 ) -> List[str]:
     """Generate conversation starters using LLM."""
     settings = get_settings()
-    
-    if not settings.llm_proxy_key:
+
+    if not llm_router.has_credentials(settings):
         # Return default starters if no API key
-        return [
-            "How have you been lately?",
-            "What's new in your life?",
-            "Any exciting plans coming up?"
-        ]
-    
-    language_prompts = {
-        "en": "English",
-        "zh": "Chinese (Simplified)",
-        "ja": "Japanese",
-        "de": "German",
-        "fr": "French",
-        "ko": "Korean",
-        "es": "Spanish"
-    }
-    
-    target_language = language_prompts.get(language, "English")
-    
+        return list(DEFAULT_STARTERS)
+
+    target_language = LANGUAGE_PROMPTS.get(language, "English")
+
     prompt = f"""You are helping someone with ADHD reconnect with their {relation_type} named {friend_name}.
 
 Based on their previous interactions:
@@ -52,37 +103,79 @@ Format: Return ONLY a JSON array of 5 strings, no other text.
 Example: ["How did the project you mentioned go?", "I was thinking about you when...", ...]"""
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{settings.llm_proxy_url}/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.llm_proxy_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o-mini",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.8,
-                    "max_tokens": 500
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            content = data["choices"][0]["message"]["content"].strip()
-            
-            # Parse JSON array from response
-            # Try to find JSON array in the response
-            json_match = re.search(r'\[.*\]', content, re.DOTALL)
-            if json_match:
-                starters = json.loads(json_match.group())
-                return starters[:5]
-            else:
-                return [content]
-                
+        content = await _chat_completion(prompt)
+
+        # Parse JSON array from response
+        # Try to find JSON array in the response
+        json_match = re.search(r'\[.*\]', content, re.DOTALL)
+        if json_match:
+            starters = json.loads(json_match.group())
+            return starters[:5]
+        else:
+            return [content]
+
+    except Exception as e:
+        logger.warning("LLM error: %s", e)
+        return list(FALLBACK_STARTERS)
+
+
+async def generate_talk_starters_batch(
+    friends: List[Dict],
+    language: str = "en"
+) -> Dict[int, List[str]]:
+    """Generate conversation starters for several friends with one LLM call.
+
+    Each entry in ``friends`` needs ``id``, ``name``, ``relation_type`` and
+    ``context``. Returns starters keyed by friend ID; friends missing from the
+    model's answer get the fallback starters.
+    """
+    settings = get_settings()
+
+    if not llm_router.has_credentials(settings):
+        return {friend["id"]: list(DEFAULT_STARTERS) for friend in friends}
+
+    target_language = LANGUAGE_PROMPTS.get(language, "English")
+
+    sections = []
+    for friend in friends:
+        sections.append(
+            f"### Friend {friend['id']}: {friend['name']} ({friend['relation_type']})\n"
+            f"{friend['context']}"
+        )
+    friend_sections = "\n\n".join(sections)
+
+    prompt = f"""You are helping someone with ADHD reconnect with several people they have not contacted in a while.
+
+For each person below, based on their previous interactions:
+{friend_sections}
+
+Generate 5 natural, warm conversation starters per person that:
+1. Reference previous topics if available
+2. Are open-ended to encourage real connection
+3. Feel genuine, not forced or awkward
+4. Account for the time passed since last contact
+
+Respond in {target_language}.
+
+Format: Return ONLY a JSON object mapping each friend number to an array of 5 strings, no other text.
+Example: {{"12": ["How did the project you mentioned go?", ...], "15": ["I was thinking about you when...", ...]}}"""
+
+    results = {}
+    try:
+        content = await _chat_completion(prompt, max_tokens=min(4000, 400 * len(friends)))
+
+        json_match = re.search(r'\{.*\}', content, re.DOTALL)
+        parsed = json.loads(json_match.group()) if json_match else {}
+
+        for friend in friends:
+            starters = parsed.get(str(friend["id"]))
+            if isinstance(starters, list) and starters:
+                results[friend["id"]] = [str(s) for s in starters[:5]]
+
     except Exception as e:
-        print(f"LLM error: {e}")
-        return [
-            "How have you been?",
-            "What's been keeping you busy lately?",
-            "I was thinking about our last conversation..."
-        ]
+        logger.warning("LLM error: %s", e)
+
+    for friend in friends:
+        results.setdefault(friend["id"], list(FALLBACK_STARTERS))
+
+    return results
@@ -0,0 +1,190 @@
+"""Reconciliation of payments whose completion webhook never arrived.
+
+Pending transactions older than a threshold are streamed from the
+database in keyset-paginated chunks (served by the ``(status,
+created_at)`` index), their checkout status is fetched from Creem with
+bounded concurrency, and completed checkouts are applied through
+``token_service.complete_payment``, which makes re-runs and races with
+the webhook worker harmless.
+
+Run it from cron or by hand::
+
+    python -m app.services.payment_reconciliation --older-than-minutes 60
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models import PaymentTransaction
+from app.metrics import reconcile_transactions
+from app.services import token_service
+from app.services.creem_client import CreemClient, build_client
+
+logger = logging.getLogger(__name__)
+
+RESULTS = ("completed", "already_completed", "expired", "still_pending", "unknown", "error")
+
+
+class ReconciliationReport:
+    """Counts of what one reconciliation run did."""
+
+    def __init__(self):
+        self.scanned = 0
+        self.counts: Dict[str, int] = {result: 0 for result in RESULTS}
+        self.duration_seconds = 0.0
+
+    def add(self, result: str) -> None:
+        self.counts[result] += 1
+        reconcile_transactions.labels(tool="friend-keeper", result=result).inc()
+
+    def as_dict(self) -> dict:
+        return {
+            "scanned": self.scanned,
+            **self.counts,
+            "duration_seconds": round(self.duration_seconds, 3)
+        }
+
+
+def _load_chunk(
+    session_factory: Callable[[], Session],
+    cutoff: datetime,
+    after: Optional[Tuple[datetime, int]],
+    limit: int
+) -> List[Tuple[int, Optional[str], datetime]]:
+    db = session_factory()
+    try:
+        query = db.query(
+            PaymentTransaction.id,
+            PaymentTransaction.creem_checkout_id,
+            PaymentTransaction.created_at
+        ).filter(
+            PaymentTransaction.status == "pending",
+            PaymentTransaction.created_at <= cutoff
+        )
+        if after:
+            created_at, last_id = after
+            query = query.filter(or_(
+                PaymentTransaction.created_at > created_at,
+                and_(PaymentTransaction.created_at == created_at, PaymentTransaction.id > last_id)
+            ))
+        return query.order_by(PaymentTransaction.created_at, PaymentTransaction.id).limit(limit).all()
+    finally:
+        db.close()
+
+
+def _apply(
+    session_factory: Callable[[], Session],
+    settled: List[Tuple[int, str, str]]
+) -> List[str]:
+    """Apply (transaction ID, checkout ID, provider status) outcomes in one session."""
+    db = session_factory()
+    try:
+        results = []
+        for transaction_id, checkout_id, status in settled:
+            try:
+                if status == "completed":
+                    completed = token_service.complete_payment(db, checkout_id)
+                    results.append("completed" if completed else "already_completed")
+                    continue
+
+                # Only a still-pending row may expire; a concurrent completion wins
+                db.query(PaymentTransaction).filter(
+                    PaymentTransaction.id == transaction_id,
+                    PaymentTransaction.status == "pending"
+                ).update({PaymentTransaction.status: "expired"}, synchronize_session=False)
+                db.commit()
+                results.append("expired")
+            except Exception as e:
+                db.rollback()
+                logger.warning("Reconciliation error for checkout %s: %s", checkout_id, e)
+                results.append("error")
+        return results
+    finally:
+        db.close()
+
+
+async def reconcile_payments(
+    client: CreemClient,
+    session_factory: Callable[[], Session] = SessionLocal,
+    older_than: Optional[timedelta] = None,
+    chunk_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> ReconciliationReport:
+    """Check every stale pending transaction against Creem and apply the outcome."""
+    settings = get_settings()
+    older_than = older_than or timedelta(minutes=settings.reconcile_older_than_minutes)
+    chunk_size = chunk_size or settings.reconcile_chunk_size
+    semaphore = asyncio.Semaphore(concurrency or settings.reconcile_concurrency)
+    cutoff = (now or datetime.utcnow()) - older_than
+    report = ReconciliationReport()
+    start = time.perf_counter()
+
+    async def check(transaction_id: int, checkout_id: Optional[str]) -> Optional[Tuple[int, str, str]]:
+        """Look up one checkout; returns it if there is an outcome to apply."""
+        if not checkout_id:
+            report.add("unknown")
+            return None
+        try:
+            async with semaphore:
+                checkout = await client.get_checkout(checkout_id)
+        except Exception as e:
+            logger.warning("Reconciliation error for checkout %s: %s", checkout_id, e)
+            report.add("error")
+            return None
+        status = checkout.get("status")
+        if status not in ("completed", "expired"):
+            report.add("still_pending")
+            return None
+        return transaction_id, checkout_id, status
+
+    after = None
+    while True:
+        rows = await run_in_threadpool(_load_chunk, session_factory, cutoff, after, chunk_size)
+        if not rows:
+            break
+        report.scanned += len(rows)
+        # Lookups run concurrently; the writes for a chunk share one session
+        outcomes = await asyncio.gather(*(check(row.id, row.creem_checkout_id) for row in rows))
+        settled = [outcome for outcome in outcomes if outcome]
+        if settled:
+            for result in await run_in_threadpool(_apply, session_factory, settled):
+                report.add(result)
+        after = (rows[-1].created_at, rows[-1].id)
+        if len(rows) < chunk_size:
+            break
+
+    report.duration_seconds = time.perf_counter() - start
+    return report
+
+
+async def _main(args: argparse.Namespace) -> None:
+    client = build_client()
+    try:
+        report = await reconcile_payments(
+            client,
+            older_than=timedelta(minutes=args.older_than_minutes) if args.older_than_minutes else None,
+            chunk_size=args.chunk_size,
+            concurrency=args.concurrency
+        )
+    finally:
+        await client.aclose()
+    print(json.dumps(report.as_dict()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile stale pending payments with Creem.")
+    parser.add_argument("--older-than-minutes", type=int)
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--concurrency", type=int)
+    asyncio.run(_main(parser.parse_args()))
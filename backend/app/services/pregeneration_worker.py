@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models import Friend
+from app.metrics import pregen_queue_depth, pregen_queue_lag, pregen_jobs
+from app.services import friend_service, interaction_service, llm_service, starter_cache_service
+
+logger = logging.getLogger(__name__)
+
+
+def parse_hour_window(window: str) -> Tuple[int, int]:
+    """Parse an "start-end" UTC hour window such as "1-6" or "22-4"."""
+    start, end = window.split("-", 1)
+    return int(start) % 24, int(end) % 24
+
+
+def in_hour_window(window: str, now: Optional[datetime] = None) -> bool:
+    """Check whether the current UTC hour falls inside a "start-end" window."""
+    start, end = parse_hour_window(window)
+    hour = (now or datetime.utcnow()).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class PregenerationWorker:
+    """Pre-generates talk starters for friends about to turn yellow or red.
+
+    A scan loop enqueues candidate friends during the off-peak window and a
+    fixed number of consumers drain the queue, so at most ``concurrency`` LLM
+    calls are in flight. Results land in the starter cache, where the
+    interactive endpoint picks them up.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        concurrency: Optional[int] = None,
+        queue_size: Optional[int] = None
+    ):
+        settings = get_settings()
+        self.session_factory = session_factory
+        self.concurrency = concurrency or settings.pregen_concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or settings.pregen_queue_size)
+        self._pending: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def enqueue(self, friend_id: int) -> bool:
+        """Queue a friend for pre-generation. Returns False if already queued or full."""
+        if friend_id in self._pending:
+            return False
+        try:
+            self.queue.put_nowait((friend_id, time.monotonic()))
+        except asyncio.QueueFull:
+            pregen_jobs.labels(tool="friend-keeper", result="dropped").inc()
+            return False
+        self._pending.add(friend_id)
+        pregen_queue_depth.labels(tool="friend-keeper").set(self.queue.qsize())
+        return True
+
+    def _find_candidates(self) -> List[int]:
+        settings = get_settings()
+        db = self.session_factory()
+        try:
+            friends = friend_service.get_friends_nearing_transition(
+                db,
+                timedelta(days=settings.pregen_lookahead_days),
+                limit=settings.pregen_queue_size
+            )
+            return [friend.id for friend in friends]
+        finally:
+            db.close()
+
+    async def scan(self) -> int:
+        """Enqueue every friend nearing a transition. Returns how many were queued."""
+        friend_ids = await run_in_threadpool(self._find_candidates)
+        return sum(1 for friend_id in friend_ids if self.enqueue(friend_id))
+
+    def _load_job(self, friend_id: int) -> Optional[dict]:
+        db = self.session_factory()
+        try:
+            friend = db.get(Friend, friend_id)
+            if not friend:
+                return None
+            language = starter_cache_service.get_preferred_language(db, friend)
+            context = interaction_service.get_interaction_context(db, friend.id)
+            if starter_cache_service.get_cached_starters(db, friend.id, language, context):
+                return None
+            return {
+                "friend_name": friend.name,
+                "relation_type": friend.relation_type.value,
+                "interaction_context": context,
+                "language": language
+            }
+        finally:
+            db.close()
+
+    def _store(self, friend_id: int, language: str, context: str, starters: List[str]) -> None:
+        db = self.session_factory()
+        try:
+            starter_cache_service.store_starters(db, friend_id, language, context, starters)
+        finally:
+            db.close()
+
+    async def process(self, friend_id: int) -> str:
+        """Pre-generate starters for one friend. Returns the job result label."""
+        job = await run_in_threadpool(self._load_job, friend_id)
+        if job is None:
+            return "skipped"
+
+        starters = await llm_service.generate_talk_starters(**job)
+        # Generic starters are not worth caching
+        if starters in (llm_service.DEFAULT_STARTERS, llm_service.FALLBACK_STARTERS):
+            return "fallback"
+
+        await run_in_threadpool(
+            self._store, friend_id, job["language"], job["interaction_context"], starters
+        )
+        return "generated"
+
+    async def _consume(self) -> None:
+        while True:
+            friend_id, enqueued_at = await self.queue.get()
+            pregen_queue_depth.labels(tool="friend-keeper").set(self.queue.qsize())
+            pregen_queue_lag.labels(tool="friend-keeper").observe(time.monotonic() - enqueued_at)
+            try:
+                result = await self.process(friend_id)
+            except Exception:
+                logger.exception("Pre-generation error for friend %s", friend_id)
+                result = "error"
+            finally:
+                self._pending.discard(friend_id)
+                self.queue.task_done()
+            pregen_jobs.labels(tool="friend-keeper", result=result).inc()
+
+    async def _scan_loop(self) -> None:
+        settings = get_settings()
+        while True:
+            if in_hour_window(settings.pregen_offpeak_hours):
+                try:
+                    await self.scan()
+                except Exception:
+                    logger.exception("Pre-generation scan error")
+            await asyncio.sleep(settings.pregen_scan_interval_seconds)
+
+    def start(self, scan: bool = True) -> None:
+        """Start the consumers and, optionally, the periodic scan loop."""
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        if scan:
+            self._tasks.append(asyncio.create_task(self._scan_loop()))
+
+    async def stop(self) -> None:
+        """Cancel all background tasks."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,518 @@
+"""Due-date scheduler for friendship health transitions.
+
+Every friend with a pending transition (green to yellow, or yellow to red)
+has exactly one entry in a min-heap keyed by its due time, so finding the
+next reminder is O(1) and every update is O(log n) however many devices
+there are:
+
+* At startup (and every ``REMINDER_REBUILD_INTERVAL_SECONDS``, to pick up
+  writes made by other worker processes) the heap is rebuilt from grouped
+  queries over the ``interactions.friend_id`` index, one ID range of
+  ``REMINDER_REBUILD_BATCH_SIZE`` friends at a time.
+* Interaction writes, contact frequency changes and deletions update the
+  heap in place through ``contact_logged``, ``frequency_changed`` and
+  ``friend_deleted``. Superseded entries are skipped lazily when they
+  reach the top and the heap is compacted once they pile up.
+* A loop sleeps until the earliest due time, re-checks the due friends
+  against the database in one query, and hands the transitions that still
+  hold to the configured sinks. After a friend turns yellow its red
+  transition is scheduled.
+
+Only one process per lock file runs the scheduler. With several workers
+the others stand by on ``REMINDER_LOCK_FILE`` and the first to get it
+takes over when the holder exits, so each transition is emitted once.
+Transitions that fell due while no scheduler was running are not replayed
+on the next start. Events are dicts with ``friend_id``, ``device_id``,
+``status``, ``due_at`` and ``last_contact``.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.metrics import reminder_queue_size, reminder_transitions
+from app.models import ContactFrequency, Friend, Interaction
+from app.services import friend_service
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, a single process is assumed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class Transition:
+    """A friend's next health transition."""
+
+    __slots__ = ("friend_id", "device_id", "status", "due_at", "last_contact", "frequency")
+
+    def __init__(
+        self,
+        friend_id: int,
+        device_id: str,
+        status: str,
+        due_at: datetime,
+        last_contact: datetime,
+        frequency: ContactFrequency
+    ):
+        self.friend_id = friend_id
+        self.device_id = device_id
+        self.status = status
+        self.due_at = due_at
+        self.last_contact = last_contact
+        self.frequency = frequency
+
+    def to_event(self) -> dict:
+        return {
+            "friend_id": self.friend_id,
+            "device_id": self.device_id,
+            "status": self.status,
+            "due_at": self.due_at.isoformat(),
+            "last_contact": self.last_contact.isoformat()
+        }
+
+
+def next_transition(
+    friend_id: int,
+    device_id: str,
+    last_contact: Optional[datetime],
+    frequency: ContactFrequency,
+    now: datetime
+) -> Optional[Transition]:
+    """The first transition strictly after ``now``, or None once a friend is red."""
+    if last_contact is None:
+        return None
+    yellow_at, red_at = friend_service.get_transition_times(last_contact, frequency)
+    if now < yellow_at:
+        return Transition(friend_id, device_id, "yellow", yellow_at, last_contact, frequency)
+    if now < red_at:
+        return Transition(friend_id, device_id, "red", red_at, last_contact, frequency)
+    return None
+
+
+class TransitionQueue:
+    """Thread-safe min-heap of transitions, at most one live entry per friend."""
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, Transition]] = []
+        self._live: Dict[int, Transition] = {}
+        self._seq = itertools.count()  # Tie-breaker; transitions are not orderable
+        self._lock = threading.Lock()
+        self._touched: Optional[Dict[int, Optional[Transition]]] = None
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def _drop_stale(self) -> None:
+        while self._heap and self._live.get(self._heap[0][2].friend_id) is not self._heap[0][2]:
+            heapq.heappop(self._heap)
+
+    def _compact(self) -> None:
+        if len(self._heap) > 2 * len(self._live) + 1024:
+            self._heap = [(t.due_at, next(self._seq), t) for t in self._live.values()]
+            heapq.heapify(self._heap)
+
+    def push(self, transition: Transition, replace: bool = True) -> bool:
+        """Schedule a transition, replacing the friend's previous one. Returns True if it is now the earliest."""
+        with self._lock:
+            if not replace and transition.friend_id in self._live:
+                return False
+            self._live[transition.friend_id] = transition
+            heapq.heappush(self._heap, (transition.due_at, next(self._seq), transition))
+            if self._touched is not None:
+                self._touched[transition.friend_id] = transition
+            self._compact()
+            self._drop_stale()
+            return self._heap[0][2] is transition
+
+    def remove(self, friend_id: int) -> None:
+        """Forget a friend's scheduled transition, if any."""
+        with self._lock:
+            self._live.pop(friend_id, None)
+            if self._touched is not None:
+                self._touched[friend_id] = None
+            self._compact()
+
+    def get(self, friend_id: int) -> Optional[Transition]:
+        with self._lock:
+            return self._live.get(friend_id)
+
+    def next_due(self) -> Optional[datetime]:
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime, limit: int) -> List[Transition]:
+        """Remove and return up to ``limit`` transitions due at or before ``now``, earliest first."""
+        due = []
+        with self._lock:
+            self._drop_stale()
+            while self._heap and self._heap[0][0] <= now and len(due) < limit:
+                _, _, transition = heapq.heappop(self._heap)
+                del self._live[transition.friend_id]
+                if self._touched is not None:
+                    self._touched[transition.friend_id] = None
+                due.append(transition)
+                self._drop_stale()
+        return due
+
+    def begin_rebuild(self) -> None:
+        """Start recording updates, to be re-applied over the rebuilt heap."""
+        with self._lock:
+            self._touched = {}
+
+    def replace(self, transitions: Iterable[Transition]) -> None:
+        """Swap in a rebuilt set of transitions, keeping updates made since ``begin_rebuild``."""
+        live = {t.friend_id: t for t in transitions}
+        with self._lock:
+            for friend_id, transition in (self._touched or {}).items():
+                if transition is None:
+                    live.pop(friend_id, None)
+                else:
+                    live[friend_id] = transition
+            self._touched = None
+            self._live = live
+            self._heap = [(t.due_at, next(self._seq), t) for t in live.values()]
+            heapq.heapify(self._heap)
+
+
+class FileSink:
+    """Appends transition events to a JSON Lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, events: List[dict]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lines = "".join(json.dumps(event) + "\n" for event in events)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def close(self) -> None:
+        pass
+
+
+class WebhookSink:
+    """POSTs each batch of transition events as ``{"events": [...]}`` to a URL."""
+
+    def __init__(self, url: str, timeout: float = 5.0, transport: Optional[httpx.BaseTransport] = None):
+        self.url = url
+        self.http = httpx.Client(timeout=timeout, transport=transport)
+
+    def emit(self, events: List[dict]) -> None:
+        self.http.post(self.url, json={"events": events}).raise_for_status()
+
+    def close(self) -> None:
+        self.http.close()
+
+
+def build_sinks() -> list:
+    """Sinks named in ``REMINDER_SINKS`` (comma-separated: file, webhook)."""
+    settings = get_settings()
+    sinks = []
+    for name in filter(None, (n.strip() for n in settings.reminder_sinks.split(","))):
+        if name == "file":
+            sinks.append(FileSink(settings.reminder_file))
+        elif name == "webhook":
+            if not settings.reminder_webhook_url:
+                raise ValueError("REMINDER_WEBHOOK_URL is required for the webhook sink")
+            sinks.append(WebhookSink(settings.reminder_webhook_url, settings.reminder_webhook_timeout_seconds))
+        else:
+            raise ValueError(f"Unknown reminder sink: {name}")
+    return sinks
+
+
+class SchedulerLock:
+    """Non-blocking exclusive ``flock`` on a file, held until released.
+
+    The OS drops the lock when its holder exits, however it exits, so a
+    standby process can take over. Without ``fcntl`` it always succeeds.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        """Take the lock if it is free. Returns whether this process holds it."""
+        if self._file is not None or fcntl is None:
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        f = open(self.path, "a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            self._file.close()  # Closing drops the lock
+            self._file = None
+
+
+def pending_transitions(db: Session, now: datetime, batch_size: int = 1000) -> Iterable[Transition]:
+    """The next transition of every friend that has one.
+
+    Friends are read in ID ranges of ``batch_size``, one grouped query each,
+    so no query aggregates more than a batch of friends' interactions and
+    the read transaction ends between batches.
+    """
+    last_contact = func.max(Interaction.contacted_at).label("last_contact")
+    # A transition is still pending while now < last_contact + red offset
+    pending = []
+    for frequency in ContactFrequency:
+        _, red_at = friend_service.get_transition_times(now, frequency)
+        pending.append(and_(Friend.contact_frequency == frequency, last_contact > now - (red_at - now)))
+    statement = select(
+        Friend.id, Friend.device_id, Friend.contact_frequency, last_contact
+    ).join(
+        Interaction, Interaction.friend_id == Friend.id
+    ).group_by(Friend.id, Friend.device_id, Friend.contact_frequency).having(or_(*pending))
+
+    after = 0
+    while True:
+        # Last ID of the next batch; None once fewer than a batch remain
+        upper = db.scalar(
+            select(Friend.id).where(Friend.id > after).order_by(Friend.id).offset(batch_size - 1).limit(1)
+        )
+        batch = statement.where(Friend.id > after)
+        if upper is not None:
+            batch = batch.where(Friend.id <= upper)
+        rows = db.execute(batch).all()
+        db.rollback()
+        for row in rows:
+            transition = next_transition(row.id, row.device_id, row.last_contact, row.contact_frequency, now)
+            if transition:
+                yield transition
+        if upper is None:
+            return
+        after = upper
+
+
+class ReminderScheduler:
+    """Emits friendship health transitions to sinks as they fall due."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        sinks: Optional[list] = None,
+        clock: Callable[[], datetime] = datetime.utcnow,
+        lock_file: Optional[str] = None
+    ):
+        settings = get_settings()
+        self.session_factory = session_factory
+        self.sinks = build_sinks() if sinks is None else sinks
+        self.clock = clock
+        self.queue = TransitionQueue()
+        self.batch_size = settings.reminder_batch_size
+        self.rebuild_batch_size = settings.reminder_rebuild_batch_size
+        lock_file = settings.reminder_lock_file if lock_file is None else lock_file
+        self.lock = SchedulerLock(lock_file) if lock_file else None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def add_sink(self, sink) -> None:
+        self.sinks.append(sink)
+
+    def rebuild(self) -> int:
+        """Reload every pending transition from the database. Returns the queue size."""
+        self.queue.begin_rebuild()
+        db = self.session_factory()
+        try:
+            self.queue.replace(list(pending_transitions(db, self.clock(), self.rebuild_batch_size)))
+        finally:
+            db.close()
+        reminder_queue_size.labels(tool="friend-keeper").set(len(self.queue))
+        self._notify()
+        return len(self.queue)
+
+    def schedule(
+        self,
+        friend_id: int,
+        device_id: str,
+        last_contact: Optional[datetime],
+        frequency: ContactFrequency
+    ) -> None:
+        """(Re)schedule a friend's next transition from its latest contact."""
+        transition = next_transition(friend_id, device_id, last_contact, frequency, self.clock())
+        if transition is None:
+            self.queue.remove(friend_id)
+        elif self.queue.push(transition):
+            self._notify()
+
+    def unschedule(self, friend_id: int) -> None:
+        self.queue.remove(friend_id)
+
+    def _notify(self) -> None:
+        """Wake the loop to re-check the earliest due time; safe from any thread."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _current(self, db: Session, friend_ids: List[int]) -> Dict[int, Tuple[ContactFrequency, Optional[datetime]]]:
+        rows = db.execute(
+            select(Friend.id, Friend.contact_frequency, func.max(Interaction.contacted_at))
+            .outerjoin(Interaction, Interaction.friend_id == Friend.id)
+            .where(Friend.id.in_(friend_ids))
+            .group_by(Friend.id, Friend.contact_frequency)
+        )
+        return {friend_id: (frequency, last_contact) for friend_id, frequency, last_contact in rows}
+
+    def fire_due(self) -> int:
+        """Emit every transition due by now, checked against the database. Returns the number emitted."""
+        emitted = 0
+        while True:
+            now = self.clock()
+            due = self.queue.pop_due(now, self.batch_size)
+            if not due:
+                break
+            db = self.session_factory()
+            try:
+                current = self._current(db, [t.friend_id for t in due])
+            finally:
+                db.close()
+
+            events = []
+            for transition in due:
+                if transition.friend_id not in current:
+                    continue  # Deleted
+                frequency, last_contact = current[transition.friend_id]
+                if last_contact == transition.last_contact and frequency == transition.frequency:
+                    events.append(transition.to_event())
+                    reminder_transitions.labels(tool="friend-keeper", status=transition.status).inc()
+                    after = transition.due_at
+                else:
+                    after = now  # Changed by a write this process did not see
+                follow_up = next_transition(transition.friend_id, transition.device_id, last_contact, frequency, after)
+                if follow_up:
+                    # A write since the pop has already scheduled something newer
+                    self.queue.push(follow_up, replace=False)
+
+            if events:
+                self._emit(events)
+                emitted += len(events)
+        reminder_queue_size.labels(tool="friend-keeper").set(len(self.queue))
+        return emitted
+
+    def _emit(self, events: List[dict]) -> None:
+        for sink in self.sinks:
+            try:
+                sink.emit(events)
+            except Exception:
+                logger.exception("Reminder sink %s failed on %d events", type(sink).__name__, len(events))
+
+    def _seconds_until_next(self) -> float:
+        settings = get_settings()
+        due = self.queue.next_due()
+        if due is None:
+            return settings.reminder_max_sleep_seconds
+        seconds = (due - self.clock()).total_seconds()
+        return min(max(seconds, 0.0), settings.reminder_max_sleep_seconds)
+
+    async def _fire_loop(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                await run_in_threadpool(self.fire_due)
+            except Exception:
+                logger.exception("Reminder scheduler error")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._seconds_until_next())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _rebuild_loop(self) -> None:
+        settings = get_settings()
+        while True:
+            try:
+                await run_in_threadpool(self.rebuild)
+            except Exception:
+                logger.exception("Reminder queue rebuild error")
+            await asyncio.sleep(settings.reminder_rebuild_interval_seconds)
+
+    async def _standby_loop(self) -> None:
+        settings = get_settings()
+        while not self.lock.acquire():
+            await asyncio.sleep(settings.reminder_max_sleep_seconds)
+        logger.info("Reminder scheduler lock %s acquired, taking over", self.lock.path)
+        self._run()
+
+    def _run(self) -> None:
+        global _active
+        _active = self
+        self._tasks += [
+            asyncio.create_task(self._rebuild_loop()),
+            asyncio.create_task(self._fire_loop())
+        ]
+
+    def start(self) -> None:
+        """Rebuild the queue and start firing; writes are tracked from now on.
+
+        If another process holds the lock file, stand by until it is free.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        if self.lock is None or self.lock.acquire():
+            self._run()
+        else:
+            logger.info("Reminder scheduler lock %s is held by another process, standing by", self.lock.path)
+            self._tasks = [asyncio.create_task(self._standby_loop())]
+
+    async def stop(self) -> None:
+        """Stop firing and close the sinks."""
+        global _active
+        if _active is self:
+            _active = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        if self.lock is not None:
+            self.lock.release()
+        for sink in self.sinks:
+            sink.close()
+
+
+_active: Optional[ReminderScheduler] = None
+
+
+def contact_logged(friend: Friend, contacted_at: datetime) -> None:
+    """Reschedule a friend after a new interaction; a no-op without a running scheduler."""
+    if _active is not None:
+        _active.schedule(friend.id, friend.device_id, contacted_at, friend.contact_frequency)
+
+
+def frequency_changed(db: Session, friend: Friend) -> None:
+    """Reschedule a friend whose contact frequency changed."""
+    if _active is not None:
+        last_contact = db.query(func.max(Interaction.contacted_at)).filter(
+            Interaction.friend_id == friend.id
+        ).scalar()
+        _active.schedule(friend.id, friend.device_id, last_contact, friend.contact_frequency)
+
+
+def friend_deleted(friend_id: int) -> None:
+    if _active is not None:
+        _active.unschedule(friend_id)
@@ -0,0 +1,104 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List, Optional
+import hashlib
+import json
+
+from app.models import Friend, TalkStarterCache
+from app.config import get_settings
+from app.metrics import starter_cache_lookups
+
+
+def context_fingerprint(context: str) -> str:
+    """Hash the interaction context so stale starters are never served."""
+    return hashlib.sha256(context.encode()).hexdigest()
+
+
+def get_cached_starters(db: Session, friend_id: int, language: str, context: str) -> Optional[List[str]]:
+    """Get pre-generated starters if they are fresh and match the current context."""
+    entry = db.query(TalkStarterCache).filter(
+        TalkStarterCache.friend_id == friend_id,
+        TalkStarterCache.language == language
+    ).first()
+
+    if (
+        not entry
+        or entry.expires_at <= datetime.utcnow()
+        or entry.context_hash != context_fingerprint(context)
+    ):
+        return None
+
+    return json.loads(entry.starters)
+
+
+def take_cached_starters(db: Session, friend_id: int, language: str, context: str) -> Optional[List[str]]:
+    """Get and consume pre-generated starters, so a regeneration yields fresh ones.
+
+    The consume is a guarded update: of two concurrent requests only the one
+    that expires the entry gets the starters; the other counts as a miss.
+    """
+    starters = get_cached_starters(db, friend_id, language, context)
+
+    if starters:
+        now = datetime.utcnow()
+        consumed = db.query(TalkStarterCache).filter(
+            TalkStarterCache.friend_id == friend_id,
+            TalkStarterCache.language == language,
+            TalkStarterCache.context_hash == context_fingerprint(context),
+            TalkStarterCache.expires_at > now
+        ).update({TalkStarterCache.expires_at: now}, synchronize_session=False)
+        db.commit()
+        if consumed != 1:
+            starters = None
+
+    starter_cache_lookups.labels(tool="friend-keeper", result="hit" if starters else "miss").inc()
+    return starters
+
+
+def store_starters(
+    db: Session,
+    friend_id: int,
+    language: str,
+    context: str,
+    starters: List[str],
+    served: bool = False
+) -> TalkStarterCache:
+    """Store starters, replacing any previous entry.
+
+    Starters that were already shown to the user are stored as served
+    (expired) entries: they are never returned again, but they record which
+    language the friend is generated in.
+    """
+    settings = get_settings()
+    entry = db.query(TalkStarterCache).filter(
+        TalkStarterCache.friend_id == friend_id,
+        TalkStarterCache.language == language
+    ).first()
+
+    if not entry:
+        entry = TalkStarterCache(friend_id=friend_id, language=language)
+        db.add(entry)
+
+    entry.context_hash = context_fingerprint(context)
+    entry.starters = json.dumps(starters)
+    entry.created_at = datetime.utcnow()
+    entry.expires_at = entry.created_at
+    if not served:
+        entry.expires_at += timedelta(hours=settings.starter_cache_ttl_hours)
+    db.commit()
+    db.refresh(entry)
+    return entry
+
+
+def get_preferred_language(db: Session, friend: Friend) -> str:
+    """Guess the language to pre-generate in from the friend's, then the device's, latest entry."""
+    settings = get_settings()
+    query = db.query(TalkStarterCache.language).order_by(TalkStarterCache.created_at.desc())
+
+    language = query.filter(TalkStarterCache.friend_id == friend.id).limit(1).scalar()
+    if not language:
+        language = query.join(
+            Friend, Friend.id == TalkStarterCache.friend_id
+        ).filter(Friend.device_id == friend.device_id).limit(1).scalar()
+
+    return language or settings.pregen_default_language
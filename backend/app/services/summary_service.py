@@ -0,0 +1,130 @@
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import json
+import re
+
+from app.models import Interaction, InteractionSummary
+from app.config import get_settings
+
+# Budget for a single folded interaction inside the rolling summary
+SUMMARY_LINE_TOKENS = 40
+
+# CJK characters are roughly one token each; other text is split into
+# words and punctuation, with long words costing one token per 4 characters.
+CJK_CHARS = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+_TOKEN_RE = re.compile(rf"[{CJK_CHARS}]|[^\W{CJK_CHARS}]+|[^\w\s]")
+
+
+def _token_cost(piece: str) -> int:
+    return max(1, (len(piece) + 3) // 4)
+
+
+def approx_token_count(text: str) -> int:
+    """Approximate the LLM token count of a text without a real tokenizer."""
+    return sum(_token_cost(match.group()) for match in _TOKEN_RE.finditer(text))
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut a text to at most ``budget`` approximate tokens, marking the cut."""
+    used = 0
+    for match in _TOKEN_RE.finditer(text):
+        used += _token_cost(match.group())
+        if used > budget:
+            return text[:match.start()].rstrip() + "…"
+    return text
+
+
+def format_interaction(interaction: Interaction, token_budget: int) -> List[str]:
+    """Format an interaction as context lines, each bounded by the token budget."""
+    date_str = interaction.contacted_at.strftime("%Y-%m-%d")
+    summary = truncate_to_tokens(interaction.summary or "No summary", token_budget)
+    lines = [f"- {date_str}: {summary}"]
+
+    if interaction.next_topics:
+        try:
+            topics = json.loads(interaction.next_topics)
+            lines.append("  Topics to follow up: " + truncate_to_tokens(", ".join(topics), token_budget))
+        except json.JSONDecodeError:
+            pass
+
+    return lines
+
+
+def summary_line(interaction: Interaction) -> str:
+    """The line an interaction takes up in the rolling summary."""
+    return " ".join(part.strip() for part in format_interaction(interaction, SUMMARY_LINE_TOKENS))
+
+
+def _fold(summary: InteractionSummary, interaction: Interaction, budget: int) -> None:
+    """Append one interaction to a summary, dropping the oldest lines to stay in budget."""
+    lines = summary.summary.split("\n") if summary.summary else []
+    lines.append(summary_line(interaction))
+
+    costs = [approx_token_count(existing) for existing in lines]
+    while len(lines) > 1 and sum(costs) > budget:
+        lines.pop(0)
+        costs.pop(0)
+
+    summary.summary = "\n".join(lines)
+    summary.token_count = sum(costs)
+    summary.folded_count = (summary.folded_count or 0) + 1
+
+
+def get_summary(db: Session, friend_id: int) -> Optional[InteractionSummary]:
+    """Get the rolling summary of a friend's older interactions."""
+    return db.query(InteractionSummary).filter(
+        InteractionSummary.friend_id == friend_id
+    ).first()
+
+
+def rebuild_summary(db: Session, friend_id: int) -> InteractionSummary:
+    """Rebuild a summary from the interactions older than the raw context window.
+
+    Only the newest ``summary_rebuild_window`` older interactions are read:
+    anything before them would be dropped by the token budget anyway.
+    """
+    settings = get_settings()
+    older = db.query(Interaction).filter(
+        Interaction.friend_id == friend_id
+    ).order_by(Interaction.contacted_at.desc(), Interaction.id.desc()).offset(
+        settings.context_raw_interactions
+    ).limit(settings.summary_rebuild_window).all()
+
+    summary = get_summary(db, friend_id)
+    if not summary:
+        summary = InteractionSummary(friend_id=friend_id)
+        db.add(summary)
+    summary.summary = ""
+    summary.token_count = 0
+    summary.folded_count = 0
+
+    for interaction in reversed(older):
+        _fold(summary, interaction, settings.summary_token_budget)
+
+    db.commit()
+    return summary
+
+
+def fold_overflow(db: Session, friend_id: int) -> Optional[InteractionSummary]:
+    """Fold the interaction that just left the raw context window into the summary.
+
+    Called after every new interaction, so each call folds at most one row.
+    """
+    settings = get_settings()
+    overflow = db.query(Interaction).filter(
+        Interaction.friend_id == friend_id
+    ).order_by(Interaction.contacted_at.desc(), Interaction.id.desc()).offset(
+        settings.context_raw_interactions
+    ).first()
+
+    if overflow is None:
+        return None
+
+    summary = get_summary(db, friend_id)
+    if not summary:
+        # History predates summaries: build from scratch once
+        return rebuild_summary(db, friend_id)
+
+    _fold(summary, overflow, settings.summary_token_budget)
+    db.commit()
+    return summary
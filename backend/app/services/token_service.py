@@ -1,8 +1,11 @@
 from sqlalchemy.orm import Session
-from typing import Tuple
+from typing import Optional, Tuple
+from datetime import datetime
 
-from app.models import GenerationToken
+from app.models import GenerationToken, PaymentTransaction
 from app.config import get_settings
+from app.metrics import payment_success, payment_revenue_cents
+from app.tracing import traced
 
 
 def get_or_create_token(db: Session, device_id: str) -> GenerationToken:
@@ -20,6 +23,7 @@ def get_or_create_token(db: Session, device_id: str) -> GenerationToken:
     return token
 
 
+@traced
 def get_token_status(db: Session, device_id: str) -> Tuple[int, int]:
     """Get token status: (tokens_remaining, free_trial_remaining)."""
     settings = get_settings()
@@ -28,12 +32,14 @@ def get_token_status(db: Session, device_id: str) -> Tuple[int, int]:
     return token.tokens_remaining, free_remaining
 
 
+@traced
 def can_generate(db: Session, device_id: str) -> bool:
     """Check if device can generate (has tokens or free trial)."""
     tokens_remaining, free_remaining = get_token_status(db, device_id)
     return tokens_remaining > 0 or free_remaining > 0
 
 
+@traced
 def use_generation(db: Session, device_id: str) -> bool:
     """Use one generation. Returns True if successful."""
     settings = get_settings()
@@ -54,9 +60,119 @@ def use_generation(db: Session, device_id: str) -> bool:
     return False
 
 
+@traced
 def add_tokens(db: Session, device_id: str, amount: int) -> int:
     """Add tokens to a device. Returns new total."""
     token = get_or_create_token(db, device_id)
     token.tokens_remaining += amount
     db.commit()
     return token.tokens_remaining
+
+
+# Rereads of the balance before a batch debit gives up on concurrent spending
+USE_GENERATIONS_ATTEMPTS = 5
+
+
+@traced
+def use_generations(db: Session, device_id: str, count: int) -> Optional[Tuple[int, int]]:
+    """Use several generations at once, all or nothing.
+
+    Paid tokens are spent before free trial uses. Returns how many of each
+    were spent as ``(paid, free)``, or None if the balance is too low.
+    The debit is an UPDATE guarded on the balance it was split from, so
+    two concurrent batches cannot overdraw it; when another request spent
+    in between, the balance is reread and the split redone.
+    """
+    settings = get_settings()
+    if count <= 0:
+        return 0, 0
+
+    token = get_or_create_token(db, device_id)
+    for _ in range(USE_GENERATIONS_ATTEMPTS):
+        db.refresh(token)
+        tokens_remaining, free_trial_used = token.tokens_remaining, token.free_trial_used
+        free_remaining = max(0, settings.free_trial_count - free_trial_used)
+        if tokens_remaining + free_remaining < count:
+            return None
+
+        paid = min(count, tokens_remaining)
+        free = count - paid
+        updated = db.query(GenerationToken).filter(
+            GenerationToken.device_id == device_id,
+            GenerationToken.tokens_remaining == tokens_remaining,
+            GenerationToken.free_trial_used == free_trial_used
+        ).update(
+            {
+                GenerationToken.tokens_remaining: GenerationToken.tokens_remaining - paid,
+                GenerationToken.free_trial_used: GenerationToken.free_trial_used + free
+            },
+            synchronize_session=False
+        )
+        db.commit()
+        if updated == 1:
+            return paid, free
+    return None
+
+
+@traced
+def refund_generations(db: Session, device_id: str, paid: int, free: int) -> None:
+    """Give back generations that were debited but not delivered."""
+    if paid <= 0 and free <= 0:
+        return
+    db.query(GenerationToken).filter(GenerationToken.device_id == device_id).update(
+        {
+            GenerationToken.tokens_remaining: GenerationToken.tokens_remaining + paid,
+            GenerationToken.free_trial_used: GenerationToken.free_trial_used - free
+        },
+        synchronize_session=False
+    )
+    db.commit()
+
+
+@traced
+def complete_payment(db: Session, checkout_id: str) -> Optional[bool]:
+    """Mark a checkout as paid and grant its tokens, at most once.
+
+    Returns True if this call completed the payment, False if it was
+    already completed, and None if no transaction has that checkout ID.
+    The status flip is a guarded UPDATE committed together with the token
+    grant, so duplicate webhook deliveries and reconciliation runs cannot
+    grant tokens twice.
+    """
+    transaction = db.query(PaymentTransaction).filter(
+        PaymentTransaction.creem_checkout_id == checkout_id
+    ).first()
+    if not transaction:
+        return None
+    
+    updated = db.query(PaymentTransaction).filter(
+        PaymentTransaction.id == transaction.id,
+        PaymentTransaction.status != "completed"
+    ).update(
+        {
+            PaymentTransaction.status: "completed",
+            PaymentTransaction.completed_at: datetime.utcnow()
+        },
+        synchronize_session=False
+    )
+    if updated != 1:
+        db.rollback()
+        return False
+    
+    # Not get_or_create_token: it commits, and the grant must share the status flip's commit
+    token = db.query(GenerationToken).filter(
+        GenerationToken.device_id == transaction.device_id
+    ).first()
+    if token:
+        token.tokens_remaining += transaction.tokens_granted
+    else:
+        db.add(GenerationToken(
+            device_id=transaction.device_id,
+            tokens_remaining=transaction.tokens_granted,
+            free_trial_used=0
+        ))
+    db.commit()
+    
+    payment_success.labels(tool="friend-keeper", product_sku=transaction.product_sku).inc()
+    payment_revenue_cents.labels(tool="friend-keeper").inc(transaction.amount_cents)
+    return True
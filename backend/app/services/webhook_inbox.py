@@ -0,0 +1,176 @@
+"""Durable inbox for payment provider webhooks.
+
+The webhook endpoint only verifies the signature and stores the raw event
+here, keyed by the provider's event ID so redeliveries are dropped on
+insert. ``WebhookWorker`` drains the inbox in batches in the background,
+retrying failed events with exponential back-off. Event handlers are
+idempotent (see ``token_service.complete_payment``), so an event that is
+handled twice, e.g. after a crash between the grant and marking the event
+processed, has no further effect.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models import WebhookEvent
+from app.metrics import webhook_processed, webhook_inbox_depth, webhook_processing_lag
+from app.services import token_service
+
+logger = logging.getLogger(__name__)
+
+# Event types worth storing; everything else is acknowledged and dropped
+HANDLED_EVENTS = {"checkout.completed"}
+
+
+def event_id_for(payload: dict, body: bytes) -> str:
+    """The provider's event ID, or a hash of the body if it sent none."""
+    event_id = payload.get("id")
+    if event_id:
+        return str(event_id)
+    return "sha256:" + hashlib.sha256(body).hexdigest()
+
+
+def record_event(db: Session, event_id: str, event_type: str, body: bytes) -> bool:
+    """Store a raw event. Returns False if an event with this ID was already stored."""
+    db.add(WebhookEvent(
+        event_id=event_id,
+        event_type=event_type,
+        payload=body.decode("utf-8")
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+def handle_event(db: Session, event: WebhookEvent) -> None:
+    """Apply one event. Raises to have it retried later."""
+    payload = json.loads(event.payload)
+    if event.event_type == "checkout.completed":
+        checkout_id = payload.get("object", {}).get("id")
+        if token_service.complete_payment(db, checkout_id) is None:
+            raise LookupError(f"Unknown checkout {checkout_id}")
+
+
+def retry_delay(attempts: int) -> float:
+    """Back-off before the next attempt, doubling per failed attempt."""
+    settings = get_settings()
+    return min(
+        settings.webhook_retry_max_seconds,
+        settings.webhook_retry_base_seconds * 2 ** (attempts - 1)
+    )
+
+
+def process_batch(db: Session, batch_size: Optional[int] = None) -> int:
+    """Handle the oldest due events. Returns how many were picked up."""
+    settings = get_settings()
+    now = datetime.utcnow()
+    events = db.query(WebhookEvent).filter(
+        WebhookEvent.status == "pending",
+        WebhookEvent.next_attempt_at <= now
+    ).order_by(WebhookEvent.id).limit(batch_size or settings.webhook_batch_size).all()
+
+    for event in events:
+        try:
+            handle_event(db, event)
+        except Exception as e:
+            db.rollback()
+            event.attempts += 1
+            event.last_error = str(e)
+            if event.attempts >= settings.webhook_max_attempts:
+                event.status = "failed"
+                result = "failed"
+            else:
+                event.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_delay(event.attempts))
+                result = "retry"
+        else:
+            event.attempts += 1
+            event.status = "processed"
+            event.processed_at = datetime.utcnow()
+            event.last_error = None
+            result = "processed"
+            webhook_processing_lag.labels(tool="friend-keeper").observe(
+                (event.processed_at - event.received_at).total_seconds()
+            )
+        db.commit()
+        webhook_processed.labels(tool="friend-keeper", result=result).inc()
+
+    pending = db.query(func.count(WebhookEvent.id)).filter(WebhookEvent.status == "pending").scalar()
+    webhook_inbox_depth.labels(tool="friend-keeper").set(pending)
+    return len(events)
+
+
+class WebhookWorker:
+    """Drains the webhook inbox in the background.
+
+    Polls every ``webhook_poll_interval_seconds`` and right after the
+    endpoint stores a new event, and keeps going without waiting while full
+    batches come back.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        batch_size: Optional[int] = None
+    ):
+        settings = get_settings()
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.webhook_batch_size
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self) -> None:
+        """Wake the worker, e.g. after an event was stored."""
+        self._wake.set()
+
+    def _run_batch(self) -> int:
+        db = self.session_factory()
+        try:
+            return process_batch(db, self.batch_size)
+        finally:
+            db.close()
+
+    async def drain(self) -> int:
+        """Process batches until the inbox has nothing due. Returns events picked up."""
+        total = 0
+        while True:
+            count = await run_in_threadpool(self._run_batch)
+            total += count
+            if count < self.batch_size:
+                return total
+
+    async def _loop(self) -> None:
+        settings = get_settings()
+        while True:
+            self._wake.clear()
+            try:
+                await self.drain()
+            except Exception:
+                logger.exception("Webhook inbox error")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.webhook_poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        """Start the background loop."""
+        self._tasks = [asyncio.create_task(self._loop())]
+
+    async def stop(self) -> None:
+        """Cancel the background loop."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,173 @@
+"""In-process stand-ins for the upstream services the backend calls.
+
+They are plain ASGI apps, reached through ``httpx.ASGITransport``, so tests
+exercise real HTTP requests and responses without opening sockets. The
+load test serves the same apps over HTTP, which is why they live in the
+app package rather than under ``tests``.
+"""
+import asyncio
+import json
+from typing import Dict, List, Optional
+
+import httpx
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, status: int, payload) -> None:
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class FakeLLMServer:
+    """Chat completions endpoint with injectable latency and failures.
+
+    ``delays`` and ``statuses`` are consumed one per request; once
+    exhausted, ``delay`` and ``status`` apply.
+    """
+
+    def __init__(
+        self,
+        content: str = '["Hi from the fake LLM"]',
+        delay: float = 0.0,
+        status: int = 200,
+        delays: Optional[List[float]] = None,
+        statuses: Optional[List[int]] = None
+    ):
+        self.content = content
+        self.delay = delay
+        self.status = status
+        self.delays = list(delays or [])
+        self.statuses = list(statuses or [])
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests: List[Dict] = []
+
+    async def __call__(self, scope, receive, send):
+        body = await _read_body(receive)
+        self.calls += 1
+        self.requests.append({
+            "path": scope["path"],
+            "headers": {k.decode(): v.decode() for k, v in scope["headers"]},
+            "json": json.loads(body) if body else None
+        })
+        delay = self.delays.pop(0) if self.delays else self.delay
+        status = self.statuses.pop(0) if self.statuses else self.status
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+
+        if status != 200:
+            await _send_json(send, status, {"error": "fake failure"})
+            return
+        await _send_json(send, 200, {
+            "choices": [{"message": {"role": "assistant", "content": self.content}}]
+        })
+
+
+def client_factory(app):
+    """Build a drop-in for ``httpx.AsyncClient`` that routes to an ASGI app.
+
+    ``app`` may also be a dict mapping hostnames to apps.
+    """
+    real_client = httpx.AsyncClient
+
+    if isinstance(app, dict):
+        apps = app
+
+        async def dispatch(scope, receive, send):
+            host = dict(scope["headers"]).get(b"host", b"").decode().split(":")[0]
+            await apps[host](scope, receive, send)
+
+        app = dispatch
+
+    def factory(*args, **kwargs):
+        kwargs.pop("transport", None)
+        return real_client(*args, transport=httpx.ASGITransport(app=app), **kwargs)
+
+    return factory
+
+
+class FakeCreemServer:
+    """Checkout endpoints of the Creem API.
+
+    ``checkouts`` maps checkout IDs to their status; unknown IDs get a 404
+    and IDs in ``failing`` a 500. ``statuses`` are consumed one per request
+    to inject failures. Checkout creation honours idempotency keys.
+    """
+
+    def __init__(self, checkouts: Optional[Dict[str, str]] = None, delay: float = 0.0):
+        self.checkouts = dict(checkouts or {})
+        self.failing: set = set()
+        self.statuses: List[int] = []
+        self.created: Dict[str, Dict] = {}  # Idempotency key -> checkout
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests: List[Dict] = []
+
+    async def __call__(self, scope, receive, send):
+        body = await _read_body(receive)
+        self.calls += 1
+        query = dict(
+            pair.split("=", 1) for pair in scope["query_string"].decode().split("&") if "=" in pair
+        )
+        self.requests.append({
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": query,
+            "headers": {k.decode(): v.decode() for k, v in scope["headers"]},
+            "json": json.loads(body) if body else None
+        })
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+
+        if self.statuses:
+            status = self.statuses.pop(0)
+            if status != 200:
+                await _send_json(send, status, {"error": "fake failure"})
+                return
+
+        if scope["method"] == "POST":
+            key = self.requests[-1]["headers"].get("idempotency-key") or str(self.calls)
+            if key not in self.created:
+                checkout_id = f"chk_{len(self.created) + 1}"
+                self.checkouts[checkout_id] = "pending"
+                self.created[key] = {
+                    "id": checkout_id,
+                    "checkout_url": f"https://pay.test/{checkout_id}",
+                    "product_id": json.loads(body)["product_id"]
+                }
+            await _send_json(send, 200, self.created[key])
+            return
+
+        checkout_id = query.get("checkout_id")
+        if checkout_id in self.failing:
+            await _send_json(send, 500, {"error": "fake failure"})
+        elif checkout_id not in self.checkouts:
+            await _send_json(send, 404, {"error": "not found"})
+        else:
+            await _send_json(send, 200, {"id": checkout_id, "status": self.checkouts[checkout_id]})
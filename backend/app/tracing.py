@@ -0,0 +1,256 @@
+"""Lightweight local tracing.
+
+Spans form trees per trace: ``TracingMiddleware`` opens a root span per
+request (continuing an incoming W3C ``traceparent`` if there is one),
+service functions decorated with ``@traced`` and ``span()`` blocks open
+children, and outbound HTTP calls carry the current context in a
+``traceparent`` header via ``outbound_headers()``.
+
+Finished spans are written as JSON lines to a size-rotated file, one per
+worker process (``TRACING_FILE`` with the process ID before the
+extension), so workers never rotate each other's files. Writes go
+through a queue to a background thread, so request handling never waits
+on disk.
+
+Tracing is off unless ``TRACING_ENABLED`` is set. When off, ``span()``
+and ``@traced`` cost one flag check. ``TRACING_SAMPLE_RATE`` decides per
+new trace whether to record it; continued traces follow the caller's
+sampled flag.
+"""
+import asyncio
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from app.config import get_settings
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_enabled = False
+_sample_rate = 1.0
+_listener: Optional[logging.handlers.QueueListener] = None
+_span_logger = logging.getLogger("app.tracing.spans")
+_span_logger.propagate = False
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "sampled", "attributes",
+                 "start_ns", "_start", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.attributes: Dict[str, object] = {}
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def finish(self) -> None:
+        if not self.sampled:
+            return
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+        if self.error:
+            record["error"] = self.error
+        _span_logger.info(json.dumps(record, default=str))
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace ID, parent span ID, sampled) from a traceparent header, or None."""
+    match = _TRACEPARENT_RE.match((header or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+
+def start_span(name: str, traceparent: Optional[str] = None) -> Span:
+    """Start a span under the current one, the given remote parent, or a new trace."""
+    parent = _current.get()
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, parent.sampled)
+    remote = parse_traceparent(traceparent)
+    if remote:
+        trace_id, parent_id, sampled = remote
+        return Span(name, trace_id, parent_id, sampled)
+    return Span(name, os.urandom(16).hex(), None, random.random() < _sample_rate)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Trace a block. Yields the span, or None while tracing is off."""
+    if not _enabled:
+        yield None
+        return
+    current = start_span(name)
+    current.attributes.update(attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.finish()
+
+
+def traced(fn):
+    """Trace every call of a function as ``<module>.<function>``."""
+    name = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            if not _enabled:
+                return await fn(*args, **kwargs)
+            with span(name):
+                return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        with span(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def outbound_headers() -> Dict[str, str]:
+    """Headers that carry the current trace into an outbound request."""
+    current = _current.get()
+    if current is None:
+        return {}
+    return {"traceparent": current.traceparent()}
+
+
+class TracingMiddleware:
+    """Opens a root span per HTTP request, named after the matched route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not _enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        root = start_span("HTTP " + scope["method"], traceparent)
+        root.set("http.method", scope["method"])
+        root.set("http.path", scope["path"])
+        token = _current.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.status = "error"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.status = "error"
+            root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"HTTP {scope['method']} {route.path}"
+            _current.reset(token)
+            root.finish()
+
+
+def process_file(path: str) -> str:
+    """This process's span file for a configured path: ``spans.jsonl`` becomes ``spans.<pid>.jsonl``."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{ext}"
+
+
+def configure(
+    enabled: Optional[bool] = None,
+    path: Optional[str] = None,
+    sample_rate: Optional[float] = None
+) -> None:
+    """Start or stop span export; arguments default to settings."""
+    global _enabled, _sample_rate, _listener
+    settings = get_settings()
+    shutdown()
+    _enabled = settings.tracing_enabled if enabled is None else enabled
+    _sample_rate = settings.tracing_sample_rate if sample_rate is None else sample_rate
+    if not _enabled:
+        return
+
+    path = process_file(path or settings.tracing_file)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=settings.tracing_max_bytes,
+        backupCount=settings.tracing_backup_count,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    span_queue: queue.Queue = queue.Queue(-1)
+    _span_logger.handlers = [logging.handlers.QueueHandler(span_queue)]
+    _span_logger.setLevel(logging.INFO)
+    _listener = logging.handlers.QueueListener(span_queue, file_handler)
+    _listener.start()
+
+
+def shutdown() -> None:
+    """Stop exporting and flush spans already finished."""
+    global _enabled, _listener
+    _enabled = False
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    _span_logger.handlers = []
@@ -0,0 +1,210 @@
+"""Service and endpoint benchmarks over synthetic devices of 10, 1k and 100k friends.
+
+Each size gets its own device (see ``datagen``) in one SQLite file, so the
+per-device queries also have to find their rows among everyone else's.
+The file is kept between runs and only missing devices are generated;
+delete it or point ``DATABASE_URL`` elsewhere to start over.
+
+Every case is timed until it has run ``--min-repeats`` times and for at
+least ``--min-seconds``, and reports min/median/p95 in milliseconds.
+Results are written as JSON and compared with a stored baseline: a case
+whose median is more than ``--threshold`` slower (and slower by more than
+the noise floor) is a regression, and the run exits non-zero.
+
+Baselines are only comparable on the same machine, so none is checked
+in: the first run on a machine stores its results as the local baseline
+(``baseline.json``, gitignored) and later runs compare against it.
+``--save-baseline`` replaces it, e.g. after an intended change.
+
+    cd backend && python -m benchmarks.bench_backend
+    cd backend && python -m benchmarks.bench_backend --sizes 10,1000 --save-baseline
+"""
+import os
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), ".data")
+os.makedirs(_DATA_DIR, exist_ok=True)
+# Point the app at the benchmark database before anything imports it
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DATA_DIR, 'bench.db')}")
+# The slow-query log would EXPLAIN every large-device query inside the timings
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from fastapi.testclient import TestClient
+
+from app.database import Base, SessionLocal, create_missing_indexes, engine
+from app.main import app
+from app.services import context_ranker, friend_service, interaction_service, token_service
+from benchmarks import datagen
+
+HERE = os.path.dirname(__file__)
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(HERE, "results", "latest.json")
+NOISE_FLOOR_MS = 0.5
+
+
+def measure(fn: Callable[[], object], min_repeats: int, min_seconds: float, max_repeats: int = 1000) -> Dict:
+    """Time ``fn`` after one warm-up call; returns summary statistics in ms."""
+    fn()
+    timings: List[float] = []
+    started = time.perf_counter()
+    while len(timings) < max_repeats and (
+        len(timings) < min_repeats or time.perf_counter() - started < min_seconds
+    ):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "repeats": len(timings),
+        "min_ms": round(timings[0], 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        "mean_ms": round(statistics.fmean(timings), 4)
+    }
+
+
+def cases_for(device_id: str, friend_id: int, client: TestClient) -> Dict[str, Callable[[], object]]:
+    """The benchmarked operations for one device."""
+    headers = {"X-Device-Id": device_id}
+
+    def with_session(fn):
+        def run():
+            db = SessionLocal()
+            try:
+                return fn(db)
+            finally:
+                db.close()
+        return run
+
+    def get(path):
+        def run():
+            response = client.get(path, headers=headers)
+            response.raise_for_status()
+        return run
+
+    def cold_context(db):
+        context_ranker.clear()
+        return interaction_service.get_interaction_context(db, friend_id)
+
+    return {
+        "service.get_friends": with_session(lambda db: friend_service.get_friends(db, device_id)),
+        "service.get_friends_needing_contact": with_session(
+            lambda db: friend_service.get_friends_needing_contact(db, device_id)
+        ),
+        "service.get_interaction_context": with_session(
+            lambda db: interaction_service.get_interaction_context(db, friend_id)
+        ),
+        "service.get_interaction_context_cold": with_session(cold_context),
+        "service.use_generation": with_session(lambda db: token_service.use_generation(db, device_id)),
+        "GET /api/v1/friends": get("/api/v1/friends"),
+        "GET /api/v1/friends/dashboard": get("/api/v1/friends/dashboard"),
+        "GET /api/v1/friends/{friend_id}": get(f"/api/v1/friends/{friend_id}"),
+        "GET /api/v1/tokens": get("/api/v1/tokens")
+    }
+
+
+def run(sizes: List[int], seed: int, min_repeats: int, min_seconds: float, only: Optional[str]) -> Dict:
+    Base.metadata.create_all(bind=engine)
+    create_missing_indexes()
+    # No lifespan: the background workers stay off while timing
+    client = TestClient(app)
+
+    results: Dict[str, Dict] = {}
+    for size in sizes:
+        device_id = datagen.device_id_for(size, seed)
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            if datagen.generate(db, device_id, size, seed=seed):
+                print(f"generated {size} friends in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+            friend_id = datagen.busiest_friend(db, device_id)
+        finally:
+            db.close()
+
+        for name, fn in cases_for(device_id, friend_id, client).items():
+            key = f"{name}[{size}]"
+            if only and only not in key:
+                continue
+            results[key] = measure(fn, min_repeats, min_seconds)
+            print(f"{key:<52} median {results[key]['median_ms']:10.3f} ms"
+                  f"  p95 {results[key]['p95_ms']:10.3f} ms", file=sys.stderr)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "seed": seed,
+            "sizes": sizes,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        },
+        "results": results
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """Cases whose median regressed beyond ``threshold`` relative to the baseline."""
+    regressions = []
+    for key, result in current["results"].items():
+        before = baseline.get("results", {}).get(key)
+        if not before:
+            continue
+        delta = result["median_ms"] - before["median_ms"]
+        if delta > NOISE_FLOOR_MS and result["median_ms"] > before["median_ms"] * (1 + threshold):
+            regressions.append({
+                "case": key,
+                "baseline_ms": before["median_ms"],
+                "current_ms": result["median_ms"],
+                "change": round(result["median_ms"] / before["median_ms"] - 1, 3)
+            })
+    return regressions
+
+
+def write_json(path: str, data: Dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default="10,1000,100000", help="Comma-separated friend counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-repeats", type=int, default=5)
+    parser.add_argument("--min-seconds", type=float, default=1.0)
+    parser.add_argument("--only", help="Run only cases whose name contains this string")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed median slowdown, e.g. 0.25 = 25%%")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    args = parser.parse_args()
+
+    current = run(
+        [int(size) for size in args.sizes.split(",")],
+        args.seed, args.min_repeats, args.min_seconds, args.only
+    )
+    write_json(args.output, current)
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        write_json(args.baseline, current)
+        print(f"baseline saved to {args.baseline}", file=sys.stderr)
+        return
+
+    with open(args.baseline) as f:
+        regressions = compare(current, json.load(f), args.threshold)
+    print(json.dumps({"regressions": regressions}, indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
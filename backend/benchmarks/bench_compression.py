@@ -0,0 +1,91 @@
+"""CPU cost against bytes saved when compressing friend lists.
+
+Fetches uncompressed ``/api/v1/friends`` bodies for synthetic devices
+(shared with ``bench_backend``), then compresses each the way
+``CompressionMiddleware`` would: whole, and streamed in
+``STREAM_BATCH_SIZE``-row chunks with a flush per chunk. Brotli rows are
+skipped when the ``brotli`` package is not installed.
+
+    cd backend && python -m benchmarks.bench_compression
+"""
+import os
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), ".data")
+os.makedirs(_DATA_DIR, exist_ok=True)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DATA_DIR, 'bench.db')}")
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+import time
+from typing import List
+
+from fastapi.testclient import TestClient
+
+from app.compression import _Compressor, brotli
+from app.config import get_settings
+from app.database import Base, SessionLocal, create_missing_indexes, engine
+from app.main import app
+from benchmarks import datagen
+
+SIZES = (100, 1000, 10000)
+SEED = 42
+LEVELS = [("gzip", 1), ("gzip", 6), ("gzip", 9)]
+if brotli is not None:
+    LEVELS += [("br", 1), ("br", 4), ("br", 9)]
+
+
+def split(body: bytes, friends: int, batch_size: int) -> List[bytes]:
+    """Cut a body into roughly as many chunks as the streamed list would send."""
+    count = max(1, -(-friends // batch_size)) + 2
+    step = -(-len(body) // count)
+    return [body[i:i + step] for i in range(0, len(body), step)]
+
+
+def compress(encoding: str, level: int, chunks: List[bytes]) -> int:
+    """Compressed size of the chunks, flushed after each one."""
+    compressor = _Compressor(encoding, gzip_level=level, brotli_quality=level)
+    size = sum(len(compressor.compress(chunk)) for chunk in chunks[:-1])
+    return size + len(compressor.finish(chunks[-1]))
+
+
+def cpu_per_call(encoding: str, level: int, chunks: List[bytes], repeats: int):
+    """Average process CPU seconds per compression, and the compressed size."""
+    size = compress(encoding, level, chunks)
+    start = time.process_time()
+    for _ in range(repeats):
+        compress(encoding, level, chunks)
+    return (time.process_time() - start) / repeats, size
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    create_missing_indexes()
+    client = TestClient(app)
+    batch_size = get_settings().stream_batch_size
+
+    for size in SIZES:
+        device_id = datagen.device_id_for(size, SEED)
+        db = SessionLocal()
+        try:
+            datagen.generate(db, device_id, size, seed=SEED)
+        finally:
+            db.close()
+        response = client.get(
+            "/api/v1/friends",
+            headers={"X-Device-Id": device_id, "Accept-Encoding": "identity"}
+        )
+        response.raise_for_status()
+        body = response.content
+        repeats = max(3, 2000 // size)
+        print(f"{size} friends, {len(body) / 1024:.1f} KiB")
+
+        for mode, chunks in (("whole", [body]), ("streamed", split(body, size, batch_size))):
+            for encoding, level in LEVELS:
+                cpu, compressed = cpu_per_call(encoding, level, chunks, repeats)
+                saved = len(body) - compressed
+                print(f"  {mode:<8} {encoding:<4} {level}: {cpu * 1000:8.2f} ms CPU, "
+                      f"{compressed / 1024:8.1f} KiB ({compressed / len(body):5.1%}), "
+                      f"saved {saved / 1024:8.1f} KiB, {saved / 1024 / max(cpu * 1000, 1e-6):7.1f} KiB/ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Per-request overhead of the metrics middleware.
+
+Drives a one-route FastAPI app directly through its ASGI interface (no
+HTTP client or server in the loop) with no middleware, with the previous
+``@app.middleware("http")`` implementation, and with ``MetricsMiddleware``.
+
+    cd backend && python -m benchmarks.bench_metrics_middleware
+"""
+import asyncio
+import re
+import time
+
+from fastapi import FastAPI, Request
+
+from app.metrics import http_requests, http_request_duration, crawler_visits
+from app.middleware import BOT_PATTERNS, MetricsMiddleware
+
+REQUESTS = 20000
+USER_AGENT = b"Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/friends/{friend_id}")
+    def get_friend(friend_id: int):
+        return {"id": friend_id}
+
+    return app
+
+
+def add_legacy_middleware(app: FastAPI) -> None:
+    """The middleware as it was before the pure ASGI rewrite."""
+
+    @app.middleware("http")
+    async def metrics_middleware(request: Request, call_next):
+        start_time = time.time()
+        ua = request.headers.get("user-agent", "")
+        for bot in BOT_PATTERNS:
+            if bot.lower() in ua.lower():
+                crawler_visits.labels(tool="bench", bot=bot).inc()
+                break
+        response = await call_next(request)
+        duration = time.time() - start_time
+        endpoint = re.sub(r'/\d+', '/{id}', request.url.path)
+        http_requests.labels(tool="bench", endpoint=endpoint, method=request.method,
+                             status=response.status_code).inc()
+        http_request_duration.labels(tool="bench", endpoint=endpoint, method=request.method).observe(duration)
+        return response
+
+
+async def drive(app, count: int) -> float:
+    """Send ``count`` requests straight into the ASGI app; returns seconds per request."""
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for i in range(count):
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                # Like a server: nothing more until the client disconnects
+                await asyncio.Future()
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": f"/api/v1/friends/{i % 500}",
+            "raw_path": f"/api/v1/friends/{i % 500}".encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"bench"), (b"user-agent", USER_AGENT)],
+            "client": ("127.0.0.1", 1234),
+            "server": ("bench", 80)
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / count
+
+
+async def main() -> None:
+    bare = build_app()
+    legacy = build_app()
+    add_legacy_middleware(legacy)
+    current = build_app()
+    current.add_middleware(MetricsMiddleware)
+
+    results = {}
+    for name, app in (("none", bare), ("legacy", legacy), ("asgi", current)):
+        await drive(app, 1000)  # Warm up
+        results[name] = await drive(app, REQUESTS)
+
+    for name, seconds in results.items():
+        overhead = seconds - results["none"]
+        print(f"{name:>7}: {seconds * 1e6:8.1f} us/request  (middleware overhead {overhead * 1e6:7.1f} us)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""CPU per large list response, default path vs ``FAST_RESPONSES``.
+
+Requests the friends list and dashboard of synthetic devices (shared with
+``bench_backend``) through the ASGI app, once with Pydantic models,
+response_model validation and stdlib JSON, and once with row tuples
+encoded by orjson. CPU is process time, so it includes the threadpool
+thread that runs the sync endpoints.
+
+    cd backend && python -m benchmarks.bench_responses
+"""
+import os
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), ".data")
+os.makedirs(_DATA_DIR, exist_ok=True)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DATA_DIR, 'bench.db')}")
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+import time
+
+from fastapi.testclient import TestClient
+
+from app.config import get_settings
+from app.database import Base, SessionLocal, create_missing_indexes, engine
+from app.main import app
+from benchmarks import datagen
+
+SIZES = (1000, 10000)
+PATHS = ("/api/v1/friends", "/api/v1/friends/dashboard")
+SEED = 42
+
+
+def cpu_per_request(client: TestClient, path: str, headers: dict, repeats: int) -> float:
+    """Average process CPU seconds per request, after a warm-up request."""
+    client.get(path, headers=headers).raise_for_status()
+    start = time.process_time()
+    for _ in range(repeats):
+        client.get(path, headers=headers).raise_for_status()
+    return (time.process_time() - start) / repeats
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    create_missing_indexes()
+    client = TestClient(app)
+    settings = get_settings()
+
+    for size in SIZES:
+        device_id = datagen.device_id_for(size, SEED)
+        db = SessionLocal()
+        try:
+            datagen.generate(db, device_id, size, seed=SEED)
+        finally:
+            db.close()
+        headers = {"X-Device-Id": device_id}
+        repeats = max(3, 20000 // size)
+
+        for path in PATHS:
+            settings.fast_responses = False
+            default = cpu_per_request(client, path, headers, repeats)
+            settings.fast_responses = True
+            fast = cpu_per_request(client, path, headers, repeats)
+            print(f"{path:<28} {size:>6} friends: default {default * 1000:8.2f} ms CPU, "
+                  f"fast {fast * 1000:8.2f} ms CPU, saved {(default - fast) * 1000:8.2f} ms "
+                  f"({1 - fast / default:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Reminder scheduler rebuild time and update throughput.
+
+Rebuilds the transition queue from the benchmark database (the 100k-friend
+synthetic device shared with ``bench_backend``), then times reschedules
+and due-transition pops on a queue of ``QUEUE_SIZE`` synthetic friends.
+
+    cd backend && python -m benchmarks.bench_scheduler
+"""
+import os
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), ".data")
+os.makedirs(_DATA_DIR, exist_ok=True)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DATA_DIR, 'bench.db')}")
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.database import Base, SessionLocal, create_missing_indexes, engine
+from app.models import ContactFrequency
+from app.services.reminder_scheduler import ReminderScheduler, TransitionQueue, next_transition
+from benchmarks import datagen
+
+SIZE = 100000
+SEED = 42
+QUEUE_SIZE = 1_000_000
+UPDATES = 200_000
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    create_missing_indexes()
+    db = SessionLocal()
+    try:
+        datagen.generate(db, datagen.device_id_for(SIZE, SEED), SIZE, seed=SEED)
+    finally:
+        db.close()
+
+    scheduler = ReminderScheduler(sinks=[])
+    start = time.perf_counter()
+    scheduled = scheduler.rebuild()
+    print(f"rebuild: {scheduled} pending transitions in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    rng = random.Random(SEED)
+    now = datetime.utcnow()
+    frequencies = list(ContactFrequency)
+    queue = TransitionQueue()
+    queue.replace(
+        next_transition(i, "device", now - timedelta(minutes=rng.randrange(60 * 24 * 5)), frequencies[i % 4], now)
+        for i in range(QUEUE_SIZE)
+    )
+
+    start = time.perf_counter()
+    for _ in range(UPDATES):
+        friend_id = rng.randrange(QUEUE_SIZE)
+        queue.push(next_transition(friend_id, "device", now, frequencies[friend_id % 4], now))
+    elapsed = time.perf_counter() - start
+    print(f"reschedule: {UPDATES / elapsed:,.0f}/s ({elapsed / UPDATES * 1e6:.1f} us each, {QUEUE_SIZE:,} queued)")
+
+    start = time.perf_counter()
+    popped = 0
+    while True:
+        batch = queue.pop_due(now + timedelta(days=3), limit=500)
+        if not batch:
+            break
+        popped += len(batch)
+    elapsed = time.perf_counter() - start
+    print(f"pop due: {popped:,} in {elapsed * 1000:.0f} ms ({elapsed / max(popped, 1) * 1e6:.1f} us each)")
+
+
+if __name__ == "__main__":
+    main()
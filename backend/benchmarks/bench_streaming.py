@@ -0,0 +1,101 @@
+"""Peak memory and time to first byte for a very large friend list.
+
+Requests ``/api/v1/friends`` for a 50k-friend synthetic device (shared
+with ``bench_backend``) straight through the ASGI app, buffered (default
+and ``FAST_RESPONSES``) and with ``stream=true``. Timing and memory are
+separate passes, since tracemalloc slows everything it watches.
+
+    cd backend && python -m benchmarks.bench_streaming
+"""
+import os
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), ".data")
+os.makedirs(_DATA_DIR, exist_ok=True)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DATA_DIR, 'bench.db')}")
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+import asyncio
+import time
+import tracemalloc
+from typing import Dict
+
+from app.config import get_settings
+from app.database import Base, SessionLocal, create_missing_indexes, engine
+from app.main import app
+from benchmarks import datagen
+
+SIZE = 50000
+SEED = 42
+MODES = {
+    "buffered": ("", False),
+    "buffered, fast": ("", True),
+    "streamed": ("stream=true", False)
+}
+
+
+async def request(query: str) -> Dict[str, float]:
+    """One GET through the ASGI app; returns time to first byte, total time and body size."""
+    device_id = datagen.device_id_for(SIZE, SEED)
+    timings = {"ttfb": None, "total": None, "bytes": 0}
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Future()
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            if timings["ttfb"] is None:
+                timings["ttfb"] = time.perf_counter() - start
+            timings["bytes"] += len(message["body"])
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/v1/friends",
+        "raw_path": b"/api/v1/friends",
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"bench"), (b"x-device-id", device_id.encode())],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+        "app": app
+    }
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    timings["total"] = time.perf_counter() - start
+    return timings
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    create_missing_indexes()
+    db = SessionLocal()
+    try:
+        datagen.generate(db, datagen.device_id_for(SIZE, SEED), SIZE, seed=SEED)
+    finally:
+        db.close()
+    settings = get_settings()
+
+    for name, (query, fast) in MODES.items():
+        settings.fast_responses = fast
+        asyncio.run(request(query))  # Warm up
+        timings = asyncio.run(request(query))
+
+        tracemalloc.start()
+        asyncio.run(request(query))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{name:<16} ttfb {timings['ttfb'] * 1000:9.1f} ms  total {timings['total'] * 1000:9.1f} ms"
+              f"  peak {peak / 2 ** 20:8.1f} MiB  body {timings['bytes'] / 2 ** 20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Seeded synthetic data for benchmarks.
+
+Builds one device with ``n`` friends and interaction histories shaped like
+real use: most friends have a handful of logged contacts, a few have long
+histories, some have none yet. Contact dates drift around each friend's
+target frequency, so every health status is represented. The same seed
+always produces the same rows.
+
+Rows go in through executemany inserts in chunks, which keeps 100k friends
+(around 600k interactions) to seconds rather than minutes.
+"""
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import ContactFrequency, Friend, GenerationToken, Interaction, RelationType
+from app.services.friend_service import get_frequency_days
+
+CHUNK = 5000
+
+FIRST_NAMES = [
+    "Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie", "Avery", "Quinn",
+    "Mei", "Yuki", "Lukas", "Chloé", "Min-jun", "Lucía", "Omar", "Priya", "Kwame", "Ingrid"
+]
+LAST_NAMES = [
+    "Smith", "Chen", "Müller", "Tanaka", "Garcia", "Kim", "Okafor", "Novak", "Rossi", "Silva"
+]
+TOPICS = [
+    "new job", "marathon training", "moving house", "the wedding", "their dog", "a trip to Japan",
+    "the book club", "a new baby", "learning guitar", "their startup", "knee surgery", "the garden",
+    "a concert", "grad school", "their parents", "a cooking class", "the football season", "a promotion"
+]
+TEMPLATES = [
+    "Caught up over coffee about {a}. They mentioned {b}.",
+    "Long phone call, mostly about {a}.",
+    "Quick text exchange about {a} and {b}.",
+    "Had dinner together. Talked about {a}; they are worried about {b}.",
+    "Video call. They shared news about {a}."
+]
+FREQUENCY_WEIGHTS = {
+    ContactFrequency.WEEKLY: 2,
+    ContactFrequency.BIWEEKLY: 3,
+    ContactFrequency.MONTHLY: 4,
+    ContactFrequency.QUARTERLY: 2
+}
+
+
+def device_id_for(size: int, seed: int) -> str:
+    return f"bench-{size}-s{seed}"
+
+
+def _history_length(rng: random.Random) -> int:
+    # Heavy-tailed: ~10% never logged, median ~4, a few in the hundreds
+    if rng.random() < 0.1:
+        return 0
+    return min(300, int(rng.paretovariate(1.3) * 3))
+
+
+def _interaction_rows(rng: random.Random, friend_id: int, frequency: ContactFrequency, now: datetime) -> List[Dict]:
+    count = _history_length(rng)
+    if not count:
+        return []
+    period = get_frequency_days(frequency)
+    # The latest contact lands anywhere from fresh to well overdue
+    contacted_at = now - timedelta(days=rng.uniform(0, period * 2.5), minutes=rng.randrange(1440))
+    rows = []
+    for _ in range(count):
+        a, b = rng.sample(TOPICS, 2)
+        rows.append({
+            "friend_id": friend_id,
+            "contacted_at": contacted_at,
+            "summary": rng.choice(TEMPLATES).format(a=a, b=b),
+            "next_topics": json.dumps(rng.sample(TOPICS, rng.randint(0, 3))) if rng.random() < 0.7 else None,
+            "created_at": contacted_at
+        })
+        contacted_at -= timedelta(days=max(1.0, rng.gauss(period, period / 3)))
+    return rows
+
+
+def generate(db: Session, device_id: str, friends: int, seed: int = 42, now: Optional[datetime] = None) -> bool:
+    """Populate ``device_id`` with ``friends`` friends and their histories.
+
+    Returns False without writing anything if the device already has data,
+    so a benchmark database can be reused across runs.
+    """
+    if db.scalar(select(func.count(Friend.id)).where(Friend.device_id == device_id)):
+        return False
+
+    rng = random.Random(f"{seed}:{friends}")
+    now = now or datetime.utcnow()
+    next_id = (db.scalar(select(func.max(Friend.id))) or 0) + 1
+    frequencies = list(FREQUENCY_WEIGHTS)
+    weights = list(FREQUENCY_WEIGHTS.values())
+    relations = list(RelationType)
+
+    friend_rows: List[Dict] = []
+    interaction_rows: List[Dict] = []
+
+    def flush() -> None:
+        if friend_rows:
+            db.execute(insert(Friend), friend_rows)
+            friend_rows.clear()
+        if interaction_rows:
+            db.execute(insert(Interaction), interaction_rows)
+            interaction_rows.clear()
+
+    for friend_id in range(next_id, next_id + friends):
+        frequency = rng.choices(frequencies, weights)[0]
+        created_at = now - timedelta(days=rng.uniform(1, 900))
+        friend_rows.append({
+            "id": friend_id,
+            "device_id": device_id,
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "nickname": rng.choice(FIRST_NAMES) if rng.random() < 0.2 else None,
+            "relation_type": rng.choice(relations),
+            "contact_frequency": frequency,
+            "notes": f"Met through {rng.choice(TOPICS)}." if rng.random() < 0.4 else None,
+            "created_at": created_at,
+            "updated_at": created_at
+        })
+        interaction_rows.extend(_interaction_rows(rng, friend_id, frequency, now))
+        if len(friend_rows) >= CHUNK or len(interaction_rows) >= CHUNK * 6:
+            flush()
+    flush()
+
+    # Enough paid tokens that use_generation never runs dry mid-benchmark
+    db.execute(insert(GenerationToken), [{
+        "device_id": device_id,
+        "tokens_remaining": 10_000_000,
+        "free_trial_used": 0,
+        "created_at": now,
+        "updated_at": now
+    }])
+    db.commit()
+    return True
+
+
+def busiest_friend(db: Session, device_id: str) -> int:
+    """The friend with the longest history, for per-friend benchmarks."""
+    return db.execute(
+        select(Interaction.friend_id)
+        .join(Friend, Friend.id == Interaction.friend_id)
+        .where(Friend.device_id == device_id)
+        .group_by(Interaction.friend_id)
+        .order_by(func.count(Interaction.id).desc(), Interaction.friend_id)
+        .limit(1)
+    ).scalar_one()
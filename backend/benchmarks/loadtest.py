@@ -0,0 +1,476 @@
+"""End-to-end load test of the real app under uvicorn, with SLO reporting.
+
+The app runs as a uvicorn subprocess against its own seeded SQLite file,
+with LLM and Creem calls going to the fake servers from ``app.testing``
+served over HTTP from this process. Traffic is open-loop: requests arrive
+as a Poisson process at ``--rate`` per second whether or not earlier ones
+have finished, and latency is measured from each request's scheduled
+arrival, so a stalled server shows up as latency rather than as a quietly
+lower request rate. Arrivals beyond ``--max-in-flight`` are dropped and
+counted as errors.
+
+The mix models many devices polling the dashboard, browsing friends,
+logging interactions, generating talk starters, buying tokens and the
+provider's webhooks for those purchases.
+
+Each ``--config`` starts a fresh server with its own worker count and
+environment (any ``Settings`` field, e.g. ``DATABASE_POOL_SIZE`` or
+``THREADPOOL_SIZE``) and runs every ``--rate`` against it; the report
+lists throughput, p50/p95/p99 and error rate per route and whether each
+route met its p95 and error-rate SLOs.
+
+    cd backend && python -m benchmarks.loadtest --rate 50 --duration 30
+    cd backend && python -m benchmarks.loadtest --rate 50,100,200 \\
+        --config one:workers=1 --config two:workers=2,DATABASE_POOL_SIZE=10
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Friend
+from app.testing import FakeCreemServer, FakeLLMServer
+from benchmarks import datagen
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(BACKEND_DIR, "benchmarks", "results", "loadtest.json")
+WEBHOOK_SECRET = "load-test-secret"
+PRODUCT_IDS = {"starter": "prod_starter", "popular": "prod_popular", "pro": "prod_pro"}
+
+# Share of arrivals per operation
+MIX = {
+    "dashboard": 50,
+    "list_friends": 10,
+    "friend_detail": 10,
+    "log_interaction": 10,
+    "talk_starters": 8,
+    "tokens": 5,
+    "create_friend": 3,
+    "checkout": 2,
+    "webhook": 2
+}
+
+# p95 targets in milliseconds, by route
+SLO_P95_MS = {
+    "GET /api/v1/friends/dashboard": 200,
+    "GET /api/v1/friends": 200,
+    "GET /api/v1/friends/{friend_id}": 200,
+    "POST /api/v1/friends/{friend_id}/interactions": 300,
+    "POST /api/v1/friends": 300,
+    "POST /api/v1/talk-starters": 1500,
+    "GET /api/v1/tokens": 100,
+    "POST /api/v1/checkout": 1000,
+    "POST /api/v1/webhook/creem": 100
+}
+DROPPED = "dropped"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeUpstream:
+    """Serves an ASGI fake on a local port from a background thread."""
+
+    def __init__(self, app):
+        self.port = free_port()
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, lifespan="off", log_level="warning"
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> None:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def seed_database(path: str, devices: int, friends: int, seed: int) -> Dict[str, List[int]]:
+    """Create and populate a database; returns friend IDs per device."""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        for i in range(devices):
+            datagen.generate(db, f"load-{i}", friends, seed=seed + i)
+        rows = db.execute(select(Friend.device_id, Friend.id).order_by(Friend.id)).all()
+    finally:
+        db.close()
+        engine.dispose()
+    friend_ids: Dict[str, List[int]] = {}
+    for device_id, friend_id in rows:
+        friend_ids.setdefault(device_id, []).append(friend_id)
+    return friend_ids
+
+
+class AppServer:
+    """The app under uvicorn in a subprocess."""
+
+    def __init__(self, database_path: str, workers: int, env: Dict[str, str], upstreams: Dict[str, str]):
+        self.port = free_port()
+        self.workers = workers
+        self.metrics_dir = tempfile.mkdtemp(prefix="loadtest-metrics-")
+        self.env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{database_path}",
+            "LLM_PROXY_URL": upstreams["llm"],
+            "LLM_PROXY_KEY": "load-test",
+            "CREEM_API_URL": upstreams["creem"],
+            "CREEM_API_KEY": "load-test",
+            "CREEM_PRODUCT_IDS": json.dumps(PRODUCT_IDS),
+            "CREEM_WEBHOOK_SECRET": WEBHOOK_SECRET,
+            **env
+        }
+        if workers > 1:
+            self.env["PROMETHEUS_MULTIPROC_DIR"] = self.metrics_dir
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 30.0) -> None:
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=self.env
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with {self.process.returncode}")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1.0).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("Server did not become healthy in time")
+
+    def stop(self) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+
+class Traffic:
+    """Builds requests for the mix and keeps the state they depend on."""
+
+    def __init__(self, friend_ids: Dict[str, List[int]], rng: random.Random):
+        self.friend_ids = {device: list(ids) for device, ids in friend_ids.items()}
+        self.devices = list(self.friend_ids)
+        self.pending_checkouts: List[Tuple[str, str, str]] = []
+        self.rng = rng
+        self.ops = list(MIX)
+        self.weights = list(MIX.values())
+
+    def pick(self) -> str:
+        op = self.rng.choices(self.ops, self.weights)[0]
+        if op == "webhook" and not self.pending_checkouts:
+            # Nothing bought yet; a purchase comes first
+            return "checkout"
+        return op
+
+    async def send(self, client: httpx.AsyncClient, op: str) -> Tuple[str, int]:
+        """Send one request for ``op``; returns its route label and status."""
+        rng = self.rng
+        device_id = rng.choice(self.devices)
+        headers = {"X-Device-Id": device_id}
+        friend_ids = self.friend_ids[device_id]
+        friend_id = rng.choice(friend_ids) if friend_ids else 0
+
+        if op == "dashboard":
+            route, response = "GET /api/v1/friends/dashboard", await client.get(
+                "/api/v1/friends/dashboard", headers=headers)
+        elif op == "list_friends":
+            route, response = "GET /api/v1/friends", await client.get("/api/v1/friends", headers=headers)
+        elif op == "friend_detail":
+            route, response = "GET /api/v1/friends/{friend_id}", await client.get(
+                f"/api/v1/friends/{friend_id}", headers=headers)
+        elif op == "log_interaction":
+            topics = rng.sample(datagen.TOPICS, 2)
+            route, response = "POST /api/v1/friends/{friend_id}/interactions", await client.post(
+                f"/api/v1/friends/{friend_id}/interactions",
+                json={"summary": f"Talked about {topics[0]}.", "next_topics": [topics[1]]},
+                headers=headers)
+        elif op == "talk_starters":
+            route, response = "POST /api/v1/talk-starters", await client.post(
+                "/api/v1/talk-starters", json={"friend_id": friend_id}, headers=headers)
+        elif op == "tokens":
+            route, response = "GET /api/v1/tokens", await client.get("/api/v1/tokens", headers=headers)
+        elif op == "create_friend":
+            route, response = "POST /api/v1/friends", await client.post(
+                "/api/v1/friends", json={"name": rng.choice(datagen.FIRST_NAMES)}, headers=headers)
+            if response.status_code == 201:
+                friend_ids.append(response.json()["id"])
+        elif op == "checkout":
+            sku = rng.choice(list(PRODUCT_IDS))
+            route, response = "POST /api/v1/checkout", await client.post("/api/v1/checkout", json={
+                "product_sku": sku, "success_url": "https://app.test/success", "device_id": device_id
+            })
+            if response.status_code == 200:
+                self.pending_checkouts.append((response.json()["checkout_id"], device_id, sku))
+        else:
+            checkout_id, owner, sku = self.pending_checkouts.pop(rng.randrange(len(self.pending_checkouts)))
+            body = json.dumps({
+                "id": f"evt_{uuid.uuid4().hex}",
+                "event_type": "checkout.completed",
+                "object": {"id": checkout_id, "metadata": {"device_id": owner, "product_sku": sku}}
+            }).encode()
+            signature = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+            route, response = "POST /api/v1/webhook/creem", await client.post(
+                "/api/v1/webhook/creem", content=body,
+                headers={"creem-signature": signature, "content-type": "application/json"})
+        return route, response.status_code
+
+
+ROUTE_OF_OP = {
+    "dashboard": "GET /api/v1/friends/dashboard",
+    "list_friends": "GET /api/v1/friends",
+    "friend_detail": "GET /api/v1/friends/{friend_id}",
+    "log_interaction": "POST /api/v1/friends/{friend_id}/interactions",
+    "talk_starters": "POST /api/v1/talk-starters",
+    "tokens": "GET /api/v1/tokens",
+    "create_friend": "POST /api/v1/friends",
+    "checkout": "POST /api/v1/checkout",
+    "webhook": "POST /api/v1/webhook/creem"
+}
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+    def record(self, latency: Optional[float], status: str, ok: bool) -> None:
+        if latency is not None:
+            self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, seconds: float, slo_p95_ms: Optional[float], slo_error_rate: float) -> Dict:
+        latencies = sorted(self.latencies)
+        count = sum(self.statuses.values())
+
+        def percentile(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 2)
+
+        error_rate = self.errors / count if count else 0.0
+        p95 = percentile(0.95)
+        return {
+            "requests": count,
+            "throughput_rps": round((count - self.errors) / seconds, 2),
+            "p50_ms": percentile(0.50),
+            "p95_ms": p95,
+            "p99_ms": percentile(0.99),
+            "error_rate": round(error_rate, 4),
+            "statuses": self.statuses,
+            "slo_p95_ms": slo_p95_ms,
+            "slo_met": error_rate <= slo_error_rate and (
+                slo_p95_ms is None or p95 is None or p95 <= slo_p95_ms
+            )
+        }
+
+
+async def drive(
+    base_url: str,
+    traffic: Traffic,
+    rate: float,
+    duration: float,
+    warmup: float,
+    max_in_flight: int
+) -> Dict[str, RouteStats]:
+    """Send open-loop Poisson arrivals at ``rate`` per second for ``warmup + duration`` seconds."""
+    stats: Dict[str, RouteStats] = {}
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        async def one(op: str, scheduled: float, measured: bool) -> None:
+            try:
+                route, status = await traffic.send(client, op)
+                label, ok = str(status), 200 <= status < 300
+            except Exception as e:
+                route, label, ok = ROUTE_OF_OP[op], type(e).__name__, False
+            if measured:
+                stats.setdefault(route, RouteStats()).record(loop.time() - scheduled, label, ok)
+
+        start = loop.time()
+        arrival = start
+        while True:
+            arrival += traffic.rng.expovariate(rate)
+            if arrival - start >= warmup + duration:
+                break
+            await asyncio.sleep(max(0.0, arrival - loop.time()))
+            op = traffic.pick()
+            measured = arrival - start >= warmup
+            if len(tasks) >= max_in_flight:
+                if measured:
+                    stats.setdefault(ROUTE_OF_OP[op], RouteStats()).record(None, DROPPED, False)
+                continue
+            task = asyncio.create_task(one(op, arrival, measured))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    return stats
+
+
+def parse_config(spec: str) -> Tuple[str, int, Dict[str, str]]:
+    """``name:workers=2,KEY=value`` -> (name, workers, env)."""
+    name, _, options = spec.partition(":")
+    env = {}
+    workers = 1
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key == "workers":
+            workers = int(value)
+        else:
+            env[key.upper()] = value
+    return name, workers, env
+
+
+def print_report(name: str, rate: float, routes: Dict[str, Dict], overall: Dict) -> None:
+    print(f"\n== {name} @ {rate:g} req/s: {overall['throughput_rps']} ok req/s, "
+          f"error rate {overall['error_rate']:.2%}, p99 {overall['p99_ms']} ms")
+    print(f"{'route':<48}{'reqs':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>8}  SLO")
+    for route, s in sorted(routes.items()):
+        print(f"{route:<48}{s['requests']:>7}{s['throughput_rps']:>9}{s['p50_ms'] or '-':>9}"
+              f"{s['p95_ms'] or '-':>9}{s['p99_ms'] or '-':>9}{s['error_rate']:>8.2%}  "
+              f"{'ok' if s['slo_met'] else 'MISS'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rate", default="50", help="Arrivals per second; comma-separate to step through several")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds per rate")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before each rate")
+    parser.add_argument("--max-in-flight", type=int, default=512)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--friends", type=int, default=25, help="Friends per device")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-delay", type=float, default=0.4, help="Fake LLM latency in seconds")
+    parser.add_argument("--creem-delay", type=float, default=0.1, help="Fake Creem latency in seconds")
+    parser.add_argument("--config", action="append", default=[],
+                        help="name:workers=N,SETTING=value; repeat to compare configurations")
+    parser.add_argument("--slo", action="append", default=[], help="ROUTE=P95_MS to override a route's SLO")
+    parser.add_argument("--slo-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    slos = dict(SLO_P95_MS)
+    for spec in args.slo:
+        route, _, target = spec.rpartition("=")
+        slos[route] = float(target)
+    configs = [parse_config(spec) for spec in args.config or ["default:workers=1"]]
+    rates = [float(rate) for rate in args.rate.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    template = os.path.join(workdir, "seed.db")
+    started = time.perf_counter()
+    friend_ids = seed_database(template, args.devices, args.friends, args.seed)
+    print(f"seeded {args.devices} devices in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    llm = FakeUpstream(FakeLLMServer(delay=args.llm_delay))
+    creem = FakeUpstream(FakeCreemServer(delay=args.creem_delay))
+    llm.start()
+    creem.start()
+
+    report = {"settings": vars(args), "runs": []}
+    try:
+        for name, workers, env in configs:
+            for rate in rates:
+                # Each run starts from the same data
+                database = os.path.join(workdir, f"{name}-{rate:g}.db")
+                shutil.copyfile(template, database)
+                server = AppServer(database, workers, env, {"llm": llm.url, "creem": creem.url})
+                server.start()
+                try:
+                    traffic = Traffic(friend_ids, random.Random(args.seed))
+                    stats = asyncio.run(drive(
+                        server.url, traffic, rate, args.duration, args.warmup, args.max_in_flight
+                    ))
+                finally:
+                    server.stop()
+
+                overall = RouteStats()
+                for route_stats in stats.values():
+                    overall.latencies.extend(route_stats.latencies)
+                    overall.errors += route_stats.errors
+                    for status, count in route_stats.statuses.items():
+                        overall.statuses[status] = overall.statuses.get(status, 0) + count
+                routes = {
+                    route: s.summary(args.duration, slos.get(route), args.slo_error_rate)
+                    for route, s in stats.items()
+                }
+                run = {
+                    "config": name,
+                    "workers": workers,
+                    "env": env,
+                    "rate": rate,
+                    "overall": overall.summary(args.duration, None, args.slo_error_rate),
+                    "routes": routes
+                }
+                report["runs"].append(run)
+                print_report(name, rate, routes, run["overall"])
+    finally:
+        llm.stop()
+        creem.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if len(report["runs"]) > 1:
+        print(f"\n{'config':<16}{'rate':>8}{'ok rps':>9}{'p95':>9}{'p99':>9}{'err':>8}{'SLOs met':>10}")
+        for run in report["runs"]:
+            met = f"{sum(route['slo_met'] for route in run['routes'].values())}/{len(run['routes'])}"
+            print(f"{run['config']:<16}{run['rate']:>8g}{run['overall']['throughput_rps']:>9}"
+                  f"{run['overall']['p95_ms'] or '-':>9}{run['overall']['p99_ms'] or '-':>9}"
+                  f"{run['overall']['error_rate']:>8.2%}{met:>10}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,10 @@
+import os
+
+# Fail any request that repeats a statement shape too often (N+1)
+os.environ.setdefault("QUERY_DETECTOR_MODE", "raise")
+# The lifespan's worker would poll ./app.db, not the test database
+os.environ.setdefault("WEBHOOK_WORKER_ENABLED", "false")
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -5,7 +12,8 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, get_db, get_session_factory
+from app.services import context_ranker, health_metrics, llm_resilience, llm_router
 
 
 # Test database
@@ -26,10 +34,22 @@ def override_get_db():
         db.close()
 
 
+@pytest.fixture(autouse=True)
+def reset_llm_state():
+    """Give each test a fresh LLM circuit breaker, concurrency limit and endpoint stats."""
+    llm_resilience.reset()
+    llm_router.reset()
+    yield
+    llm_resilience.reset()
+    llm_router.reset()
+
+
 @pytest.fixture(scope="function")
 def db():
     """Create a fresh database for each test."""
     Base.metadata.create_all(bind=engine)
+    context_ranker.clear()
+    health_metrics.reset()
     db = TestingSessionLocal()
     yield db
     db.close()
@@ -40,6 +60,7 @@ def db():
 def client(db):
     """Create a test client with the test database."""
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
     Base.metadata.create_all(bind=engine)
     with TestClient(app) as c:
         yield c
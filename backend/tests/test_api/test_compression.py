@@ -0,0 +1,138 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from app.compression import CompressionMiddleware, choose_encoding
+
+
+@pytest.fixture
+def many_friends(client, headers):
+    """Create enough friends for the list to pass the size threshold."""
+    for i in range(30):
+        client.post("/api/v1/friends", json={"name": f"Friend {i}", "nickname": "Pal"}, headers=headers)
+
+
+def run(app, accept_encoding: str = "gzip"):
+    """Send one GET through an ASGI app; return the sent messages."""
+    messages = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Future()  # Never disconnects
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", accept_encoding.encode())]
+    }
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+class TestChooseEncoding:
+    """Test Accept-Encoding negotiation."""
+
+    def test_prefers_brotli_when_available(self):
+        """Test brotli wins over gzip when both sides support it."""
+        assert choose_encoding("gzip, deflate, br", brotli_available=True) == "br"
+        assert choose_encoding("gzip, deflate, br", brotli_available=False) == "gzip"
+
+    def test_q_values(self):
+        """Test q-values rank encodings and q=0 refuses one."""
+        assert choose_encoding("br;q=0.5, gzip;q=0.8", brotli_available=True) == "gzip"
+        assert choose_encoding("gzip;q=0", brotli_available=True) is None
+        assert choose_encoding("*", brotli_available=False) == "gzip"
+
+    def test_identity_only(self):
+        """Test no encoding is chosen when the client accepts none we have."""
+        assert choose_encoding("identity, deflate") is None
+
+
+class TestCompressedResponses:
+    """Test compression of API responses."""
+
+    def test_large_list_gzipped(self, client, headers, many_friends):
+        """Test a large list is gzipped and decodes to the plain body."""
+        plain = client.get("/api/v1/friends", headers={**headers, "Accept-Encoding": "identity"})
+        compressed = client.get("/api/v1/friends", headers={**headers, "Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in plain.headers
+        assert compressed.headers["content-encoding"] == "gzip"
+        assert compressed.headers["vary"] == "Accept-Encoding"
+        assert int(compressed.headers["content-length"]) < len(plain.content)
+        assert compressed.content == plain.content
+
+    def test_small_body_sent_as_is(self, client, headers):
+        """Test bodies under the threshold are not compressed."""
+        response = client.get("/api/v1/friends", headers={**headers, "Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.json() == []
+
+    def test_streamed_list_gzipped(self, client, headers, many_friends):
+        """Test a streamed list is compressed and decodes to the buffered body."""
+        buffered = client.get("/api/v1/friends", headers={**headers, "Accept-Encoding": "identity"})
+        streamed = client.get("/api/v1/friends?stream=true", headers={**headers, "Accept-Encoding": "gzip"})
+
+        assert streamed.headers["content-encoding"] == "gzip"
+        assert "content-length" not in streamed.headers
+        assert streamed.content == buffered.content
+
+    def test_brotli(self, client, headers, many_friends):
+        """Test brotli is used when the client prefers it."""
+        pytest.importorskip("brotli")
+
+        response = client.get("/api/v1/friends", headers={**headers, "Accept-Encoding": "br"})
+
+        assert response.headers["content-encoding"] == "br"
+        assert len(response.json()) == 30
+
+
+class TestCompressionMiddleware:
+    """Test the middleware on bare ASGI apps."""
+
+    def test_stream_chunks_flushed_incrementally(self):
+        """Test each streamed chunk decompresses on its own, before the stream ends."""
+        chunks = [b"x" * 2000, b"y" * 2000, b"z" * 2000]
+
+        async def body():
+            for chunk in chunks:
+                yield chunk
+
+        app = CompressionMiddleware(StreamingResponse(body(), media_type="application/json"), minimum_size=10)
+        messages = run(app)
+
+        decoder = zlib.decompressobj(31)
+        bodies = [m["body"] for m in messages if m["type"] == "http.response.body"]
+        assert [decoder.decompress(b) for b in bodies[:3]] == chunks
+        assert gzip.decompress(b"".join(bodies)) == b"".join(chunks)
+
+    def test_non_text_passed_through(self):
+        """Test binary types and event streams are left alone."""
+        for media_type in ("image/png", "text/event-stream"):
+            app = CompressionMiddleware(PlainTextResponse("a" * 5000, media_type=media_type), minimum_size=10)
+            messages = run(app)
+
+            start = dict(messages[0]["headers"])
+            assert b"content-encoding" not in start
+            assert messages[1]["body"] == b"a" * 5000
+
+    def test_already_encoded_passed_through(self):
+        """Test responses with a Content-Encoding are not compressed twice."""
+        response = PlainTextResponse("a" * 5000, headers={"Content-Encoding": "gzip"})
+        messages = run(CompressionMiddleware(response, minimum_size=10))
+
+        assert messages[1]["body"] == b"a" * 5000
@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import pytest
+
+from app.config import Settings
+from app import profiler
+from app.profiler import AllocationTracker, Profile
+
+TOKEN = {"X-Debug-Token": "secret"}
+
+
+@pytest.fixture
+def debug_settings():
+    """Enable the debug endpoints with a known token."""
+    settings = Settings(debug_token="secret", profile_max_seconds=5)
+    with patch('app.api.debug.get_settings', return_value=settings):
+        yield settings
+
+
+def spin_until_profiled(stop: threading.Event) -> None:
+    """Burn CPU in a recognisable frame until told to stop."""
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    """Run a named CPU-bound thread for the duration of the test."""
+    stop = threading.Event()
+    thread = threading.Thread(target=spin_until_profiled, args=(stop,), name="busy-worker")
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+class TestDebugAccess:
+    """Test the debug endpoints are protected."""
+
+    def test_hidden_without_configured_token(self, client):
+        """Test the endpoint does not exist unless a token is configured."""
+        response = client.get("/debug/profile?seconds=0.1", headers=TOKEN)
+        assert response.status_code == 404
+
+    def test_wrong_token_rejected(self, client, debug_settings):
+        """Test a missing or wrong token is refused."""
+        assert client.get("/debug/profile?seconds=0.1").status_code == 403
+        response = client.get("/debug/profile?seconds=0.1", headers={"X-Debug-Token": "nope"})
+        assert response.status_code == 403
+
+    def test_duration_capped(self, client, debug_settings):
+        """Test windows longer than the configured maximum are refused."""
+        response = client.get("/debug/profile?seconds=60", headers=TOKEN)
+        assert response.status_code == 400
+
+    def test_interval_floor(self, client, debug_settings):
+        """Test sampling intervals below a millisecond are refused."""
+        response = client.get("/debug/profile?seconds=0.1&interval_ms=0.001", headers=TOKEN)
+        assert response.status_code == 422
+
+
+class TestProfile:
+    """Test profile output."""
+
+    def test_collapsed_stacks_cover_other_threads(self, client, debug_settings, busy_thread):
+        """Test stacks of threads other than the event loop are sampled."""
+        response = client.get("/debug/profile?seconds=0.3&interval_ms=5", headers=TOKEN)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert int(response.headers["X-Profile-Samples"]) > 10
+        lines = response.text.splitlines()
+        busy = [line for line in lines if line.startswith("busy-worker;")]
+        assert busy
+        assert "spin_until_profiled (test_debug.py:" in busy[0]
+        stack, count = busy[0].rsplit(" ", 1)
+        assert int(count) > 0
+        assert not any("sampling-profiler" in line for line in lines)
+
+    def test_allocation_diff(self, client, debug_settings):
+        """Test allocations are reported and tracemalloc is stopped afterwards."""
+        response = client.get("/debug/profile?seconds=0.1&allocations=true", headers=TOKEN)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["samples"] > 0
+        assert isinstance(data["stacks"], str)
+        assert isinstance(data["allocations"], list)
+        for entry in data["allocations"]:
+            assert set(entry) == {"location", "size_diff_bytes", "count_diff", "size_bytes"}
+        assert not tracemalloc.is_tracing()
+
+    def test_one_profile_at_a_time(self, client, debug_settings):
+        """Test a second concurrent profile is refused."""
+        running = Profile(interval=0.01)
+        running.start()
+        try:
+            response = client.get("/debug/profile?seconds=0.1", headers=TOKEN)
+        finally:
+            running.stop()
+
+        assert response.status_code == 409
+
+
+def profile_can_start() -> bool:
+    """Whether a new profile starts, i.e. no earlier one leaked the busy lock."""
+    run = Profile(interval=0.01)
+    try:
+        run.start()
+    except profiler.ProfilerBusy:
+        return False
+    run.stop()
+    return True
+
+
+class TestProfileLifecycle:
+    """Test that failed or cancelled profiles never stay busy."""
+
+    def test_failed_start_releases(self):
+        """Test an error while starting leaves no profile running."""
+        with patch.object(AllocationTracker, "start", side_effect=RuntimeError("boom")):
+            with pytest.raises(RuntimeError):
+                Profile(interval=0.01, allocations=True).start()
+
+        assert profile_can_start()
+
+    def test_cancelled_start_releases(self):
+        """Test cancelling astart mid-snapshot undoes the profile once the snapshot ends."""
+        def slow_start(tracker):
+            time.sleep(0.1)
+            tracker._started = False
+
+        async def scenario():
+            run = Profile(interval=0.01, allocations=True)
+            task = asyncio.create_task(run.astart())
+            await asyncio.sleep(0.02)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # Wait for the queued undo
+            await asyncio.get_running_loop().run_in_executor(profiler._executor, lambda: None)
+
+        with patch.object(AllocationTracker, "start", slow_start):
+            asyncio.run(scenario())
+
+        assert profile_can_start()
+
+    def test_cancelled_stop_completes(self):
+        """Test cancelling astop still stops the profile."""
+        async def scenario():
+            run = Profile(interval=0.01, allocations=True)
+            await run.astart()
+            task = asyncio.create_task(run.astop())
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            await asyncio.get_running_loop().run_in_executor(profiler._executor, lambda: None)
+
+        asyncio.run(scenario())
+
+        assert profile_can_start()
+        assert not tracemalloc.is_tracing()
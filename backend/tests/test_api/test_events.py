@@ -0,0 +1,205 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from app import events
+from app.api import events as events_api
+from app.config import get_settings
+from app.schemas import FriendCreate, InteractionCreate
+from app.services import friend_service, interaction_service
+
+
+@pytest.fixture
+def limits():
+    """Settings the test may change, restored afterwards."""
+    settings = get_settings()
+    saved = (settings.events_max_connections, settings.events_max_per_device, settings.events_queue_size)
+    yield settings
+    settings.events_max_connections, settings.events_max_per_device, settings.events_queue_size = saved
+
+
+async def take(body, count):
+    """The next ``count`` chunks of a stream."""
+    return [await body.__anext__() for _ in range(count)]
+
+
+class TestEventBus:
+    """Test fan-out, backpressure and caps."""
+
+    def test_fan_out_to_device_streams(self):
+        """Test events reach every stream of their device and no other."""
+        async def scenario():
+            first = events.bus.subscribe("device-1")
+            second = events.bus.subscribe("device-1")
+            other = events.bus.subscribe("device-2")
+            events.publish("device-1", "friend.created", {"friend_id": 1})
+            received = [first.queue.get_nowait(), second.queue.get_nowait()]
+            assert other.queue.empty()
+            for subscription in (first, second, other):
+                events.bus.unsubscribe(subscription)
+            return received
+
+        received = asyncio.run(scenario())
+
+        assert [event["data"] for event in received] == [{"friend_id": 1}] * 2
+        assert len(events.bus) == 0
+
+    def test_publish_from_thread(self):
+        """Test events published from a worker thread are delivered on the loop."""
+        async def scenario():
+            subscription = events.bus.subscribe("device-1")
+            thread = threading.Thread(target=events.publish, args=("device-1", "friend.updated", {"friend_id": 3}))
+            thread.start()
+            thread.join()
+            try:
+                return await asyncio.wait_for(subscription.queue.get(), 1)
+            finally:
+                events.bus.unsubscribe(subscription)
+
+        assert asyncio.run(scenario())["type"] == "friend.updated"
+
+    def test_slow_stream_resyncs(self, limits):
+        """Test a full queue drops events and tells the client to resync, then carries on."""
+        limits.events_queue_size = 2
+
+        async def scenario():
+            body = events.stream("device-1", heartbeat_seconds=5)
+            chunks = await take(body, 1)
+            for i in range(5):
+                events.publish("device-1", "friend.updated", {"friend_id": i})
+            chunks += await take(body, 1)
+            events.publish("device-1", "friend.deleted", {"friend_id": 9})
+            chunks += await take(body, 1)
+            await body.aclose()
+            return chunks
+
+        retry, resync, after = asyncio.run(scenario())
+
+        assert retry == b"retry: 3000\n\n"
+        assert resync == b"event: resync\ndata: {}\n\n"
+        assert b"event: friend.deleted" in after and b'"friend_id": 9' in after
+        assert len(events.bus) == 0
+
+    def test_heartbeat_and_close(self):
+        """Test idle streams send keep-alives and end when the bus is closed."""
+        async def scenario():
+            body = events.stream("device-1", heartbeat_seconds=0.01)
+            chunks = await take(body, 2)
+            events.bus.close()
+            chunks += [chunk async for chunk in body]
+            return chunks
+
+        chunks = asyncio.run(scenario())
+
+        assert chunks[1] == b": keep-alive\n\n"
+        assert all(chunk.startswith((b"retry", b":")) for chunk in chunks)
+        assert len(events.bus) == 0
+
+    def test_transition_sink(self):
+        """Test reminder transitions are published to the friend's device."""
+        async def scenario():
+            subscription = events.bus.subscribe("device-1")
+            events.TransitionSink().emit([{"friend_id": 1, "device_id": "device-1", "status": "red"}])
+            events.bus.unsubscribe(subscription)
+            return subscription.queue.get_nowait()
+
+        event = asyncio.run(scenario())
+
+        assert (event["type"], event["data"]["status"]) == ("health.transition", "red")
+
+    def test_device_cap(self, limits):
+        """Test connections beyond the per-device cap are rejected."""
+        limits.events_max_per_device = 1
+
+        async def scenario():
+            subscription = events.bus.subscribe("device-1")
+            try:
+                with pytest.raises(events.TooManyConnections):
+                    events.bus.subscribe("device-1")
+                events.bus.unsubscribe(events.bus.subscribe("device-2"))
+            finally:
+                events.bus.unsubscribe(subscription)
+
+        asyncio.run(scenario())
+
+
+    def test_stream_subscribes_when_started(self):
+        """Test a stream body that is never iterated holds no connection slot."""
+        async def scenario():
+            body = events.stream("device-1", heartbeat_seconds=5)
+            assert len(events.bus) == 0
+            await take(body, 1)
+            assert len(events.bus) == 1
+            await body.aclose()
+
+        asyncio.run(scenario())
+
+        assert len(events.bus) == 0
+
+    def test_stream_losing_race_backs_off(self, limits):
+        """Test a stream that finds the cap reached once started tells the client to back off."""
+        limits.events_max_per_device = 0
+
+        async def scenario():
+            return [chunk async for chunk in events.stream("device-1", heartbeat_seconds=5)]
+
+        chunks = asyncio.run(scenario())
+
+        assert chunks[0] == b"retry: 30000\n\n"
+        assert chunks[1].startswith(b"event: error\ndata: ")
+        assert json.loads(chunks[1].split(b"data: ", 1)[1])["scope"] == "device"
+        assert len(events.bus) == 0
+
+
+class TestEventStreamEndpoint:
+    """Test the /events endpoint."""
+
+    def test_requires_device(self, client):
+        """Test a device ID is required."""
+        assert client.get("/api/v1/events").status_code == 400
+
+    def test_connection_caps(self, client, limits):
+        """Test the caps answer 429 per device and 503 per server."""
+        limits.events_max_per_device = 0
+        response = client.get("/api/v1/events?device_id=device-1")
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "30"
+
+        limits.events_max_connections = 0
+        assert client.get("/api/v1/events?device_id=device-1").status_code == 503
+
+    def test_unsent_response_does_not_leak(self):
+        """Test a response dropped before its body starts leaves no subscription behind."""
+        response = asyncio.run(events_api.stream_events("device-1"))
+
+        del response
+        assert len(events.bus) == 0
+
+    def test_streams_writes(self, client, db):
+        """Test friend and interaction writes arrive on the device's stream."""
+        friend = friend_service.create_friend(db, "device-1", FriendCreate(name="Alice"))
+
+        def write_then_close():
+            deadline = time.monotonic() + 5
+            while not len(events.bus) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            interaction_service.create_interaction(db, friend.id, InteractionCreate(summary="Coffee"))
+            friend_service.create_friend(db, "device-2", FriendCreate(name="Not mine"))
+            friend_service.delete_friend(db, friend)
+            events.bus._loop.call_soon_threadsafe(events.bus.close)
+
+        writer = threading.Thread(target=write_then_close)
+        writer.start()
+        response = client.get("/api/v1/events?device_id=device-1", headers={"Accept-Encoding": "gzip"})
+        writer.join()
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "content-encoding" not in response.headers
+        body = response.text
+        assert body.index("event: interaction.created") < body.index("event: friend.deleted")
+        assert f'"friend_id": {friend.id}' in body
+        assert "friend.created" not in body
+        assert len(events.bus) == 0
@@ -0,0 +1,98 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.config import Settings
+from tests.test_api.test_query_budgets import count_queries
+
+
+@pytest.fixture
+def fast_mode():
+    """Switch the fast response path on or off during the test."""
+    settings = Settings()
+
+    def switch(enabled: bool):
+        settings.fast_responses = enabled
+
+    with patch('app.responses.get_settings', return_value=settings):
+        yield switch
+
+
+@pytest.fixture
+def friends(client, headers):
+    """Create friends across health states, with notes and interactions."""
+    ids = []
+    for name, frequency in (("Alice", "weekly"), ("Bob", "monthly"), ("Carol", "quarterly")):
+        response = client.post(
+            "/api/v1/friends",
+            json={"name": name, "contact_frequency": frequency, "notes": f"Notes about {name}"},
+            headers=headers
+        )
+        ids.append(response.json()["id"])
+    client.post(
+        f"/api/v1/friends/{ids[0]}/interactions",
+        json={"summary": "Coffee", "next_topics": ["trip", "job"]},
+        headers=headers
+    )
+    return ids
+
+
+def get_both(client, fast_mode, path, headers):
+    """GET a path with the fast path off and on."""
+    fast_mode(False)
+    default = client.get(path, headers=headers)
+    fast_mode(True)
+    fast = client.get(path, headers=headers)
+    return default, fast
+
+
+class TestFastResponses:
+    """Test the fast path returns the same JSON as the default path."""
+
+    @pytest.mark.parametrize("path", [
+        "/api/v1/friends",
+        "/api/v1/friends/dashboard",
+        "/api/v1/friends?fields=name,notes",
+        "/api/v1/friends/dashboard?fields=nickname,last_interaction"
+    ])
+    def test_lists_match(self, client, headers, friends, fast_mode, path):
+        """Test list endpoints encode identically."""
+        default, fast = get_both(client, fast_mode, path, headers)
+
+        assert fast.status_code == default.status_code == 200
+        assert fast.headers["content-type"] == "application/json"
+        assert fast.content == default.content
+
+    def test_detail_matches(self, client, headers, friends, fast_mode):
+        """Test the detail endpoint, including interactions, encodes identically."""
+        default, fast = get_both(client, fast_mode, f"/api/v1/friends/{friends[0]}", headers)
+
+        assert fast.status_code == 200
+        assert fast.json() == default.json()
+        assert fast.json()["interactions"][0]["next_topics"] == ["trip", "job"]
+
+    def test_writes_keep_status_codes(self, client, headers, friends, fast_mode):
+        """Test create, update and log endpoints keep their status codes and shapes."""
+        fast_mode(True)
+
+        created = client.post("/api/v1/friends", json={"name": "Dan"}, headers=headers)
+        updated = client.patch(f"/api/v1/friends/{friends[1]}", json={"nickname": "Bobby"}, headers=headers)
+        logged = client.post(f"/api/v1/friends/{friends[1]}/interactions", json={"summary": "Call"}, headers=headers)
+
+        assert created.status_code == 201
+        assert created.json()["health_status"] == "red"
+        assert updated.status_code == 200
+        assert updated.json()["nickname"] == "Bobby"
+        assert logged.status_code == 201
+        assert logged.json()["summary"] == "Call"
+
+    @pytest.mark.parametrize("path", ["/api/v1/friends", "/api/v1/friends/dashboard"])
+    def test_lists_are_one_query(self, client, headers, friends, fast_mode, path):
+        """Test the row-tuple list path keeps the single-query budget."""
+        fast_mode(True)
+
+        with count_queries() as statements:
+            response = client.get(path, headers=headers)
+
+        assert response.status_code == 200
+        assert len(statements) == 1
@@ -0,0 +1,74 @@
+import pytest
+
+from app.services.friend_service import FRIEND_FIELDS
+from tests.test_api.test_query_budgets import count_queries
+
+
+@pytest.fixture
+def friend_id(client, headers):
+    """Create a friend with notes and one interaction."""
+    friend_id = client.post(
+        "/api/v1/friends",
+        json={"name": "Alice", "nickname": "Al", "notes": "Long notes " * 50},
+        headers=headers
+    ).json()["id"]
+    client.post(f"/api/v1/friends/{friend_id}/interactions", json={"summary": "Coffee"}, headers=headers)
+    return friend_id
+
+
+class TestSparseFieldsets:
+    """Test the fields= parameter on list views."""
+
+    def test_default_list_returns_every_field(self, client, headers, friend_id):
+        """Test the list keeps returning full friends, notes included, without fields=."""
+        response = client.get("/api/v1/friends", headers=headers)
+
+        assert response.status_code == 200
+        assert tuple(response.json()[0]) == FRIEND_FIELDS
+        assert response.json()[0]["notes"].startswith("Long notes")
+
+    def test_requested_fields_only(self, client, headers, friend_id):
+        """Test only the requested fields, plus the ID, are returned."""
+        response = client.get("/api/v1/friends?fields=name,health_status", headers=headers)
+
+        assert response.json() == [{"id": friend_id, "name": "Alice", "health_status": "green"}]
+
+    def test_notes_on_request(self, client, headers, friend_id):
+        """Test notes are returned when asked for."""
+        response = client.get("/api/v1/friends?fields=notes", headers=headers)
+
+        assert response.json()[0]["notes"].startswith("Long notes")
+
+    def test_plain_columns_skip_interactions(self, client, headers, friend_id):
+        """Test the latest-contact subquery only runs for derived fields."""
+        with count_queries() as statements:
+            client.get("/api/v1/friends?fields=name,nickname", headers=headers)
+
+        assert len(statements) == 1
+        assert "interactions" not in statements[0]
+        assert "notes" not in statements[0]
+
+    def test_unknown_field_rejected(self, client, headers, friend_id):
+        """Test unknown field names are a client error."""
+        response = client.get("/api/v1/friends?fields=name,password", headers=headers)
+
+        assert response.status_code == 400
+        assert "password" in response.json()["detail"]
+
+    def test_dashboard_fields(self, client, headers):
+        """Test dashboard entries hold the requested fields and their health status."""
+        client.post("/api/v1/friends", json={"name": "Bob", "notes": "Secret"}, headers=headers)
+
+        response = client.get("/api/v1/friends/dashboard?fields=name", headers=headers)
+
+        data = response.json()
+        assert data["total_friends"] == 1
+        assert set(data["need_contact_today"][0]) == {"id", "name", "health_status"}
+
+    def test_dashboard_default_returns_every_field(self, client, headers):
+        """Test dashboard entries keep every field, notes included, without fields=."""
+        client.post("/api/v1/friends", json={"name": "Bob", "notes": "Secret"}, headers=headers)
+
+        response = client.get("/api/v1/friends/dashboard", headers=headers)
+
+        assert response.json()["need_contact_today"][0]["notes"] == "Secret"
@@ -24,3 +24,101 @@ def test_metrics(client):
     response = client.get("/metrics")
     assert response.status_code == 200
     assert b"http_requests_total" in response.content
+
+
+def test_metrics_use_route_templates(client, headers):
+    """Test request metrics are labelled by route template, not raw path."""
+    from prometheus_client import REGISTRY
+    
+    client.get("/api/v1/friends/12345", headers=headers)
+    client.get("/no/such/path/67890")
+    
+    labels = {"tool": "friend-keeper", "method": "GET", "status": "404"}
+    assert REGISTRY.get_sample_value(
+        "http_requests_total", {**labels, "endpoint": "/api/v1/friends/{friend_id}"}
+    ) >= 1
+    assert REGISTRY.get_sample_value("http_requests_total", {**labels, "endpoint": "unmatched"}) >= 1
+    assert REGISTRY.get_sample_value(
+        "http_requests_total", {**labels, "endpoint": "/api/v1/friends/12345"}
+    ) is None
+
+
+def test_crawler_detection(client):
+    """Test crawler visits are counted by canonical bot name."""
+    from prometheus_client import REGISTRY
+    from app.middleware import detect_bot
+    
+    labels = {"tool": "friend-keeper", "bot": "Googlebot"}
+    before = REGISTRY.get_sample_value("crawler_visits_total", labels) or 0
+    client.get("/health", headers={"User-Agent": "Mozilla/5.0 (compatible; GOOGLEBOT/2.1)"})
+    
+    assert REGISTRY.get_sample_value("crawler_visits_total", labels) == before + 1
+    assert detect_bot("Mozilla/5.0 (Windows NT 10.0) Firefox/120.0") is None
+
+
+def test_metrics_merge_across_processes(tmp_path):
+    """Test /metrics sums counters from every worker and drops exited workers' live gauges."""
+    import os
+    import subprocess
+    import sys
+    
+    backend = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    
+    def run(script):
+        return subprocess.run(
+            [sys.executable, "-c", script], env=env, cwd=backend, check=True, capture_output=True, text=True
+        ).stdout
+    
+    worker = (
+        "from app.metrics import friends_created, llm_in_flight, mark_process_dead\n"
+        "friends_created.labels(tool='friend-keeper').inc()\n"
+        "llm_in_flight.labels(tool='friend-keeper').inc()\n"
+    )
+    run(worker)
+    run(worker + "mark_process_dead()\n")
+    output = run("from app.metrics import metrics\nprint(metrics().body.decode())")
+    
+    assert 'friends_created_total{tool="friend-keeper"} 2.0' in output
+    # Only the worker that did not clean up still counts
+    assert 'llm_in_flight{tool="friend-keeper"} 1.0' in output
+
+
+def test_server_timing_breakdown(client, headers):
+    """Test the Server-Timing header reports DB queries and phases per request."""
+    from unittest.mock import patch
+    from app.config import Settings
+    
+    for name in ("A", "B", "C"):
+        client.post("/api/v1/friends", json={"name": name}, headers=headers)
+    
+    with patch("app.middleware.get_settings", return_value=Settings(server_timing_enabled=True)):
+        friends = client.get("/api/v1/friends", headers=headers)
+        starters = client.post(
+            "/api/v1/talk-starters",
+            json={"friend_id": friends.json()[0]["id"], "language": "en"},
+            headers=headers
+        )
+    
+    timing = friends.headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    assert "serialize;dur=" in timing
+    assert "total;dur=" in timing
+    assert "tokens;dur=" in starters.headers["server-timing"]
+
+
+def test_db_queries_histogram(client, headers):
+    """Test per-request query counts are exported by route."""
+    from prometheus_client import REGISTRY
+    
+    labels = {"tool": "friend-keeper", "endpoint": "/health", "method": "GET"}
+    before = REGISTRY.get_sample_value("http_request_db_queries_count", labels) or 0
+    client.get("/health")
+    
+    assert REGISTRY.get_sample_value("http_request_db_queries_count", labels) == before + 1
+    
+    create_labels = {"tool": "friend-keeper", "endpoint": "/api/v1/friends", "method": "POST"}
+    before_sum = REGISTRY.get_sample_value("http_request_db_queries_sum", create_labels) or 0
+    client.post("/api/v1/friends", json={"name": "Test"}, headers=headers)
+    
+    assert REGISTRY.get_sample_value("http_request_db_queries_sum", create_labels) > before_sum
@@ -1,4 +1,13 @@
 import pytest
+import hmac
+import hashlib
+import json
+from unittest.mock import patch
+
+import httpx
+
+from app.config import Settings
+from app.models import WebhookEvent
 
 
 class TestTokens:
@@ -34,6 +43,40 @@ class TestCheckout:
         )
         assert response.status_code == 400
         assert "Invalid product" in response.json()["detail"]
+    
+    def test_checkout_creates_pending_transaction(self, client, db, headers):
+        """Test checkout goes through the shared client and records the transaction."""
+        from app.main import app
+        from app.models import PaymentTransaction
+        from app.services.creem_client import CreemClient, build_catalog
+        from app.testing import FakeCreemServer
+        
+        server = FakeCreemServer()
+        server.statuses = [502]
+        app.state.creem_client = CreemClient(
+            api_key="test-key",
+            base_url="http://creem.test",
+            catalog=build_catalog('{"starter": "prod_s", "popular": "prod_p", "pro": "prod_x"}', require_ids=True),
+            retry_base_seconds=0.0,
+            transport=httpx.ASGITransport(app=server)
+        )
+        
+        response = client.post(
+            "/api/v1/checkout",
+            json={
+                "product_sku": "popular",
+                "success_url": "https://example.com/success",
+                "device_id": "test-device"
+            },
+            headers=headers
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["checkout_url"].endswith(response.json()["checkout_id"])
+        assert len(server.created) == 1
+        transaction = db.query(PaymentTransaction).one()
+        assert transaction.tokens_granted == 30
+        assert transaction.status == "pending"
 
 
 class TestErrorResponses:
@@ -124,3 +167,50 @@ class TestWebhook:
         )
         assert response.status_code == 200
         assert response.json()["status"] == "missing metadata"
+
+    def test_webhook_queues_event(self, client, db):
+        """Test a completed checkout is stored in the inbox, not applied inline."""
+        response = client.post(
+            "/api/v1/webhook/creem",
+            json={
+                "id": "evt_1",
+                "event_type": "checkout.completed",
+                "object": {"id": "chk_1", "metadata": {"device_id": "d", "product_sku": "starter"}}
+            }
+        )
+        assert response.status_code == 200
+        assert response.json()["status"] == "ok"
+        
+        event = db.query(WebhookEvent).filter(WebhookEvent.event_id == "evt_1").one()
+        assert event.status == "pending"
+        assert event.event_type == "checkout.completed"
+    
+    def test_webhook_duplicate_delivery(self, client, db):
+        """Test redelivering the same event is acknowledged but stored once."""
+        event = {
+            "id": "evt_dup",
+            "event_type": "checkout.completed",
+            "object": {"id": "chk_1", "metadata": {"device_id": "d", "product_sku": "starter"}}
+        }
+        first = client.post("/api/v1/webhook/creem", json=event)
+        second = client.post("/api/v1/webhook/creem", json=event)
+        
+        assert first.json()["status"] == "ok"
+        assert second.status_code == 200
+        assert second.json()["status"] == "duplicate"
+        assert db.query(WebhookEvent).count() == 1
+    
+    def test_webhook_signature_required(self, client):
+        """Test a configured secret rejects missing or wrong signatures."""
+        body = json.dumps({"id": "evt_sig", "event_type": "checkout.completed", "object": {}}).encode()
+        signature = hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+        settings = Settings(creem_webhook_secret="secret")
+        
+        with patch("app.api.payment.get_settings", return_value=settings):
+            missing = client.post("/api/v1/webhook/creem", content=body)
+            wrong = client.post("/api/v1/webhook/creem", content=body, headers={"creem-signature": "0" * 64})
+            valid = client.post("/api/v1/webhook/creem", content=body, headers={"creem-signature": signature})
+        
+        assert missing.status_code == 401
+        assert wrong.status_code == 401
+        assert valid.status_code == 200
@@ -0,0 +1,141 @@
+import pytest
+import uuid
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from fastapi import Depends
+from sqlalchemy import event, text
+
+from app.config import Settings
+from app.query_monitor import (
+    RepeatedQueryError,
+    check_request,
+    normalize_sql,
+    slow_query_log
+)
+from tests.conftest import engine
+
+# Most queries a request to each tracked endpoint may run, independent of
+# how many friends the device has
+QUERY_BUDGETS = {
+    ("GET", "/api/v1/friends"): 1,
+    ("GET", "/api/v1/friends/dashboard"): 1,
+    ("GET", "/api/v1/friends/{friend_id}"): 2,
+    ("POST", "/api/v1/friends"): 3,
+    ("PATCH", "/api/v1/friends/{friend_id}"): 4,
+}
+
+
+@contextmanager
+def count_queries():
+    """Collect the statements run inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def seed(client, headers, count):
+    """Create friends with a couple of interactions each; returns the first ID."""
+    ids = []
+    for i in range(count):
+        friend_id = client.post("/api/v1/friends", json={"name": f"Friend {i}"}, headers=headers).json()["id"]
+        for summary in ("Coffee", "Call"):
+            client.post(f"/api/v1/friends/{friend_id}/interactions", json={"summary": summary}, headers=headers)
+        ids.append(friend_id)
+    return ids[0]
+
+
+def call(client, headers, method, route, friend_id):
+    """Send one request to a tracked endpoint."""
+    path = route.replace("{friend_id}", str(friend_id))
+    if method == "POST":
+        return client.post(path, json={"name": "New"}, headers=headers)
+    if method == "PATCH":
+        return client.patch(path, json={"notes": f"Updated {uuid.uuid4()}"}, headers=headers)
+    return client.get(path, headers=headers)
+
+
+class TestQueryBudgets:
+    """Test tracked endpoints stay within their query budgets."""
+
+    @pytest.mark.parametrize("method,route", sorted(QUERY_BUDGETS))
+    def test_within_budget_regardless_of_size(self, client, headers, method, route):
+        """Test the query count is within budget and does not grow with the friend list."""
+        friend_id = seed(client, headers, 1)
+        with count_queries() as small:
+            assert call(client, headers, method, route, friend_id).status_code < 300
+
+        seed(client, headers, 15)
+        with count_queries() as large:
+            assert call(client, headers, method, route, friend_id).status_code < 300
+
+        assert len(large) <= QUERY_BUDGETS[(method, route)], large
+        assert len(large) == len(small)
+
+
+class TestQueryMonitor:
+    """Test statement shapes, the repeat detector and the slow-query log."""
+
+    def test_normalize_sql(self):
+        """Test literals and placeholder lists collapse into one shape."""
+        assert normalize_sql("SELECT * FROM t WHERE id = 3 AND name = 'x'") == \
+            normalize_sql("SELECT *  FROM t\n WHERE id = 7 AND name = 'it''s'")
+        assert normalize_sql("SELECT a FROM t WHERE id IN (?, ?, ?)") == \
+            normalize_sql("SELECT a FROM t WHERE id IN (?, ?)")
+        assert "anon_1" in normalize_sql("SELECT anon_1.x FROM anon_1")
+
+    def test_repeats_raise_over_threshold(self):
+        """Test a shape repeated past the threshold fails the request in raise mode."""
+        settings = Settings(query_detector_mode="raise", query_repeat_threshold=3)
+        with patch("app.query_monitor.get_settings", return_value=settings):
+            check_request({"SELECT ?": 3}, "/ok")
+            with pytest.raises(RepeatedQueryError):
+                check_request({"SELECT ?": 4}, "/n-plus-one")
+
+    def test_repeats_only_logged_in_log_mode(self, caplog):
+        """Test log mode reports without failing the request."""
+        settings = Settings(query_detector_mode="log", query_repeat_threshold=3)
+        with patch("app.query_monitor.get_settings", return_value=settings):
+            check_request({"SELECT ?": 5}, "/n-plus-one")
+
+        assert "5x SELECT ?" in caplog.text
+
+    def test_detector_catches_n_plus_one_request(self, client, headers):
+        """Test a request looping over friends trips the detector."""
+        from app.main import app
+        from app.database import get_db
+        from app.models import Friend
+        from app.services import friend_service
+
+        seed(client, headers, 12)
+
+        @app.get("/test-only/n-plus-one")
+        def n_plus_one(db=Depends(get_db)):
+            return [friend_service.get_friend_response(db, friend).id for friend in db.query(Friend).all()]
+
+        try:
+            with pytest.raises(RepeatedQueryError):
+                client.get("/test-only/n-plus-one")
+        finally:
+            app.router.routes.pop()
+
+    def test_slow_query_logged_with_plan(self, db, caplog):
+        """Test slow statements are aggregated by shape with their query plan."""
+        slow_query_log.clear()
+        settings = Settings(slow_query_ms=0.000001)
+        with patch("app.query_monitor.get_settings", return_value=settings):
+            db.execute(text("SELECT id FROM friends WHERE device_id = 'a'")).all()
+            db.execute(text("SELECT id FROM friends WHERE device_id = 'b'")).all()
+
+        entries = [e for e in slow_query_log.report() if "FROM friends" in e["shape"]]
+        assert len(entries) == 1
+        assert entries[0]["count"] == 2
+        assert "ix_friends_device_id" in entries[0]["plan"]
+        assert "Slow query" in caplog.text
@@ -0,0 +1,54 @@
+import pytest
+
+from app.config import get_settings
+
+
+@pytest.fixture
+def friends(client, headers):
+    """Create friends, some with notes and interactions."""
+    for i in range(7):
+        friend_id = client.post(
+            "/api/v1/friends",
+            json={"name": f"Friend {i}", "notes": "Ünïcode notes" if i % 2 else None},
+            headers=headers
+        ).json()["id"]
+        if i % 3 == 0:
+            client.post(f"/api/v1/friends/{friend_id}/interactions", json={"summary": "Call"}, headers=headers)
+
+
+class TestStreamedList:
+    """Test the streamed friend list."""
+
+    @pytest.mark.parametrize("query", ["", "&fields=name,notes,health_status"])
+    def test_matches_buffered_list(self, client, headers, friends, query):
+        """Test the streamed body is byte-identical to the buffered response."""
+        buffered = client.get(f"/api/v1/friends?stream=false{query}", headers=headers)
+        streamed = client.get(f"/api/v1/friends?stream=true{query}", headers=headers)
+
+        assert streamed.status_code == 200
+        assert streamed.headers["content-type"] == "application/json"
+        assert streamed.content == buffered.content
+        assert len(streamed.json()) == 7
+
+    def test_batches_not_flagged_as_repeats(self, client, headers, monkeypatch):
+        """Test the per-batch queries of a long stream pass the N+1 detector."""
+        for i in range(15):
+            client.post("/api/v1/friends", json={"name": f"Friend {i}"}, headers=headers)
+        monkeypatch.setattr(get_settings(), "stream_batch_size", 1)
+
+        response = client.get("/api/v1/friends?stream=true", headers=headers)
+
+        assert [friend["name"] for friend in response.json()] == [f"Friend {i}" for i in range(15)]
+
+    def test_empty_device(self, client, headers):
+        """Test a device without friends streams an empty array."""
+        response = client.get("/api/v1/friends?stream=true", headers=headers)
+
+        assert response.status_code == 200
+        assert response.json() == []
+
+    def test_unknown_field_rejected_before_streaming(self, client, headers):
+        """Test invalid fields still fail with a 400 rather than a broken stream."""
+        response = client.get("/api/v1/friends?stream=true&fields=bogus", headers=headers)
+
+        assert response.status_code == 400
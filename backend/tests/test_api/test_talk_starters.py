@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import patch, AsyncMock
 
+from app.services.llm_service import FALLBACK_STARTERS
+
 
 class TestTalkStarters:
     """Test talk starter generation."""
@@ -129,3 +131,107 @@ class TestTalkStartersLanguages:
             headers=headers
         )
         assert response.status_code == 200
+
+
+class TestTalkStartersBatch:
+    """Test batched talk starter generation."""
+    
+    def _create_friends(self, client, headers, count):
+        return [
+            client.post(
+                "/api/v1/friends",
+                json={"name": f"Friend {i}"},
+                headers=headers
+            ).json()["id"]
+            for i in range(count)
+        ]
+    
+    @patch('app.services.llm_service.generate_talk_starters_batch')
+    def test_batch_success(self, mock_llm, client, headers):
+        """Test one call generates starters for every friend."""
+        friend_ids = self._create_friends(client, headers, 2)
+        mock_llm.return_value = {
+            friend_ids[0]: ["Hi there"],
+            friend_ids[1]: ["Long time no see"]
+        }
+        
+        response = client.post(
+            "/api/v1/talk-starters/batch",
+            json={"friend_ids": friend_ids, "language": "en"},
+            headers=headers
+        )
+        
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["friend_id"] for r in results] == friend_ids
+        assert results[1]["starters"] == ["Long time no see"]
+        assert mock_llm.call_count == 1
+        
+        # Both generations debited from the free trial
+        tokens = client.get("/api/v1/tokens", headers=headers).json()
+        assert tokens["free_trial_remaining"] == 1
+    
+    @patch('app.services.llm_service.generate_talk_starters_batch')
+    def test_batch_insufficient_tokens_debits_nothing(self, mock_llm, client, headers):
+        """Test a batch larger than the balance is rejected as a whole."""
+        friend_ids = self._create_friends(client, headers, 4)
+        
+        response = client.post(
+            "/api/v1/talk-starters/batch",
+            json={"friend_ids": friend_ids},
+            headers=headers
+        )
+        
+        assert response.status_code == 402
+        assert "error" in response.json()["detail"]
+        mock_llm.assert_not_called()
+        tokens = client.get("/api/v1/tokens", headers=headers).json()
+        assert tokens["free_trial_remaining"] == 3
+    
+    @patch('app.services.llm_service.generate_talk_starters_batch')
+    def test_batch_refunds_canned_starters(self, mock_llm, client, headers):
+        """Test friends that only got fallback starters are not charged."""
+        friend_ids = self._create_friends(client, headers, 2)
+        mock_llm.return_value = {
+            friend_ids[0]: ["Hi there"],
+            friend_ids[1]: list(FALLBACK_STARTERS)
+        }
+        
+        response = client.post(
+            "/api/v1/talk-starters/batch",
+            json={"friend_ids": friend_ids},
+            headers=headers
+        )
+        
+        assert response.status_code == 200
+        tokens = client.get("/api/v1/tokens", headers=headers).json()
+        assert tokens["free_trial_remaining"] == 2
+    
+    def test_batch_friend_not_found(self, client, headers):
+        """Test batch with a friend from another device."""
+        friend_ids = self._create_friends(client, headers, 1)
+        
+        response = client.post(
+            "/api/v1/talk-starters/batch",
+            json={"friend_ids": friend_ids + [9999]},
+            headers=headers
+        )
+        assert response.status_code == 404
+    
+    def test_batch_too_large(self, client, headers):
+        """Test batch size limit."""
+        response = client.post(
+            "/api/v1/talk-starters/batch",
+            json={"friend_ids": list(range(1, 50))},
+            headers=headers
+        )
+        assert response.status_code == 400
+    
+    def test_batch_empty(self, client, headers):
+        """Test empty batch is rejected."""
+        response = client.post(
+            "/api/v1/talk-starters/batch",
+            json={"friend_ids": []},
+            headers=headers
+        )
+        assert response.status_code == 422
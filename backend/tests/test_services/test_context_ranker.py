@@ -0,0 +1,189 @@
+import pytest
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import json
+
+from app.config import get_settings
+from app.services.context_ranker import FriendIndex, get_index, tokenize
+from app.services.interaction_service import create_interaction, get_interaction_context
+from app.services.friend_service import create_friend
+from app.schemas import FriendCreate, InteractionCreate
+
+
+def fake_interaction(id, summary, days_ago=0, topics=None):
+    """Build an interaction-like object without touching the database."""
+    return SimpleNamespace(
+        id=id,
+        friend_id=1,
+        summary=summary,
+        next_topics=json.dumps(topics) if topics else None,
+        contacted_at=datetime.utcnow() - timedelta(days=days_ago)
+    )
+
+
+class TestTokenize:
+    """Test term extraction."""
+    
+    def test_lowercases_and_drops_stopwords(self):
+        """Test terms are lowercased and stopwords dropped."""
+        assert tokenize("The Marathon and THE job") == ["marathon", "job"]
+    
+    def test_cjk_characters(self):
+        """Test CJK text yields one term per character."""
+        assert tokenize("马拉松") == ["马", "拉", "松"]
+
+
+class TestFriendIndex:
+    """Test ranking and selection."""
+    
+    def test_topic_carrier_beats_recency(self):
+        """Test an old interaction matching open topics outranks newer small talk."""
+        index = FriendIndex()
+        index.add(fake_interaction(1, "Training for the Berlin marathon", days_ago=200))
+        for i in range(2, 12):
+            index.add(fake_interaction(i, f"Quick chat about weather {i}", days_ago=30 - i))
+        index.add(fake_interaction(12, "Caught up briefly", days_ago=1, topics=["Berlin marathon result"]))
+        
+        selected = index.select(top_k=3, char_budget=2000)
+        text = "\n".join(line for lines in selected for line in lines)
+        
+        assert "Berlin marathon" in text
+        assert "Training for the Berlin marathon" in text
+    
+    def test_recency_without_topics(self):
+        """Test selection falls back to recency when nothing is open."""
+        index = FriendIndex()
+        for i in range(1, 6):
+            index.add(fake_interaction(i, f"Chat {i}", days_ago=10 - i))
+        
+        selected = index.select(top_k=2, char_budget=2000)
+        
+        assert selected[0][0].endswith("Chat 5")
+        assert selected[1][0].endswith("Chat 4")
+    
+    def test_char_budget(self):
+        """Test selection never exceeds the character budget."""
+        index = FriendIndex()
+        for i in range(1, 20):
+            index.add(fake_interaction(i, "x" * 150, days_ago=i))
+        
+        selected = index.select(top_k=10, char_budget=500)
+        
+        assert sum(len(line) + 1 for lines in selected for line in lines) <= 500
+        assert len(selected) >= 1
+    
+    def test_incremental_add_after_scoring(self):
+        """Test interactions added after a query are picked up."""
+        index = FriendIndex()
+        index.add(fake_interaction(1, "Chat about dogs"))
+        index.select(top_k=2, char_budget=2000)
+        index.add(fake_interaction(2, "New puppy", topics=["puppy training"]))
+        
+        assert len(index.score(["puppy"])) == 2
+        assert index.score(["puppy"])[1] > index.score(["puppy"])[0]
+    
+    def test_trim_keeps_newest(self):
+        """Test trimming ranks the kept interactions exactly like a fresh index of them."""
+        trimmed, fresh = FriendIndex(), FriendIndex()
+        for i in range(1, 11):
+            interaction = fake_interaction(i, f"Chat {i} about topic{i % 3}", days_ago=20 - i)
+            trimmed.add(interaction)
+            if i > 6:
+                fresh.add(interaction)
+        trimmed.score(["topic1"])  # Consolidate before trimming
+        
+        trimmed.trim(4)
+        
+        assert (len(trimmed), trimmed.dropped) == (4, 6)
+        assert trimmed.lines == fresh.lines
+        assert list(trimmed.score(["topic1", "chat"])) == pytest.approx(list(fresh.score(["topic1", "chat"])))
+        assert set(trimmed.vocab) == set(fresh.vocab)
+    
+    def test_recency_bucketed_by_day(self):
+        """Test scores do not change within a day, so the ranked context stays stable."""
+        index = FriendIndex()
+        for i in range(1, 4):
+            index.add(fake_interaction(i, f"Chat {i}", days_ago=i))
+        day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=10)
+        
+        morning = index.score([], day + timedelta(hours=1))
+        evening = index.score([], day + timedelta(hours=23))
+        
+        assert list(morning) == list(evening)
+        assert list(index.score([], day + timedelta(days=1))) != list(morning)
+    
+    def test_scoring_fast_at_10k_interactions(self):
+        """Test a warm 10k-interaction index ranks in a few milliseconds."""
+        index = FriendIndex()
+        words = ["work", "trip", "family", "dinner", "movie", "project", "garden", "concert"]
+        for i in range(1, 10001):
+            summary = " ".join(words[(i * k) % len(words)] + str(i % 97) for k in range(1, 12))
+            index.add(fake_interaction(i, summary, days_ago=(10000 - i) / 10, topics=["trip plans"] if i % 50 == 0 else None))
+        index.select(top_k=4, char_budget=1200)  # Warm up
+        
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            index.select(top_k=4, char_budget=1200)
+            timings.append(time.perf_counter() - start)
+        
+        # Target is < 5 ms; allow headroom for slow CI machines
+        assert sorted(timings)[2] < 0.025
+
+
+class TestIndexCache:
+    """Test the per-friend index cache against the database."""
+    
+    def test_index_follows_inserts(self, db):
+        """Test create_interaction keeps a warm index current."""
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        create_interaction(db, friend.id, InteractionCreate(summary="First"))
+        index = get_index(db, friend.id)
+        
+        create_interaction(db, friend.id, InteractionCreate(summary="Second"))
+        
+        assert len(index) == 2
+    
+    def test_index_bounded_per_friend(self, db, monkeypatch):
+        """Test a long history only keeps a window of the newest interactions indexed."""
+        monkeypatch.setattr(get_settings(), "context_index_max_interactions", 4)
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        for i in range(8):
+            create_interaction(db, friend.id, InteractionCreate(summary=f"Chat {i}"))
+        
+        index = get_index(db, friend.id)
+        assert (len(index), index.dropped) == (4, 4)
+        assert index.lines[-1][0].endswith("Chat 7")
+        
+        for i in range(8, 14):
+            create_interaction(db, friend.id, InteractionCreate(summary=f"Chat {i}"))
+        
+        assert get_index(db, friend.id) is index
+        assert len(index) <= 5
+        assert len(index) + index.dropped == 14
+        assert index.lines[-1][0].endswith("Chat 13")
+    
+    def test_context_includes_topic_carrier(self, db):
+        """Test the prompt context surfaces the interaction behind open topics."""
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        create_interaction(db, friend.id, InteractionCreate(summary="She is applying to grad school in Lisbon"))
+        for i in range(8):
+            create_interaction(db, friend.id, InteractionCreate(summary=f"Small talk {i}"))
+        create_interaction(db, friend.id, InteractionCreate(summary="Short call", next_topics=["Lisbon grad school"]))
+        
+        context = get_interaction_context(db, friend.id)
+        
+        assert "applying to grad school in Lisbon" in context.split("Earlier interactions:")[0]
+    
+    def test_selected_interactions_left_out_of_summary(self, db):
+        """Test an old interaction ranked in verbatim is not repeated in the summary."""
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        create_interaction(db, friend.id, InteractionCreate(summary="She is applying to grad school in Lisbon"))
+        for i in range(3):
+            create_interaction(db, friend.id, InteractionCreate(summary=f"Small talk {i}"))
+        create_interaction(db, friend.id, InteractionCreate(summary="Short call", next_topics=["Lisbon grad school"]))
+        
+        context = get_interaction_context(db, friend.id)
+        
+        assert context.count("applying to grad school in Lisbon") == 1
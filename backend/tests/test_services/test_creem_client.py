@@ -0,0 +1,106 @@
+import pytest
+from unittest.mock import patch
+
+import httpx
+
+from app.config import Settings
+from app.services.creem_client import (
+    CatalogError,
+    CreemClient,
+    PRODUCTS,
+    build_catalog,
+    build_client
+)
+from app.testing import FakeCreemServer
+
+PRODUCT_IDS = '{"starter": "prod_s", "popular": "prod_p", "pro": "prod_x"}'
+
+
+def make_client(server, **kwargs):
+    """Client routed to a Creem stand-in, with no real back-off."""
+    return CreemClient(
+        api_key="test-key",
+        base_url="http://creem.test",
+        catalog=build_catalog(PRODUCT_IDS, require_ids=True),
+        retry_base_seconds=0.0,
+        transport=httpx.ASGITransport(app=server),
+        **kwargs
+    )
+
+
+class TestCatalog:
+    """Test product catalog validation."""
+
+    def test_merges_products_and_ids(self):
+        """Test each SKU carries tokens, price and its Creem ID."""
+        catalog = build_catalog(PRODUCT_IDS, require_ids=True)
+
+        assert set(catalog) == set(PRODUCTS)
+        assert catalog["pro"].tokens == 100
+        assert catalog["pro"].creem_product_id == "prod_x"
+
+    def test_ids_optional_without_payments(self):
+        """Test an unconfigured install still has a catalog."""
+        catalog = build_catalog("{}", require_ids=False)
+
+        assert catalog["starter"].creem_product_id is None
+
+    @pytest.mark.parametrize("product_ids", [
+        "not json",
+        "[]",
+        '{"starter": "prod_s", "popular": "prod_p", "pro": "prod_x", "mega": "prod_m"}',
+        '{"starter": "", "popular": "prod_p", "pro": "prod_x"}',
+        '{"starter": "prod_s"}'
+    ])
+    def test_invalid_config_rejected(self, product_ids):
+        """Test bad JSON, unknown SKUs, empty and missing IDs are rejected."""
+        with pytest.raises(CatalogError):
+            build_catalog(product_ids, require_ids=True)
+
+    def test_build_client_fails_on_misconfiguration(self):
+        """Test building the startup client raises on a bad catalog."""
+        settings = Settings(creem_api_key="key", creem_product_ids='{"starter": "prod_s"}')
+
+        with patch("app.services.creem_client.get_settings", return_value=settings):
+            with pytest.raises(CatalogError):
+                build_client()
+
+
+class TestCreemClient:
+    """Test retries and idempotency keys."""
+
+    @pytest.mark.asyncio
+    async def test_retry_reuses_idempotency_key(self):
+        """Test a retried checkout creation creates one checkout."""
+        server = FakeCreemServer()
+        server.statuses = [503]
+        client = make_client(server)
+
+        data = await client.create_checkout(client.catalog["starter"], "https://x.test", {}, "key-1")
+
+        assert server.calls == 2
+        assert len(server.created) == 1
+        assert data["product_id"] == "prod_s"
+        keys = {request["headers"]["idempotency-key"] for request in server.requests}
+        assert keys == {"key-1"}
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        """Test persistent failures surface after the retry budget."""
+        server = FakeCreemServer({"chk_1": "pending"})
+        server.statuses = [503, 503, 503]
+        client = make_client(server, max_retries=2)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.get_checkout("chk_1")
+        assert server.calls == 3
+
+    @pytest.mark.asyncio
+    async def test_client_errors_not_retried(self):
+        """Test a 404 fails immediately."""
+        server = FakeCreemServer()
+        client = make_client(server)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.get_checkout("chk_missing")
+        assert server.calls == 1
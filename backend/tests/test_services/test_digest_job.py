@@ -0,0 +1,172 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import ContactFrequency, DeviceDigest, Friend, Interaction
+from app.services import digest_job
+from app.services.digest_job import build_digests, load_checkpoint, run_digests
+from app.services.starter_cache_service import store_starters
+from tests.conftest import TestingSessionLocal
+
+NOW = datetime(2026, 3, 1, 3, 0)
+
+
+def add_friend(db, device_id, name, days_ago=None, frequency=ContactFrequency.WEEKLY):
+    """Store a friend last contacted ``days_ago`` days before NOW (never if None)."""
+    friend = Friend(device_id=device_id, name=name, contact_frequency=frequency)
+    db.add(friend)
+    db.commit()
+    if days_ago is not None:
+        db.add(Interaction(friend_id=friend.id, contacted_at=NOW - timedelta(days=days_ago)))
+        db.commit()
+    return friend
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    """Path of a fresh checkpoint file."""
+    return str(tmp_path / "checkpoint.json")
+
+
+@pytest.fixture
+def devices(db):
+    """Five devices, each with an overdue, a due-soon and a green friend."""
+    for i in range(5):
+        device_id = f"device-{i}"
+        add_friend(db, device_id, "Overdue", days_ago=10)
+        add_friend(db, device_id, "Soon", days_ago=7)
+        add_friend(db, device_id, "Fine", days_ago=1)
+    add_friend(db, "device-quiet", "Fine", days_ago=0)
+
+
+class TestBuildDigests:
+    """Test the per-device digest contents."""
+
+    def test_overdue_and_due_soon(self, db):
+        """Test friends are split by when they turn red, and green ones left out."""
+        add_friend(db, "device-1", "Never")
+        add_friend(db, "device-1", "Overdue", days_ago=10)
+        add_friend(db, "device-1", "Soon", days_ago=7)
+        add_friend(db, "device-1", "Monthly", days_ago=10, frequency=ContactFrequency.MONTHLY)
+
+        [digest] = build_digests(db, ["device-1"], NOW, due_soon_days=2)
+
+        assert [e["name"] for e in digest["overdue"]] == ["Never", "Overdue"]
+        assert [e["name"] for e in digest["due_soon"]] == ["Soon"]
+        assert digest["overdue"][1]["days_since_contact"] == 10
+        assert digest["digest_date"] == "2026-03-01"
+
+    def test_quiet_device_has_no_digest(self, db):
+        """Test devices without friends to contact are skipped."""
+        add_friend(db, "device-1", "Fine", days_ago=1)
+
+        assert build_digests(db, ["device-1"], NOW, due_soon_days=2) == []
+
+    def test_attaches_cached_starters(self, db):
+        """Test each friend's newest unexpired cached starters are attached, in any language."""
+        friend = add_friend(db, "device-1", "Overdue", days_ago=10)
+        other = add_friend(db, "device-1", "Soon", days_ago=7)
+        quiet = add_friend(db, "device-1", "Never")
+        store_starters(db, friend.id, "en", "context", ["How was the trip?"])
+        store_starters(db, other.id, "en", "context", ["Old"])
+        store_starters(db, other.id, "de", "context", ["Wie geht's?"])
+        store_starters(db, quiet.id, "ja", "context", ["お元気ですか？"], served=True)
+
+        [digest] = build_digests(db, ["device-1"], datetime.utcnow(), 30)
+
+        starters = {e["name"]: e["talk_starters"] for e in digest["overdue"] + digest["due_soon"]}
+        assert starters == {"Never": [], "Overdue": ["How was the trip?"], "Soon": ["Wie geht's?"]}
+
+
+class TestRunDigests:
+    """Test the chunked, resumable run."""
+
+    def test_writes_table(self, db, devices, checkpoint):
+        """Test every device with friends to contact gets one digest row."""
+        report = run_digests(TestingSessionLocal, workers=0, chunk_size=2, checkpoint_file=checkpoint, now=NOW)
+
+        assert report.as_dict()["devices"] == 6
+        assert report.digests == 5
+        assert report.chunks == 3
+        rows = db.query(DeviceDigest).order_by(DeviceDigest.device_id).all()
+        assert [row.device_id for row in rows] == [f"device-{i}" for i in range(5)]
+        assert (rows[0].overdue_count, rows[0].due_soon_count) == (1, 1)
+        assert json.loads(rows[0].payload)["overdue"][0]["name"] == "Overdue"
+
+    def test_rerun_replaces_rows(self, db, devices, checkpoint):
+        """Test a restarted run rewrites the day's digests without duplicates."""
+        run_digests(TestingSessionLocal, workers=0, checkpoint_file=checkpoint, now=NOW)
+        run_digests(TestingSessionLocal, workers=0, checkpoint_file=checkpoint, now=NOW, restart=True)
+
+        assert db.query(DeviceDigest).count() == 5
+
+    def test_resumes_from_checkpoint(self, db, devices, checkpoint):
+        """Test an interrupted run continues after the last finished chunk."""
+        calls = []
+        original = digest_job.process_chunk
+
+        def flaky(session_factory, device_ids, options):
+            calls.append(device_ids)
+            if len(calls) == 2:
+                raise RuntimeError("worker died")
+            return original(session_factory, device_ids, options)
+
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(digest_job, "process_chunk", flaky)
+            with pytest.raises(RuntimeError):
+                run_digests(TestingSessionLocal, workers=0, chunk_size=2, checkpoint_file=checkpoint, now=NOW)
+        assert load_checkpoint(checkpoint, NOW.date())["after"] == "device-1"
+
+        report = run_digests(TestingSessionLocal, workers=0, chunk_size=2, checkpoint_file=checkpoint, now=NOW)
+
+        assert report.resumed_after == "device-1"
+        assert report.devices == 4
+        assert db.query(DeviceDigest).count() == 5
+        assert load_checkpoint(checkpoint, NOW.date())["done"]
+
+        again = run_digests(TestingSessionLocal, workers=0, checkpoint_file=checkpoint, now=NOW)
+        assert again.devices == 0
+
+    def test_checkpoint_from_another_day_ignored(self, db, devices, checkpoint):
+        """Test yesterday's checkpoint does not skip today's devices."""
+        run_digests(TestingSessionLocal, workers=0, checkpoint_file=checkpoint, now=NOW - timedelta(days=1))
+
+        report = run_digests(TestingSessionLocal, workers=0, checkpoint_file=checkpoint, now=NOW)
+
+        assert report.devices == 6
+
+    def test_file_sink(self, db, devices, checkpoint, tmp_path):
+        """Test the file sink writes one JSON Lines file per chunk."""
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(digest_job.get_settings(), "digest_output_dir", str(tmp_path / "out"))
+            run_digests(TestingSessionLocal, workers=0, chunk_size=2, sink="file", checkpoint_file=checkpoint, now=NOW)
+
+        files = sorted((tmp_path / "out" / "2026-03-01").glob("*.jsonl"))
+        lines = [json.loads(line) for path in files for line in path.read_text().splitlines()]
+        assert len(files) == 3
+        assert sorted(d["device_id"] for d in lines) == [f"device-{i}" for i in range(5)]
+
+    def test_process_pool(self, tmp_path, monkeypatch, checkpoint):
+        """Test chunks built by worker processes against a shared database file."""
+        url = f"sqlite:///{tmp_path / 'digest.db'}"
+        monkeypatch.setenv("DATABASE_URL", url)  # Read by the spawned workers
+        file_engine = create_engine(url)
+        Base.metadata.create_all(bind=file_engine)
+        session_factory = sessionmaker(bind=file_engine)
+        db = session_factory()
+        for i in range(6):
+            add_friend(db, f"device-{i}", "Overdue", days_ago=10)
+        db.close()
+
+        report = run_digests(session_factory, workers=2, chunk_size=2, checkpoint_file=checkpoint, now=NOW)
+
+        db = session_factory()
+        assert report.devices == 6
+        assert report.chunks == 3
+        assert db.query(DeviceDigest).count() == 6
+        db.close()
+        file_engine.dispose()
@@ -1,5 +1,7 @@
 import pytest
 from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 
 from app.services.friend_service import (
     get_frequency_days,
@@ -8,8 +10,12 @@ from app.services.friend_service import (
     create_friend,
     update_friend,
     delete_friend,
-    get_friends_needing_contact
+    get_friends_needing_contact,
+    get_friend_rows,
+    iter_friend_rows
 )
+from app.database import Base
+from app.responses import json_array_chunks
 from app.schemas import FriendCreate, FriendUpdate, ContactFrequency, RelationType
 
 
@@ -111,3 +117,50 @@ class TestFriendsNeedingContact:
         needs_contact = get_friends_needing_contact(db, "device-1")
         assert len(needs_contact) == 1
         assert needs_contact[0].name == "Lonely Friend"
+
+
+class TestIterFriendRows:
+    """Test batched friend rows for streaming."""
+    
+    def test_batches_match_full_list(self, db):
+        """Test batches hold the same rows as the unbatched query, in order."""
+        for i in range(5):
+            create_friend(db, "device-1", FriendCreate(name=f"Friend {i}"))
+        
+        batches = list(iter_friend_rows(db, "device-1", batch_size=2))
+        
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert [row for batch in batches for row in batch] == get_friend_rows(db, "device-1")
+    
+    def test_json_chunks_per_batch(self, db):
+        """Test each batch becomes one chunk of a single JSON array."""
+        for i in range(3):
+            create_friend(db, "device-1", FriendCreate(name=f"Friend {i}"))
+        
+        chunks = list(json_array_chunks(iter_friend_rows(db, "device-1", ("id", "name"), batch_size=2)))
+        
+        assert len(chunks) == 4
+        assert b"".join(chunks).startswith(b'[{"id":1,"name":"Friend 0"},')
+    
+    def test_empty(self, db):
+        """Test a device without friends streams an empty array."""
+        assert b"".join(json_array_chunks(iter_friend_rows(db, "device-1"))) == b"[]"
+    
+    def test_writes_not_blocked_mid_stream(self, tmp_path):
+        """Test another connection can write to a SQLite file while a stream is between batches."""
+        engine = create_engine(f"sqlite:///{tmp_path / 'stream.db'}", connect_args={"timeout": 0.1})
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        reader, writer = session_factory(), session_factory()
+        for i in range(4):
+            create_friend(writer, "device-1", FriendCreate(name=f"Friend {i}"))
+        
+        batches = iter_friend_rows(reader, "device-1", ("id", "name"), batch_size=2)
+        first = next(batches)
+        create_friend(writer, "device-1", FriendCreate(name="Added mid-stream"))
+        rest = [row for batch in batches for row in batch]
+        
+        assert [row["id"] for row in first + rest] == [1, 2, 3, 4, 5]
+        reader.close()
+        writer.close()
+        engine.dispose()
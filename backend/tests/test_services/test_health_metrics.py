@@ -0,0 +1,124 @@
+import pytest
+from datetime import datetime, timedelta
+
+from prometheus_client import REGISTRY
+from sqlalchemy import event
+
+from app.models import ContactFrequency, Friend, Interaction
+from app.schemas import FriendCreate, FriendUpdate, InteractionCreate
+from app.services import health_metrics
+from app.services.friend_service import (
+    calculate_health_status,
+    create_friend,
+    delete_friend,
+    get_friends,
+    update_friend
+)
+from app.services.interaction_service import create_interaction
+from tests.conftest import engine
+
+
+def gauge(status=None):
+    """Current value of a health gauge (total when status is None)."""
+    if status is None:
+        return REGISTRY.get_sample_value("active_friendships", {"tool": "friend-keeper"})
+    return REGISTRY.get_sample_value("friendship_health", {"tool": "friend-keeper", "status": status})
+
+
+def add_friend(db, frequency, days_ago=None):
+    """Store a friend last contacted ``days_ago`` days ago (never if None)."""
+    friend = Friend(device_id="device-1", name="Test", contact_frequency=frequency)
+    db.add(friend)
+    db.commit()
+    if days_ago is not None:
+        db.add(Interaction(friend_id=friend.id, contacted_at=datetime.utcnow() - timedelta(days=days_ago)))
+        db.commit()
+    return friend
+
+
+class TestReconcile:
+    """Test the aggregate reconciliation query."""
+
+    def test_matches_per_friend_status(self, db):
+        """Test the single query agrees with calculate_health_status around every boundary."""
+        for frequency in ContactFrequency:
+            for days_ago in (None, 0, 4, 5, 6, 7, 8, 20, 21, 22, 30, 31, 62, 63, 64, 90, 91):
+                add_friend(db, frequency, days_ago)
+
+        expected = {status: 0 for status in health_metrics.STATUSES}
+        for friend in get_friends(db, "device-1"):
+            expected[friend.health_status] += 1
+
+        assert health_metrics.count_by_status(db) == expected
+
+    def test_single_query(self, db):
+        """Test reconciliation runs exactly one statement."""
+        add_friend(db, ContactFrequency.WEEKLY, 1)
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            health_metrics.reconcile(db)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        assert len(statements) == 1
+
+    def test_sets_gauges(self, db):
+        """Test reconciliation sets the total and per-status gauges."""
+        add_friend(db, ContactFrequency.WEEKLY, 1)
+        add_friend(db, ContactFrequency.WEEKLY, 6)
+        add_friend(db, ContactFrequency.WEEKLY)
+
+        health_metrics.reconcile(db)
+
+        assert gauge() == 3
+        assert (gauge("green"), gauge("yellow"), gauge("red")) == (1, 1, 1)
+
+
+class TestIncrementalUpdates:
+    """Test writes keep the gauges current between reconciliations."""
+
+    def test_writes_move_buckets(self, db):
+        """Test create, contact, frequency change and delete adjust the counts."""
+        health_metrics.reconcile(db)
+
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        assert (gauge(), gauge("red")) == (1, 1)
+
+        create_interaction(db, friend.id, InteractionCreate(summary="Coffee"))
+        assert (gauge("green"), gauge("red")) == (1, 0)
+
+        # Backdate the contact so a stricter frequency makes it red
+        db.query(Interaction).update({Interaction.contacted_at: datetime.utcnow() - timedelta(days=10)})
+        db.commit()
+        update_friend(db, friend, FriendUpdate(contact_frequency=ContactFrequency.WEEKLY))
+        assert (gauge("green"), gauge("red")) == (0, 1)
+
+        delete_friend(db, friend)
+        assert (gauge(), gauge("red")) == (0, 0)
+
+    def test_incremental_agrees_with_reconcile(self, db):
+        """Test incremental counts equal a fresh aggregate after a series of writes."""
+        health_metrics.reconcile(db)
+        friends = [create_friend(db, "device-1", FriendCreate(name=f"F{i}")) for i in range(5)]
+        for friend in friends[:3]:
+            create_interaction(db, friend.id, InteractionCreate(summary="Hi"))
+        delete_friend(db, friends[0])
+        delete_friend(db, friends[4])
+
+        incremental = {status: gauge(status) for status in health_metrics.STATUSES}
+
+        assert incremental == health_metrics.count_by_status(db)
+
+    def test_ignored_before_baseline(self, db):
+        """Test increments without a baseline do not publish partial counts."""
+        health_metrics.reconcile(db)
+        health_metrics.reset()
+
+        create_friend(db, "device-1", FriendCreate(name="Test"))
+
+        assert gauge("red") == 0
@@ -0,0 +1,209 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import patch
+
+from app.config import Settings
+from app.services import llm_resilience
+from app.services.llm_resilience import (
+    CircuitBreaker, ResilientCaller, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+)
+from app.services.llm_service import generate_talk_starters, FALLBACK_STARTERS
+from app.testing import FakeLLMServer, client_factory
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+def make_caller(**overrides):
+    """Build a caller with test-friendly defaults and install it."""
+    params = dict(
+        max_in_flight=8,
+        queue_timeout=1.0,
+        call_timeout=2.0,
+        breaker=CircuitBreaker(error_rate=0.5, min_calls=4, window_seconds=60, open_seconds=30)
+    )
+    params.update(overrides)
+    caller = ResilientCaller(**params)
+    llm_resilience.reset(caller)
+    return caller
+
+
+@pytest.fixture
+def llm():
+    """Route LLM calls to a fake server configured by the test."""
+    server = FakeLLMServer()
+    settings = Settings(llm_proxy_key="test-key", llm_proxy_url="http://llm.test")
+    with patch('app.services.llm_service.get_settings', return_value=settings), \
+            patch('app.services.llm_service.httpx.AsyncClient', client_factory(server)):
+        yield server
+
+
+async def generate():
+    """Generate starters for a fixed friend."""
+    return await generate_talk_starters("John", "friend", "Had coffee", "en")
+
+
+class TestCircuitBreaker:
+    """Test breaker state transitions."""
+    
+    def test_opens_on_error_rate(self):
+        """Test the breaker opens once enough calls fail."""
+        breaker = CircuitBreaker(error_rate=0.5, min_calls=4, window_seconds=60, open_seconds=30)
+        for ok in (True, False, True):
+            breaker.record(ok)
+        assert breaker.state == CLOSED
+        
+        breaker.record(False)
+        
+        assert breaker.state == OPEN
+        assert breaker.allow() is False
+    
+    def test_half_open_single_probe(self):
+        """Test only one probe goes out after the cool-down."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(error_rate=0.5, min_calls=1, window_seconds=60, open_seconds=30, clock=clock)
+        breaker.record(False)
+        
+        clock.now += 31
+        
+        assert breaker.allow() is True
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow() is False
+        breaker.record(True)
+        assert breaker.state == CLOSED
+    
+    def test_failed_probe_reopens(self):
+        """Test a failed probe opens the circuit again."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(error_rate=0.5, min_calls=1, window_seconds=60, open_seconds=30, clock=clock)
+        breaker.record(False)
+        clock.now += 31
+        breaker.allow()
+        
+        breaker.record(False)
+        
+        assert breaker.state == OPEN
+    
+    def test_old_results_leave_window(self):
+        """Test failures outside the window do not count."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(error_rate=0.5, min_calls=4, window_seconds=60, open_seconds=30, clock=clock)
+        for _ in range(3):
+            breaker.record(False)
+        clock.now += 61
+        for _ in range(3):
+            breaker.record(True)
+        breaker.record(False)
+        
+        assert breaker.state == CLOSED
+
+
+class TestResilientLLMCalls:
+    """Test the resilience layer against a latency-injecting fake LLM."""
+    
+    @pytest.mark.asyncio
+    async def test_success_through_fake_server(self, llm):
+        """Test a normal call goes through and uses the configured model."""
+        make_caller()
+        
+        starters = await generate()
+        
+        assert starters == ["Hi from the fake LLM"]
+        assert llm.requests[0]["path"] == "/v1/chat/completions"
+    
+    @pytest.mark.asyncio
+    async def test_timeout_falls_back(self, llm):
+        """Test a slow upstream is cut off at the call timeout."""
+        make_caller(call_timeout=0.1)
+        llm.delay = 5.0
+        
+        start = time.perf_counter()
+        starters = await generate()
+        
+        assert starters == FALLBACK_STARTERS
+        assert time.perf_counter() - start < 1.0
+    
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast(self, llm):
+        """Test calls stop reaching the upstream once the circuit opens."""
+        caller = make_caller()
+        llm.status = 500
+        for _ in range(4):
+            assert await generate() == FALLBACK_STARTERS
+        assert caller.breaker.state == OPEN
+        calls_before = llm.calls
+        
+        with pytest.raises(CircuitOpenError):
+            await caller.call(lambda: asyncio.sleep(0))
+        assert await generate() == FALLBACK_STARTERS
+        assert llm.calls == calls_before
+    
+    @pytest.mark.asyncio
+    async def test_recovers_after_probe(self, llm):
+        """Test a successful probe closes the circuit."""
+        clock = FakeClock()
+        caller = make_caller(
+            breaker=CircuitBreaker(error_rate=0.5, min_calls=2, window_seconds=60, open_seconds=30, clock=clock)
+        )
+        llm.statuses = [500, 500]
+        await generate()
+        await generate()
+        assert caller.breaker.state == OPEN
+        
+        clock.now += 31
+        
+        assert await generate() == ["Hi from the fake LLM"]
+        assert caller.breaker.state == CLOSED
+    
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self, llm):
+        """Test in-flight calls never exceed the limit and excess callers fall back."""
+        make_caller(max_in_flight=2, queue_timeout=0.05)
+        llm.delay = 0.3
+        
+        results = await asyncio.gather(*(generate() for _ in range(6)))
+        
+        assert llm.max_in_flight == 2
+        assert results.count(["Hi from the fake LLM"]) == 2
+        assert results.count(FALLBACK_STARTERS) == 4
+    
+    @pytest.mark.asyncio
+    async def test_hedged_request_wins(self, llm):
+        """Test a slow first attempt is beaten by the hedge."""
+        caller = make_caller(hedge_enabled=True, hedge_min_samples=5, hedge_min_delay=0.05)
+        for _ in range(5):
+            caller.latency.record(0.01)
+        llm.delays = [2.0, 0.0]
+        
+        start = time.perf_counter()
+        starters = await generate()
+        
+        assert starters == ["Hi from the fake LLM"]
+        assert llm.calls == 2
+        assert time.perf_counter() - start < 1.0
+    
+    @pytest.mark.asyncio
+    async def test_no_hedge_without_history(self, llm):
+        """Test hedging waits until there are enough latency samples."""
+        make_caller(hedge_enabled=True, hedge_min_samples=5, hedge_min_delay=0.01)
+        llm.delay = 0.1
+        
+        await generate()
+        
+        assert llm.calls == 1
+    
+    def test_state_metrics_exported(self, client):
+        """Test breaker state shows up on /metrics."""
+        make_caller()
+        
+        response = client.get("/metrics")
+        
+        assert b'llm_circuit_state{state="closed",tool="friend-keeper"} 1.0' in response.content
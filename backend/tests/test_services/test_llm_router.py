@@ -0,0 +1,177 @@
+import pytest
+import json
+import random
+from unittest.mock import patch
+
+from app.config import Settings
+from app.services import llm_router
+from app.services.llm_router import Endpoint, EndpointConfigError, LLMRouter, parse_endpoints
+from app.services.llm_service import generate_talk_starters, FALLBACK_STARTERS
+from app.testing import FakeLLMServer, client_factory
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+ENDPOINTS = json.dumps([
+    {"name": "fast", "url": "http://fast.test", "model": "model-fast"},
+    {"name": "slow", "url": "http://slow.test", "model": "model-slow"},
+    {"name": "flaky", "url": "http://flaky.test", "model": "model-flaky", "weight": 2}
+])
+
+
+@pytest.fixture
+def upstreams():
+    """Three local stand-in LLM servers behind different hostnames."""
+    servers = {
+        "fast.test": FakeLLMServer(content='["fast"]', delay=0.0),
+        "slow.test": FakeLLMServer(content='["slow"]', delay=0.05),
+        "flaky.test": FakeLLMServer(content='["flaky"]', status=503)
+    }
+    settings = Settings(llm_proxy_key="test-key", llm_endpoints=ENDPOINTS)
+    with patch('app.services.llm_service.get_settings', return_value=settings), \
+            patch('app.services.llm_service.httpx.AsyncClient', client_factory(servers)):
+        yield servers
+
+
+async def generate():
+    """Generate starters for a fixed friend."""
+    return await generate_talk_starters("John", "friend", "Had coffee", "en")
+
+
+class TestParseEndpoints:
+    """Test endpoint configuration."""
+    
+    def test_single_proxy_fallback(self):
+        """Test the single proxy URL is used when no list is configured."""
+        endpoints = parse_endpoints(Settings(llm_proxy_url="https://proxy.test/", llm_proxy_key="k"))
+        
+        assert len(endpoints) == 1
+        assert endpoints[0].url == "https://proxy.test"
+        assert endpoints[0].model == "gpt-4o-mini"
+    
+    def test_endpoint_list(self):
+        """Test per-endpoint model and weight, with defaults from settings."""
+        endpoints = parse_endpoints(Settings(llm_proxy_key="shared", llm_endpoints=ENDPOINTS))
+        
+        assert [e.name for e in endpoints] == ["fast", "slow", "flaky"]
+        assert endpoints[2].weight == 2
+        assert endpoints[0].key == "shared"
+    
+    @pytest.mark.parametrize("value", ['{"url": "http://a"', '{"url": "http://a"}', '[{"model": "m"}]', '[{"url": ""}]'])
+    def test_invalid_config_raises(self, value):
+        """Test malformed JSON, a non-list or an entry without a URL fail loudly."""
+        with pytest.raises(EndpointConfigError):
+            parse_endpoints(Settings(llm_endpoints=value))
+    
+    def test_router_tuning_from_settings(self):
+        """Test the router takes its tuning from the settings it is given."""
+        router = llm_router.get_router(Settings(llm_ewma_alpha=0.9, llm_endpoint_timeout_seconds=2.0))
+        
+        assert (router.alpha, router.attempt_timeout) == (0.9, 2.0)
+
+
+class TestRouterPolicy:
+    """Test endpoint selection without HTTP."""
+    
+    def test_prefers_lower_latency(self):
+        """Test the cheaper endpoint wins most primary picks."""
+        fast = Endpoint("fast", "http://a", "k", "m")
+        slow = Endpoint("slow", "http://b", "k", "m")
+        router = LLMRouter([fast, slow], rng=random.Random(1))
+        router.record(fast, 0.1, True)
+        router.record(slow, 1.0, True)
+        
+        primaries = [router.plan()[0].name for _ in range(200)]
+        
+        # Power of two choices: slow only wins when drawn twice
+        assert primaries.count("fast") > 120
+    
+    def test_eject_and_probe(self):
+        """Test a failing endpoint is ejected, then probed and restored."""
+        clock = FakeClock()
+        good = Endpoint("good", "http://a", "k", "m")
+        bad = Endpoint("bad", "http://b", "k", "m")
+        router = LLMRouter([good, bad], eject_min_samples=3, eject_seconds=30, clock=clock)
+        
+        for _ in range(3):
+            router.record(bad, 0.1, False)
+        
+        assert router.is_ejected(bad)
+        assert [e.name for e in router.plan()] == ["good"]
+        
+        clock.now += 31
+        plan = router.plan()
+        assert plan[0] is bad and bad.probing
+        # Only one probe at a time
+        assert bad not in router.plan()
+        
+        router.record(bad, 0.1, True)
+        assert bad.ejected_until == 0.0
+        assert bad.ewma_error == 0.0
+    
+    def test_failed_probe_backs_off(self):
+        """Test a failed probe ejects again for longer."""
+        clock = FakeClock()
+        bad = Endpoint("bad", "http://b", "k", "m")
+        other = Endpoint("other", "http://a", "k", "m")
+        router = LLMRouter([bad, other], eject_min_samples=2, eject_seconds=30, clock=clock)
+        router.record(bad, 0.1, False)
+        router.record(bad, 0.1, False)
+        assert router.is_ejected(bad)
+        clock.now += 31
+        router.plan()
+        
+        router.record(bad, 0.1, False)
+        
+        assert bad.ejected_until == clock.now + 60
+
+
+class TestRoutingAgainstStandIns:
+    """Test routing over several local stand-in servers."""
+    
+    @pytest.mark.asyncio
+    async def test_failover_within_request(self, upstreams):
+        """Test a failing endpoint does not fail the request."""
+        results = [await generate() for _ in range(20)]
+        
+        assert FALLBACK_STARTERS not in results
+        assert all(r in (["fast"], ["slow"]) for r in results)
+        # Failed attempts count against the flaky endpoint only
+        router = next(iter(llm_router._routers.values()))
+        flaky = next(e for e in router.endpoints if e.name == "flaky")
+        assert router.is_ejected(flaky)
+    
+    @pytest.mark.asyncio
+    async def test_traffic_shifts_to_fast(self, upstreams):
+        """Test most requests end up on the lowest-latency endpoint."""
+        for _ in range(40):
+            await generate()
+        
+        assert upstreams["fast.test"].calls > upstreams["slow.test"].calls
+        assert upstreams["fast.test"].requests[0]["json"]["model"] == "model-fast"
+    
+    @pytest.mark.asyncio
+    async def test_all_down_falls_back(self, upstreams):
+        """Test the request falls back when every endpoint fails."""
+        for server in upstreams.values():
+            server.status = 500
+        
+        assert await generate() == FALLBACK_STARTERS
+    
+    def test_routing_metrics_exported(self, client, upstreams):
+        """Test routing decisions and endpoint latency show up on /metrics."""
+        import asyncio
+        asyncio.run(generate())
+        
+        content = client.get("/metrics").content
+        
+        assert b"llm_route_decisions_total" in content
+        assert b"llm_endpoint_latency_seconds_bucket" in content
@@ -2,7 +2,8 @@ import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 import httpx
 
-from app.services.llm_service import generate_talk_starters
+from app.config import Settings
+from app.services.llm_service import DEFAULT_STARTERS, generate_talk_starters, generate_talk_starters_batch
 
 
 class TestLLMService:
@@ -11,9 +12,7 @@ class TestLLMService:
     @pytest.mark.asyncio
     async def test_generate_starters_no_api_key(self):
         """Test fallback when no API key."""
-        with patch('app.services.llm_service.get_settings') as mock_settings:
-            mock_settings.return_value.llm_proxy_key = ""
-            
+        with patch('app.services.llm_service.get_settings', return_value=Settings(llm_proxy_key="")):
             starters = await generate_talk_starters(
                 "John",
                 "friend",
@@ -27,10 +26,8 @@ class TestLLMService:
     @pytest.mark.asyncio
     async def test_generate_starters_success(self):
         """Test successful API call."""
-        with patch('app.services.llm_service.get_settings') as mock_settings:
-            mock_settings.return_value.llm_proxy_key = "test-key"
-            mock_settings.return_value.llm_proxy_url = "https://test.api"
-            
+        settings = Settings(llm_proxy_key="test-key", llm_proxy_url="https://test.api")
+        with patch('app.services.llm_service.get_settings', return_value=settings):
             mock_response = MagicMock()
             mock_response.json.return_value = {
                 "choices": [{
@@ -59,10 +56,8 @@ class TestLLMService:
     @pytest.mark.asyncio
     async def test_generate_starters_api_error(self):
         """Test fallback on API error."""
-        with patch('app.services.llm_service.get_settings') as mock_settings:
-            mock_settings.return_value.llm_proxy_key = "test-key"
-            mock_settings.return_value.llm_proxy_url = "https://test.api"
-            
+        settings = Settings(llm_proxy_key="test-key", llm_proxy_url="https://test.api")
+        with patch('app.services.llm_service.get_settings', return_value=settings):
             with patch('httpx.AsyncClient') as mock_client:
                 mock_client.return_value.__aenter__.return_value.post = AsyncMock(
                     side_effect=httpx.HTTPError("API Error")
@@ -82,10 +77,8 @@ class TestLLMService:
     @pytest.mark.asyncio
     async def test_generate_starters_different_languages(self):
         """Test language parameter is used."""
-        with patch('app.services.llm_service.get_settings') as mock_settings:
-            mock_settings.return_value.llm_proxy_key = "test-key"
-            mock_settings.return_value.llm_proxy_url = "https://test.api"
-            
+        settings = Settings(llm_proxy_key="test-key", llm_proxy_url="https://test.api")
+        with patch('app.services.llm_service.get_settings', return_value=settings):
             mock_response = MagicMock()
             mock_response.json.return_value = {
                 "choices": [{
@@ -110,3 +103,73 @@ class TestLLMService:
                 # Verify the call included Chinese in the prompt
                 call_args = mock_post.call_args
                 assert "Chinese" in str(call_args)
+    
+    @pytest.mark.asyncio
+    async def test_generate_batch_single_call(self):
+        """Test batch generation parses per-friend results from one call."""
+        settings = Settings(llm_proxy_key="test-key", llm_proxy_url="https://test.api")
+        with patch('app.services.llm_service.get_settings', return_value=settings):
+            mock_response = MagicMock()
+            mock_response.json.return_value = {
+                "choices": [{
+                    "message": {
+                        "content": '{"1": ["How was Tokyo?"], "2": ["How is the new job?"]}'
+                    }
+                }]
+            }
+            mock_response.raise_for_status = MagicMock()
+            
+            with patch('httpx.AsyncClient') as mock_client:
+                mock_post = AsyncMock(return_value=mock_response)
+                mock_client.return_value.__aenter__.return_value.post = mock_post
+                
+                results = await generate_talk_starters_batch(
+                    [
+                        {"id": 1, "name": "John", "relation_type": "friend", "context": "Trip to Tokyo"},
+                        {"id": 2, "name": "Amy", "relation_type": "colleague", "context": "New job"},
+                        {"id": 3, "name": "Bob", "relation_type": "family", "context": "None"}
+                    ],
+                    "en"
+                )
+                
+                assert mock_post.call_count == 1
+                assert results[1] == ["How was Tokyo?"]
+                assert results[2] == ["How is the new job?"]
+                # Missing from the answer: fallback
+                assert "How have you been" in results[3][0]
+    
+    @pytest.mark.asyncio
+    async def test_generate_batch_no_api_key(self):
+        """Test batch fallback when no API key."""
+        with patch('app.services.llm_service.get_settings', return_value=Settings(llm_proxy_key="")):
+            results = await generate_talk_starters_batch(
+                [{"id": 7, "name": "John", "relation_type": "friend", "context": ""}]
+            )
+            
+            assert len(results[7]) == 3
+    
+    @pytest.mark.asyncio
+    async def test_key_only_in_endpoint_list(self):
+        """Test endpoints that carry their own key are used without LLM_PROXY_KEY."""
+        settings = Settings(
+            llm_proxy_key="",
+            llm_endpoints='[{"url": "https://test.api", "key": "endpoint-key"}]'
+        )
+        with patch('app.services.llm_service.get_settings', return_value=settings):
+            mock_response = MagicMock()
+            mock_response.json.return_value = {"choices": [{"message": {"content": '["Hi!"]'}}]}
+            mock_response.raise_for_status = MagicMock()
+            
+            with patch('httpx.AsyncClient') as mock_client:
+                mock_post = AsyncMock(return_value=mock_response)
+                mock_client.return_value.__aenter__.return_value.post = mock_post
+                
+                starters = await generate_talk_starters("John", "friend", "Had coffee", "en")
+                results = await generate_talk_starters_batch(
+                    [{"id": 7, "name": "John", "relation_type": "friend", "context": ""}]
+                )
+                
+                assert starters == ["Hi!"]
+                assert mock_post.call_count == 2
+                assert mock_post.call_args.kwargs["headers"]["Authorization"] == "Bearer endpoint-key"
+                assert results[7] != DEFAULT_STARTERS
@@ -0,0 +1,138 @@
+import pytest
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import inspect
+
+from app.models import GenerationToken, PaymentTransaction
+from app.services.creem_client import CreemClient
+from app.services.payment_reconciliation import reconcile_payments
+from tests.conftest import TestingSessionLocal, engine
+from app.testing import FakeCreemServer
+
+
+def add_transaction(db, checkout_id, age=timedelta(hours=2), status="pending", device_id="device-1"):
+    """Store a transaction created ``age`` ago."""
+    db.add(PaymentTransaction(
+        device_id=device_id,
+        creem_checkout_id=checkout_id,
+        product_sku="starter",
+        tokens_granted=10,
+        amount_cents=499,
+        status=status,
+        created_at=datetime.utcnow() - age
+    ))
+    db.commit()
+
+
+def status_of(db, checkout_id):
+    """Current local status of a checkout."""
+    db.expire_all()
+    return db.query(PaymentTransaction).filter(
+        PaymentTransaction.creem_checkout_id == checkout_id
+    ).one().status
+
+
+def tokens(db, device_id="device-1"):
+    """Paid tokens of a device."""
+    db.expire_all()
+    token = db.query(GenerationToken).filter(GenerationToken.device_id == device_id).first()
+    return token.tokens_remaining if token else 0
+
+
+@pytest.fixture
+def creem():
+    """Local Creem stand-in and a pooled client pointed at it."""
+    server = FakeCreemServer()
+    client = CreemClient(api_key="test-key", base_url="http://creem.test", transport=httpx.ASGITransport(app=server))
+    return server, client
+
+
+class TestReconciliation:
+    """Test reconciling stale pending payments."""
+
+    @pytest.mark.asyncio
+    async def test_applies_provider_status(self, db, creem):
+        """Test completed checkouts grant tokens and expired ones are closed."""
+        server, client = creem
+        add_transaction(db, "chk_paid")
+        add_transaction(db, "chk_gone")
+        add_transaction(db, "chk_open")
+        server.checkouts = {"chk_paid": "completed", "chk_gone": "expired", "chk_open": "pending"}
+
+        report = await reconcile_payments(client, session_factory=TestingSessionLocal)
+
+        assert report.as_dict()["scanned"] == 3
+        assert report.counts["completed"] == 1
+        assert report.counts["expired"] == 1
+        assert report.counts["still_pending"] == 1
+        assert status_of(db, "chk_paid") == "completed"
+        assert status_of(db, "chk_gone") == "expired"
+        assert status_of(db, "chk_open") == "pending"
+        assert tokens(db) == 10
+
+    @pytest.mark.asyncio
+    async def test_rerun_is_idempotent(self, db, creem):
+        """Test a second run grants nothing more."""
+        server, client = creem
+        add_transaction(db, "chk_paid")
+        server.checkouts = {"chk_paid": "completed"}
+
+        await reconcile_payments(client, session_factory=TestingSessionLocal)
+        report = await reconcile_payments(client, session_factory=TestingSessionLocal)
+
+        assert report.scanned == 0
+        assert tokens(db) == 10
+
+    @pytest.mark.asyncio
+    async def test_skips_recent_and_settled(self, db, creem):
+        """Test only stale pending transactions are checked."""
+        server, client = creem
+        add_transaction(db, "chk_new", age=timedelta(minutes=5))
+        add_transaction(db, "chk_done", status="completed")
+        server.checkouts = {"chk_new": "completed", "chk_done": "completed"}
+
+        report = await reconcile_payments(client, session_factory=TestingSessionLocal)
+
+        assert report.scanned == 0
+        assert server.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_chunks_and_bounded_concurrency(self, db, creem):
+        """Test every row is visited across chunks with bounded in-flight lookups."""
+        server, client = creem
+        server.delay = 0.01
+        # Same created_at for several rows exercises the keyset tie-breaker
+        created = timedelta(hours=3)
+        for i in range(25):
+            add_transaction(db, f"chk_{i}", age=created, device_id=f"device-{i}")
+            server.checkouts[f"chk_{i}"] = "completed"
+
+        report = await reconcile_payments(
+            client, session_factory=TestingSessionLocal, chunk_size=7, concurrency=3
+        )
+
+        assert report.scanned == 25
+        assert report.counts["completed"] == 25
+        assert server.calls == 25
+        assert server.max_in_flight <= 3
+
+    @pytest.mark.asyncio
+    async def test_provider_errors_counted(self, db, creem):
+        """Test lookup failures are reported and leave the row pending."""
+        server, client = creem
+        add_transaction(db, "chk_err")
+        add_transaction(db, None)
+        server.failing.add("chk_err")
+
+        report = await reconcile_payments(client, session_factory=TestingSessionLocal)
+
+        assert report.counts["error"] == 1
+        assert report.counts["unknown"] == 1
+        assert status_of(db, "chk_err") == "pending"
+
+    def test_scan_index_exists(self, db):
+        """Test the (status, created_at) index backs the scan."""
+        indexes = inspect(engine).get_indexes("payment_transactions")
+
+        assert any(index["column_names"] == ["status", "created_at"] for index in indexes)
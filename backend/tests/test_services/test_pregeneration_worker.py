@@ -0,0 +1,166 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from app.services import starter_cache_service
+from app.services.pregeneration_worker import PregenerationWorker, in_hour_window
+from app.services.friend_service import create_friend, get_friends_nearing_transition
+from app.services.interaction_service import create_interaction, get_interaction_context
+from app.services.starter_cache_service import (
+    get_cached_starters, get_preferred_language, store_starters, take_cached_starters
+)
+from app.schemas import FriendCreate, InteractionCreate
+from tests.conftest import TestingSessionLocal
+
+
+def make_friend_contacted(db, days_ago, frequency="weekly", device_id="device-1"):
+    """Create a friend whose only interaction was the given number of days ago."""
+    friend = create_friend(db, device_id, FriendCreate(name="Test", contact_frequency=frequency))
+    interaction = create_interaction(db, friend.id, InteractionCreate(summary="Coffee"))
+    interaction.contacted_at = datetime.utcnow() - timedelta(days=days_ago, hours=1)
+    db.commit()
+    return friend
+
+
+class TestHourWindow:
+    """Test off-peak window parsing."""
+
+    def test_simple_window(self):
+        """Test simple window."""
+        assert in_hour_window("1-6", datetime(2024, 1, 1, 3))
+        assert not in_hour_window("1-6", datetime(2024, 1, 1, 6))
+
+    def test_wrapping_window(self):
+        """Test wrapping window."""
+        assert in_hour_window("22-4", datetime(2024, 1, 1, 23))
+        assert in_hour_window("22-4", datetime(2024, 1, 1, 2))
+        assert not in_hour_window("22-4", datetime(2024, 1, 1, 12))
+
+
+class TestNearingTransition:
+    """Test the candidate query."""
+
+    def test_finds_friends_about_to_turn(self, db):
+        """Test finds friends about to turn."""
+        # Weekly: yellow after day 4, red after day 7
+        about_yellow = make_friend_contacted(db, 4)
+        about_red = make_friend_contacted(db, 7)
+        fresh = make_friend_contacted(db, 1)
+        overdue = make_friend_contacted(db, 20)
+
+        ids = {f.id for f in get_friends_nearing_transition(db, timedelta(days=1))}
+
+        assert about_yellow.id in ids
+        assert about_red.id in ids
+        assert fresh.id not in ids
+        assert overdue.id not in ids
+
+
+class TestStarterCache:
+    """Test the starter cache."""
+
+    def test_context_change_invalidates(self, db):
+        """Test context change invalidates."""
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        store_starters(db, friend.id, "en", "old context", ["Hi"])
+
+        assert get_cached_starters(db, friend.id, "en", "old context") == ["Hi"]
+        assert get_cached_starters(db, friend.id, "en", "new context") is None
+        assert get_cached_starters(db, friend.id, "de", "old context") is None
+
+    def test_take_consumes_entry(self, db):
+        """Test take consumes entry."""
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        store_starters(db, friend.id, "en", "ctx", ["Hi"])
+
+        assert take_cached_starters(db, friend.id, "en", "ctx") == ["Hi"]
+        assert take_cached_starters(db, friend.id, "en", "ctx") is None
+
+    def test_take_consumes_once_under_race(self, db, monkeypatch):
+        """Test a request that loses the consume race gets a miss, not the same starters."""
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        store_starters(db, friend.id, "en", "ctx", ["Hi"])
+        read = starter_cache_service.get_cached_starters
+
+        def read_then_lose_race(*args):
+            starters = read(*args)
+            monkeypatch.setattr(starter_cache_service, "get_cached_starters", read)
+            other = TestingSessionLocal()
+            assert take_cached_starters(other, friend.id, "en", "ctx") == ["Hi"]
+            other.close()
+            return starters
+
+        monkeypatch.setattr(starter_cache_service, "get_cached_starters", read_then_lose_race)
+
+        assert take_cached_starters(db, friend.id, "en", "ctx") is None
+
+    def test_preferred_language_from_served(self, db):
+        """Test preferred language from served."""
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        other = create_friend(db, "device-1", FriendCreate(name="Other"))
+        assert get_preferred_language(db, friend) == "en"
+
+        store_starters(db, other.id, "ja", "ctx", ["こんにちは"], served=True)
+
+        assert get_preferred_language(db, friend) == "ja"
+        assert get_cached_starters(db, other.id, "ja", "ctx") is None
+
+
+class TestPregenerationWorker:
+    """Test the background worker."""
+
+    @pytest.mark.asyncio
+    async def test_scan_and_process(self, db):
+        """Test scan and process."""
+        friend = make_friend_contacted(db, 4)
+        make_friend_contacted(db, 1)
+
+        worker = PregenerationWorker(session_factory=TestingSessionLocal, concurrency=2)
+        with patch('app.services.llm_service.generate_talk_starters') as mock_llm:
+            mock_llm.return_value = ["Did the trip happen?"]
+            worker.start(scan=False)
+            assert await worker.scan() == 1
+            await worker.queue.join()
+            await worker.stop()
+
+        context = get_interaction_context(db, friend.id)
+        assert get_cached_starters(db, friend.id, "en", context) == ["Did the trip happen?"]
+        assert mock_llm.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_enqueue_dedup(self):
+        """Test enqueue dedup."""
+        worker = PregenerationWorker(session_factory=TestingSessionLocal, queue_size=5)
+        assert worker.enqueue(1) is True
+        assert worker.enqueue(1) is False
+
+    @pytest.mark.asyncio
+    async def test_fallback_not_cached(self, db):
+        """Test fallback not cached."""
+        friend = make_friend_contacted(db, 4)
+        worker = PregenerationWorker(session_factory=TestingSessionLocal)
+
+        # No API key configured: generic starters come back
+        assert await worker.process(friend.id) == "fallback"
+
+
+class TestInteractiveCacheHit:
+    """Test the interactive endpoint serves pre-generated starters."""
+
+    @patch('app.services.llm_service.generate_talk_starters')
+    def test_cache_hit_skips_llm(self, mock_llm, client, db, headers):
+        """Test cache hit skips llm."""
+        friend_id = client.post(
+            "/api/v1/friends", json={"name": "Test"}, headers=headers
+        ).json()["id"]
+        store_starters(db, friend_id, "en", get_interaction_context(db, friend_id), ["Cached!"])
+
+        response = client.post(
+            "/api/v1/talk-starters",
+            json={"friend_id": friend_id, "language": "en"},
+            headers=headers
+        )
+
+        assert response.status_code == 200
+        assert response.json()["starters"] == ["Cached!"]
+        mock_llm.assert_not_called()
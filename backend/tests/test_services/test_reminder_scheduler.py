@@ -0,0 +1,349 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from app.config import get_settings
+from app.models import ContactFrequency, Friend, Interaction
+from app.schemas import FriendUpdate, InteractionCreate
+from app.services import reminder_scheduler
+from app.services.friend_service import delete_friend, get_transition_times, update_friend
+from app.services.interaction_service import create_interaction
+from app.services.reminder_scheduler import (
+    FileSink,
+    ReminderScheduler,
+    Transition,
+    TransitionQueue,
+    WebhookSink,
+    next_transition,
+    pending_transitions
+)
+from tests.conftest import TestingSessionLocal
+
+NOW = datetime(2026, 3, 1, 12, 0)
+
+
+class ListSink:
+    """Collects emitted events."""
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, events):
+        self.events.extend(events)
+
+    def close(self):
+        pass
+
+
+class Clock:
+    """Settable clock for the scheduler."""
+
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def add_friend(db, frequency=ContactFrequency.WEEKLY, days_ago=None, device_id="device-1"):
+    """Store a friend last contacted ``days_ago`` days before NOW (never if None)."""
+    friend = Friend(device_id=device_id, name="Test", contact_frequency=frequency)
+    db.add(friend)
+    db.commit()
+    if days_ago is not None:
+        db.add(Interaction(friend_id=friend.id, contacted_at=NOW - timedelta(days=days_ago)))
+        db.commit()
+    return friend
+
+
+def transition(friend_id, due_at, status="yellow"):
+    """A weekly friend's transition due at ``due_at``."""
+    return Transition(friend_id, "device-1", status, due_at, due_at - timedelta(days=5), ContactFrequency.WEEKLY)
+
+
+@pytest.fixture
+def sink():
+    """A sink that collects events."""
+    return ListSink()
+
+
+@pytest.fixture
+def clock():
+    """A clock set to NOW."""
+    return Clock()
+
+
+@pytest.fixture
+def scheduler(db, sink, clock):
+    """A scheduler registered for write hooks, without its loops."""
+    scheduler = ReminderScheduler(session_factory=TestingSessionLocal, sinks=[sink], clock=clock)
+    reminder_scheduler._active = scheduler
+    yield scheduler
+    reminder_scheduler._active = None
+
+
+class TestTransitionQueue:
+    """Test the transition min-heap."""
+
+    def test_pops_in_due_order(self):
+        """Test due transitions come out earliest first and later ones stay."""
+        queue = TransitionQueue()
+        for friend_id, days in ((1, 3), (2, 1), (3, 2), (4, 10)):
+            queue.push(transition(friend_id, NOW + timedelta(days=days)))
+
+        due = queue.pop_due(NOW + timedelta(days=5), limit=10)
+
+        assert [t.friend_id for t in due] == [2, 3, 1]
+        assert len(queue) == 1
+        assert queue.next_due() == NOW + timedelta(days=10)
+
+    def test_push_replaces_friend_entry(self):
+        """Test rescheduling a friend supersedes its earlier entry."""
+        queue = TransitionQueue()
+        queue.push(transition(1, NOW + timedelta(days=1)))
+        queue.push(transition(1, NOW + timedelta(days=7)))
+
+        assert len(queue) == 1
+        assert queue.pop_due(NOW + timedelta(days=2), limit=10) == []
+        assert queue.next_due() == NOW + timedelta(days=7)
+
+    def test_push_reports_new_earliest(self):
+        """Test push says whether the loop needs waking."""
+        queue = TransitionQueue()
+
+        assert queue.push(transition(1, NOW + timedelta(days=5)))
+        assert not queue.push(transition(2, NOW + timedelta(days=6)))
+        assert queue.push(transition(3, NOW + timedelta(days=1)))
+
+    def test_remove_and_limit(self):
+        """Test removed friends are skipped and pop_due respects its limit."""
+        queue = TransitionQueue()
+        for friend_id in range(5):
+            queue.push(transition(friend_id, NOW + timedelta(hours=friend_id)))
+        queue.remove(0)
+
+        assert [t.friend_id for t in queue.pop_due(NOW + timedelta(days=1), limit=2)] == [1, 2]
+
+    def test_compaction_bounds_heap(self):
+        """Test repeated rescheduling does not grow the heap without bound."""
+        queue = TransitionQueue()
+        for i in range(10000):
+            queue.push(transition(i % 10, NOW + timedelta(minutes=i)))
+
+        assert len(queue) == 10
+        assert len(queue._heap) <= 2 * 10 + 1025
+
+    def test_rebuild_keeps_concurrent_updates(self):
+        """Test updates made while a rebuild runs survive the swap."""
+        queue = TransitionQueue()
+        queue.begin_rebuild()
+        queue.push(transition(1, NOW + timedelta(days=9)))
+        queue.remove(2)
+
+        queue.replace([transition(1, NOW + timedelta(days=1)), transition(2, NOW), transition(3, NOW)])
+
+        assert queue.get(1).due_at == NOW + timedelta(days=9)
+        assert queue.get(2) is None
+        assert queue.get(3) is not None
+
+
+class TestNextTransition:
+    """Test the next transition for a friend."""
+
+    def test_matches_transition_times(self):
+        """Test yellow comes first, then red, then nothing."""
+        last = NOW - timedelta(days=1)
+        yellow_at, red_at = get_transition_times(last, ContactFrequency.WEEKLY)
+
+        assert next_transition(1, "d", last, ContactFrequency.WEEKLY, NOW).due_at == yellow_at
+        red = next_transition(1, "d", last, ContactFrequency.WEEKLY, yellow_at)
+        assert (red.status, red.due_at) == ("red", red_at)
+        assert next_transition(1, "d", last, ContactFrequency.WEEKLY, red_at) is None
+        assert next_transition(1, "d", None, ContactFrequency.WEEKLY, NOW) is None
+
+
+class TestReminderScheduler:
+    """Test rebuilding, write hooks and firing."""
+
+    def test_rebuild_from_database(self, db, scheduler):
+        """Test the rebuild schedules every friend with a pending transition."""
+        green = add_friend(db, ContactFrequency.WEEKLY, days_ago=1)
+        yellow = add_friend(db, ContactFrequency.WEEKLY, days_ago=6, device_id="device-2")
+        add_friend(db, ContactFrequency.WEEKLY, days_ago=30)  # Red already
+        add_friend(db, ContactFrequency.MONTHLY)  # Never contacted
+
+        assert scheduler.rebuild() == 2
+        assert scheduler.queue.get(green.id).status == "yellow"
+        assert scheduler.queue.get(yellow.id).status == "red"
+        assert scheduler.queue.get(yellow.id).device_id == "device-2"
+
+    def test_rebuild_in_batches(self, db):
+        """Test batched rebuilds find pending friends on both sides of every batch boundary."""
+        friends = [add_friend(db, ContactFrequency.WEEKLY, days_ago=days) for days in (1, 30, 2, 30, 30, 3, 6)]
+
+        found = [t.friend_id for t in pending_transitions(db, NOW, batch_size=2)]
+
+        assert found == [friends[i].id for i in (0, 2, 5, 6)]
+
+    def test_fires_yellow_then_red(self, db, scheduler, sink, clock):
+        """Test transitions are emitted as they fall due, and red follows yellow."""
+        friend = add_friend(db, ContactFrequency.WEEKLY, days_ago=1)
+        scheduler.rebuild()
+        yellow_at, red_at = get_transition_times(NOW - timedelta(days=1), ContactFrequency.WEEKLY)
+
+        clock.now = yellow_at - timedelta(seconds=1)
+        assert scheduler.fire_due() == 0
+        clock.now = yellow_at
+        assert scheduler.fire_due() == 1
+        clock.now = red_at
+        assert scheduler.fire_due() == 1
+
+        assert [(e["friend_id"], e["status"]) for e in sink.events] == [(friend.id, "yellow"), (friend.id, "red")]
+        assert sink.events[0]["due_at"] == yellow_at.isoformat()
+        assert len(scheduler.queue) == 0
+
+    def test_interaction_reschedules(self, db, scheduler, sink, clock):
+        """Test logging an interaction pushes the friend's transition back."""
+        friend = add_friend(db, ContactFrequency.WEEKLY, days_ago=6)
+        scheduler.rebuild()
+        assert scheduler.queue.get(friend.id).status == "red"
+
+        interaction = create_interaction(db, friend.id, InteractionCreate(summary="Call"))
+
+        scheduled = scheduler.queue.get(friend.id)
+        assert scheduled.status == "yellow"
+        assert scheduled.last_contact == interaction.contacted_at
+
+    def test_frequency_change_and_delete(self, db, scheduler):
+        """Test frequency changes reschedule and deletions unschedule."""
+        friend = add_friend(db, ContactFrequency.WEEKLY, days_ago=1)
+        scheduler.rebuild()
+        weekly_due = scheduler.queue.get(friend.id).due_at
+
+        update_friend(db, friend, FriendUpdate(contact_frequency=ContactFrequency.QUARTERLY))
+        assert scheduler.queue.get(friend.id).due_at > weekly_due
+
+        delete_friend(db, friend)
+        assert scheduler.queue.get(friend.id) is None
+
+    def test_stale_entry_not_emitted(self, db, scheduler, sink, clock):
+        """Test a transition invalidated by a write another process made is rescheduled, not emitted."""
+        friend = add_friend(db, ContactFrequency.WEEKLY, days_ago=1)
+        scheduler.rebuild()
+        yellow_at = scheduler.queue.get(friend.id).due_at
+        # Written without the hooks, as another worker would
+        db.add(Interaction(friend_id=friend.id, contacted_at=yellow_at - timedelta(hours=1)))
+        db.commit()
+
+        clock.now = yellow_at
+        assert scheduler.fire_due() == 0
+        assert sink.events == []
+        assert scheduler.queue.get(friend.id).last_contact == yellow_at - timedelta(hours=1)
+
+    def test_hooks_inactive_without_scheduler(self, db):
+        """Test writes do nothing when no scheduler is running."""
+        friend = add_friend(db, ContactFrequency.WEEKLY, days_ago=1)
+
+        create_interaction(db, friend.id, InteractionCreate(summary="Call"))
+
+        assert reminder_scheduler._active is None
+
+    @pytest.mark.asyncio
+    async def test_loop_wakes_on_earlier_transition(self, db, sink, clock, tmp_path):
+        """Test the running loop fires a transition scheduled after it went to sleep."""
+        scheduler = ReminderScheduler(
+            session_factory=TestingSessionLocal, sinks=[sink], clock=clock, lock_file=str(tmp_path / "lock")
+        )
+        friend = add_friend(db, ContactFrequency.WEEKLY, days_ago=7)
+        scheduler.start()
+        try:
+            await _until(lambda: scheduler.queue.get(friend.id) is not None)
+            clock.now = scheduler.queue.get(friend.id).due_at
+            scheduler._notify()
+            await _until(lambda: sink.events)
+        finally:
+            await scheduler.stop()
+
+        assert sink.events[0]["status"] == "red"
+        assert reminder_scheduler._active is None
+
+
+    @pytest.mark.asyncio
+    async def test_one_scheduler_per_lock_file(self, db, clock, tmp_path, monkeypatch):
+        """Test a second scheduler stands by while the lock is held and takes over once it is released."""
+        monkeypatch.setattr(get_settings(), "reminder_max_sleep_seconds", 0.01)
+        lock_file = str(tmp_path / "lock")
+        first_sink, second_sink = ListSink(), ListSink()
+        first, second = (
+            ReminderScheduler(session_factory=TestingSessionLocal, sinks=[sink], clock=clock, lock_file=lock_file)
+            for sink in (first_sink, second_sink)
+        )
+        add_friend(db, ContactFrequency.WEEKLY, days_ago=7)
+        first.start()
+        second.start()
+        try:
+            await _until(lambda: len(first.queue) == 1)
+            await asyncio.sleep(0.05)
+            assert reminder_scheduler._active is first
+            assert len(second.queue) == 0
+
+            await first.stop()
+            await _until(lambda: reminder_scheduler._active is second and len(second.queue) == 1)
+        finally:
+            await first.stop()
+            await second.stop()
+
+        assert first_sink.events == second_sink.events == []
+
+
+async def _until(condition, timeout=5.0):
+    """Wait for a condition to hold."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+class TestSinks:
+    """Test the event sinks."""
+
+    def test_file_sink_appends_jsonl(self, tmp_path):
+        """Test the file sink writes one JSON object per line."""
+        path = tmp_path / "reminders" / "transitions.jsonl"
+        sink = FileSink(str(path))
+
+        sink.emit([{"friend_id": 1}, {"friend_id": 2}])
+        sink.emit([{"friend_id": 3}])
+
+        assert [json.loads(line)["friend_id"] for line in path.read_text().splitlines()] == [1, 2, 3]
+
+    def test_webhook_sink_posts_batch(self):
+        """Test the webhook sink posts each batch as one request."""
+        requests = []
+
+        def handler(request):
+            requests.append(json.loads(request.content))
+            return httpx.Response(204)
+
+        sink = WebhookSink("http://hooks.test/reminders", transport=httpx.MockTransport(handler))
+        sink.emit([{"friend_id": 1}, {"friend_id": 2}])
+        sink.close()
+
+        assert requests == [{"events": [{"friend_id": 1}, {"friend_id": 2}]}]
+
+    def test_failing_sink_does_not_block_others(self, db, sink, clock):
+        """Test a sink error is logged and the other sinks still get the events."""
+        class Broken(ListSink):
+            def emit(self, events):
+                raise RuntimeError("down")
+
+        scheduler = ReminderScheduler(session_factory=TestingSessionLocal, sinks=[Broken(), sink], clock=clock)
+        add_friend(db, ContactFrequency.WEEKLY, days_ago=6)
+        scheduler.rebuild()
+        clock.now = NOW + timedelta(days=30)
+
+        assert scheduler.fire_due() == 1
+        assert len(sink.events) == 1
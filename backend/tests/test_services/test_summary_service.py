@@ -0,0 +1,106 @@
+import pytest
+
+from app.services.summary_service import (
+    approx_token_count,
+    truncate_to_tokens,
+    get_summary,
+    rebuild_summary
+)
+from app.services.interaction_service import create_interaction, get_interaction_context
+from app.services.friend_service import create_friend
+from app.schemas import FriendCreate, InteractionCreate
+from app.config import get_settings
+
+
+class TestTokenApproximation:
+    """Test the local tokenizer approximation."""
+
+    def test_count_words_and_punctuation(self):
+        """Test English text counts words and punctuation, erring high."""
+        # Had(1) coffee(2) ,(1) talked(2) .(1)
+        assert approx_token_count("Had coffee, talked.") == 7
+
+    def test_count_cjk(self):
+        """Test CJK characters count one token each."""
+        assert approx_token_count("最近怎么样") == 5
+
+    def test_truncate(self):
+        """Test truncation stays within budget."""
+        text = " ".join(["word"] * 100)
+        truncated = truncate_to_tokens(text, 10)
+        assert approx_token_count(truncated) <= 11  # Plus the ellipsis
+        assert truncated.endswith("…")
+
+    def test_truncate_short_text_unchanged(self):
+        """Test short text is returned as is."""
+        assert truncate_to_tokens("Hello there", 10) == "Hello there"
+
+
+class TestRollingSummary:
+    """Test incremental rolling summaries."""
+
+    def test_no_summary_within_raw_window(self, db):
+        """Test nothing is folded while history fits the raw window."""
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        create_interaction(db, friend.id, InteractionCreate(summary="First"))
+
+        assert get_summary(db, friend.id) is None
+
+    def test_overflow_folded_incrementally(self, db):
+        """Test each new interaction folds the one leaving the raw window."""
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        for i in range(5):
+            create_interaction(db, friend.id, InteractionCreate(summary=f"Chat {i}"))
+
+        summary = get_summary(db, friend.id)
+        assert summary.folded_count == 3
+        assert "Chat 0" in summary.summary
+        assert "Chat 2" in summary.summary
+        assert "Chat 4" not in summary.summary
+
+    def test_summary_respects_budget(self, db):
+        """Test the summary never exceeds its token budget."""
+        settings = get_settings()
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        chatty = "We talked about a great many things at length " * 20
+        for i in range(40):
+            create_interaction(db, friend.id, InteractionCreate(summary=f"{i} {chatty}"))
+
+        summary = get_summary(db, friend.id)
+        assert summary.token_count <= settings.summary_token_budget
+        assert approx_token_count(summary.summary) == summary.token_count
+
+    def test_rebuild_matches_incremental(self, db):
+        """Test a rebuild produces the same summary as incremental folding."""
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        for i in range(6):
+            create_interaction(db, friend.id, InteractionCreate(summary=f"Chat {i}"))
+        incremental = get_summary(db, friend.id).summary
+
+        assert rebuild_summary(db, friend.id).summary == incremental
+
+
+class TestBoundedContext:
+    """Test the prompt context stays bounded."""
+
+    def test_context_bounded_for_long_history(self, db):
+        """Test context size does not grow with history length."""
+        settings = get_settings()
+        friend = create_friend(db, "device-1", FriendCreate(name="Test"))
+        chatty = "We talked about a great many things at length " * 20
+        for i in range(30):
+            create_interaction(
+                db, friend.id,
+                InteractionCreate(summary=f"{i} {chatty}", next_topics=["Trip"])
+            )
+
+        context = get_interaction_context(db, friend.id)
+
+        budget = (
+            settings.summary_token_budget
+            + settings.context_raw_interactions * 2 * (settings.context_line_token_budget + 10)
+            + 10
+        )
+        assert approx_token_count(context) <= budget
+        assert context.startswith("- ")
+        assert "Earlier interactions:" in context
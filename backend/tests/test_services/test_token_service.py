@@ -1,12 +1,16 @@
 import pytest
+from unittest.mock import patch
 
 from app.services.token_service import (
     get_or_create_token,
     get_token_status,
     can_generate,
     use_generation,
+    use_generations,
+    refund_generations,
     add_tokens
 )
+from tests.conftest import TestingSessionLocal
 
 
 class TestTokenService:
@@ -86,3 +90,55 @@ class TestTokenService:
         
         new_total = add_tokens(db, "device-1", 5)
         assert new_total == 15
+    
+    def test_use_generations_mixed(self, db):
+        """Test batch debit spends paid tokens then free trial."""
+        add_tokens(db, "device-1", 2)
+        
+        assert use_generations(db, "device-1", 4) == (2, 2)
+        
+        token = get_or_create_token(db, "device-1")
+        assert token.tokens_remaining == 0
+        assert token.free_trial_used == 2
+    
+    def test_use_generations_all_or_nothing(self, db):
+        """Test batch debit leaves balance untouched when insufficient."""
+        add_tokens(db, "device-1", 1)
+        
+        assert use_generations(db, "device-1", 5) is None
+        
+        token = get_or_create_token(db, "device-1")
+        assert token.tokens_remaining == 1
+        assert token.free_trial_used == 0
+    
+    def test_use_generations_rereads_after_concurrent_spend(self, db):
+        """Test a debit that races another spend is re-split instead of refused."""
+        add_tokens(db, "device-1", 3)
+        other = TestingSessionLocal()
+        original = db.refresh
+        
+        def refresh_then_race(instance):
+            original(instance)
+            if not calls:
+                calls.append(1)
+                assert use_generation(other, "device-1")
+        
+        calls = []
+        with patch.object(db, "refresh", refresh_then_race):
+            assert use_generations(db, "device-1", 4) == (2, 2)
+        other.close()
+        
+        token = get_or_create_token(db, "device-1")
+        db.refresh(token)
+        assert (token.tokens_remaining, token.free_trial_used) == (0, 2)
+    
+    def test_refund_generations(self, db):
+        """Test refunds restore paid tokens and free trial uses."""
+        add_tokens(db, "device-1", 2)
+        use_generations(db, "device-1", 4)
+        
+        refund_generations(db, "device-1", 1, 2)
+        
+        token = get_or_create_token(db, "device-1")
+        db.refresh(token)
+        assert (token.tokens_remaining, token.free_trial_used) == (1, 0)
@@ -0,0 +1,152 @@
+import json
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app import tracing
+from app.config import Settings
+from app.services.llm_service import generate_talk_starters
+from app.testing import FakeLLMServer, client_factory
+
+REMOTE_TRACE = "4bf92f3577b34da6a3ce929d0e0e4736"
+REMOTE_PARENT = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def spans_file(tmp_path):
+    """Export spans to a temporary file for the test."""
+    path = tmp_path / "spans.jsonl"
+    tracing.configure(enabled=True, path=str(path), sample_rate=1.0)
+    yield path
+    tracing.shutdown()
+
+
+def read_spans(path):
+    """Flush the exporter and return the spans this process wrote so far."""
+    tracing.shutdown()
+    path = Path(tracing.process_file(str(path)))
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestTraceparent:
+    """Test W3C traceparent parsing."""
+
+    def test_parses_valid_header(self):
+        """Test trace ID, parent ID and sampled flag are extracted."""
+        assert tracing.parse_traceparent(f"00-{REMOTE_TRACE}-{REMOTE_PARENT}-01") == (
+            REMOTE_TRACE, REMOTE_PARENT, True
+        )
+
+    def test_rejects_invalid_headers(self):
+        """Test malformed and all-zero IDs are ignored."""
+        assert tracing.parse_traceparent(None) is None
+        assert tracing.parse_traceparent("garbage") is None
+        assert tracing.parse_traceparent(f"00-{'0' * 32}-{REMOTE_PARENT}-01") is None
+
+
+class TestSpans:
+    """Test span trees and export."""
+
+    def test_nested_spans_share_trace(self, spans_file):
+        """Test child spans point at their parent within one trace."""
+        with tracing.span("outer", kind="test"):
+            with tracing.span("inner"):
+                pass
+
+        inner, outer = read_spans(spans_file)
+        assert outer["name"] == "outer"
+        assert outer["parent_id"] is None
+        assert outer["attributes"] == {"kind": "test"}
+        assert inner["trace_id"] == outer["trace_id"]
+        assert inner["parent_id"] == outer["span_id"]
+
+    def test_error_recorded(self, spans_file):
+        """Test a raising block marks its span as failed."""
+        with pytest.raises(ValueError):
+            with tracing.span("boom"):
+                raise ValueError("bad")
+
+        (span,) = read_spans(spans_file)
+        assert span["status"] == "error"
+        assert span["error"] == "ValueError: bad"
+
+    def test_unsampled_traces_not_written(self, tmp_path):
+        """Test a zero sample rate records nothing."""
+        path = tmp_path / "spans.jsonl"
+        tracing.configure(enabled=True, path=str(path), sample_rate=0.0)
+
+        with tracing.span("dropped"):
+            assert tracing.outbound_headers()["traceparent"].endswith("-00")
+
+        assert read_spans(path) == []
+
+    def test_file_per_process(self, tmp_path):
+        """Test each worker process writes its own file next to the configured path."""
+        tracing.configure(enabled=True, path=str(tmp_path / "spans.jsonl"), sample_rate=1.0)
+
+        with tracing.span("work"):
+            pass
+        tracing.shutdown()
+
+        assert [p.name for p in tmp_path.iterdir()] == [f"spans.{os.getpid()}.jsonl"]
+
+    def test_disabled_is_noop(self, tmp_path):
+        """Test no spans or headers are produced while tracing is off."""
+        path = tmp_path / "spans.jsonl"
+        tracing.configure(enabled=False, path=str(path))
+
+        with tracing.span("ignored") as span:
+            assert span is None
+            assert tracing.outbound_headers() == {}
+
+        assert not any(tmp_path.iterdir())
+
+
+class TestRequestTracing:
+    """Test spans around API requests."""
+
+    def test_request_span_tree(self, client, headers, spans_file):
+        """Test service spans are children of the request span."""
+        client.post("/api/v1/friends", json={"name": "Alice"}, headers=headers)
+
+        spans = read_spans(spans_file)
+        root = next(s for s in spans if s["parent_id"] is None)
+        assert root["name"] == "HTTP POST /api/v1/friends"
+        assert root["attributes"]["http.status_code"] == 201
+        children = {s["name"] for s in spans if s["parent_id"] == root["span_id"]}
+        assert "friend_service.create_friend" in children
+        assert all(s["trace_id"] == root["trace_id"] for s in spans)
+
+    def test_continues_incoming_trace(self, client, headers, spans_file):
+        """Test an incoming traceparent becomes the request span's parent."""
+        client.get(
+            "/api/v1/friends",
+            headers={**headers, "traceparent": f"00-{REMOTE_TRACE}-{REMOTE_PARENT}-01"}
+        )
+
+        spans = read_spans(spans_file)
+        root = next(s for s in spans if s["name"] == "HTTP GET /api/v1/friends")
+        assert root["trace_id"] == REMOTE_TRACE
+        assert root["parent_id"] == REMOTE_PARENT
+
+    @pytest.mark.asyncio
+    async def test_llm_request_propagates_context(self, spans_file):
+        """Test the outbound LLM call carries the current trace."""
+        server = FakeLLMServer()
+        settings = Settings(llm_proxy_key="test-key", llm_proxy_url="http://llm.test")
+        with patch('app.services.llm_service.get_settings', return_value=settings), \
+                patch('app.services.llm_service.httpx.AsyncClient', client_factory(server)):
+            with tracing.span("job"):
+                await generate_talk_starters("John", "friend", "Had coffee", "en")
+
+        spans = {s["name"]: s for s in read_spans(spans_file)}
+        request_span = spans["llm.request"]
+        assert server.requests[0]["headers"]["traceparent"] == (
+            f"00-{request_span['trace_id']}-{request_span['span_id']}-01"
+        )
+        assert request_span["parent_id"] == spans["llm.chat_completion"]["span_id"]
+        assert spans["llm.chat_completion"]["parent_id"] == spans["job"]["span_id"]
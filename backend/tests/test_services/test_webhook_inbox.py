@@ -0,0 +1,160 @@
+import pytest
+import json
+from datetime import datetime, timedelta
+
+from app.models import GenerationToken, PaymentTransaction, WebhookEvent
+from app.services import token_service
+from app.services.webhook_inbox import (
+    record_event,
+    process_batch,
+    retry_delay,
+    event_id_for,
+    WebhookWorker
+)
+from app.config import get_settings
+from tests.conftest import TestingSessionLocal
+
+
+def completed_event(checkout_id: str, event_id: str) -> bytes:
+    """Raw body of a checkout.completed webhook."""
+    return json.dumps({
+        "id": event_id,
+        "event_type": "checkout.completed",
+        "object": {"id": checkout_id, "metadata": {"device_id": "device-1", "product_sku": "starter"}}
+    }).encode()
+
+
+def add_transaction(db, checkout_id: str = "chk_1") -> PaymentTransaction:
+    """Store a pending checkout for device-1."""
+    transaction = PaymentTransaction(
+        device_id="device-1",
+        creem_checkout_id=checkout_id,
+        product_sku="starter",
+        tokens_granted=10,
+        amount_cents=499,
+        status="pending"
+    )
+    db.add(transaction)
+    db.commit()
+    return transaction
+
+
+def tokens(db) -> int:
+    """Paid tokens of device-1."""
+    db.expire_all()
+    token = db.query(GenerationToken).filter(GenerationToken.device_id == "device-1").first()
+    return token.tokens_remaining if token else 0
+
+
+class TestCompletePayment:
+    """Test idempotent payment completion."""
+
+    def test_complete_once(self, db):
+        """Test completing twice grants tokens once."""
+        add_transaction(db)
+
+        assert token_service.complete_payment(db, "chk_1") is True
+        assert token_service.complete_payment(db, "chk_1") is False
+        assert tokens(db) == 10
+
+    def test_unknown_checkout(self, db):
+        """Test an unknown checkout reports None."""
+        assert token_service.complete_payment(db, "chk_missing") is None
+
+
+class TestInbox:
+    """Test inbox storage and batch processing."""
+
+    def test_event_id_fallback(self):
+        """Test events without an ID are keyed by body hash."""
+        assert event_id_for({"id": "evt_1"}, b"{}") == "evt_1"
+        assert event_id_for({}, b"{}").startswith("sha256:")
+
+    def test_record_dedup(self, db):
+        """Test the same event ID is stored once."""
+        body = completed_event("chk_1", "evt_1")
+
+        assert record_event(db, "evt_1", "checkout.completed", body) is True
+        assert record_event(db, "evt_1", "checkout.completed", body) is False
+        assert db.query(WebhookEvent).count() == 1
+
+    def test_process_grants_tokens(self, db):
+        """Test processing applies the payment and marks the event done."""
+        add_transaction(db)
+        record_event(db, "evt_1", "checkout.completed", completed_event("chk_1", "evt_1"))
+
+        assert process_batch(db) == 1
+
+        event = db.query(WebhookEvent).one()
+        assert event.status == "processed"
+        assert event.processed_at is not None
+        assert tokens(db) == 10
+        assert db.query(PaymentTransaction).one().status == "completed"
+
+    def test_distinct_events_same_checkout(self, db):
+        """Test two events for one checkout grant tokens once."""
+        add_transaction(db)
+        record_event(db, "evt_1", "checkout.completed", completed_event("chk_1", "evt_1"))
+        record_event(db, "evt_2", "checkout.completed", completed_event("chk_1", "evt_2"))
+
+        process_batch(db)
+
+        assert tokens(db) == 10
+        assert db.query(WebhookEvent).filter(WebhookEvent.status == "processed").count() == 2
+
+    def test_retry_with_backoff(self, db):
+        """Test a failing event is rescheduled and succeeds once it can."""
+        record_event(db, "evt_1", "checkout.completed", completed_event("chk_1", "evt_1"))
+
+        process_batch(db)
+        event = db.query(WebhookEvent).one()
+        assert event.status == "pending"
+        assert event.attempts == 1
+        assert "chk_1" in event.last_error
+        assert event.next_attempt_at > datetime.utcnow()
+
+        # Not due yet
+        add_transaction(db)
+        assert process_batch(db) == 0
+
+        event.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        assert process_batch(db) == 1
+        assert db.query(WebhookEvent).one().status == "processed"
+        assert tokens(db) == 10
+
+    def test_backoff_doubles_and_caps(self):
+        """Test the retry delay doubles per attempt up to the cap."""
+        settings = get_settings()
+        assert retry_delay(2) == 2 * retry_delay(1)
+        assert retry_delay(100) == settings.webhook_retry_max_seconds
+
+    def test_gives_up_after_max_attempts(self, db):
+        """Test an event that keeps failing ends up failed."""
+        settings = get_settings()
+        record_event(db, "evt_1", "checkout.completed", completed_event("chk_1", "evt_1"))
+
+        for _ in range(settings.webhook_max_attempts):
+            db.query(WebhookEvent).update({WebhookEvent.next_attempt_at: datetime.utcnow()})
+            db.commit()
+            process_batch(db)
+
+        event = db.query(WebhookEvent).one()
+        assert event.status == "failed"
+        assert event.attempts == settings.webhook_max_attempts
+
+
+class TestWebhookWorker:
+    """Test the background inbox worker."""
+
+    @pytest.mark.asyncio
+    async def test_drain_in_batches(self, db):
+        """Test drain keeps pulling batches until nothing is due."""
+        for i in range(5):
+            add_transaction(db, f"chk_{i}")
+            record_event(db, f"evt_{i}", "checkout.completed", completed_event(f"chk_{i}", f"evt_{i}"))
+
+        worker = WebhookWorker(session_factory=TestingSessionLocal, batch_size=2)
+
+        assert await worker.drain() == 5
+        assert tokens(db) == 50
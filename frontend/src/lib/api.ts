@@ -45,6 +45,34 @@ interface TalkStarters {
   context_used: string
 }
 
+interface TalkStartersBatch {
+  results: (TalkStarters & { friend_id: number })[]
+}
+
+// Pushed by /events; resync means events were missed and data should be refetched
+export type ChangeEventType =
+  | 'friend.created'
+  | 'friend.updated'
+  | 'friend.deleted'
+  | 'interaction.created'
+  | 'health.transition'
+  | 'resync'
+
+export interface ChangeEvent {
+  type: ChangeEventType
+  friend_id?: number
+  status?: string
+}
+
+const CHANGE_EVENT_TYPES: ChangeEventType[] = [
+  'friend.created',
+  'friend.updated',
+  'friend.deleted',
+  'interaction.created',
+  'health.transition',
+  'resync'
+]
+
 async function handleResponse<T>(response: Response): Promise<T> {
   if (!response.ok) {
     const data = await response.json().catch(() => ({}))
@@ -124,6 +152,25 @@ export const api = {
     return handleResponse<Interaction>(response)
   },
 
+  // Live updates; returns a function that closes the stream
+  subscribeEvents: (deviceId: string, onEvent: (event: ChangeEvent) => void): (() => void) => {
+    // EventSource cannot send headers, so the device ID goes in the query
+    const source = new EventSource(`${API_BASE}/events?device_id=${encodeURIComponent(deviceId)}`)
+    let connected = false
+    source.onopen = () => {
+      // Events sent while reconnecting were missed
+      if (connected) onEvent({ type: 'resync' })
+      connected = true
+    }
+    for (const type of CHANGE_EVENT_TYPES) {
+      source.addEventListener(type, (message) => {
+        const data = JSON.parse((message as MessageEvent).data || '{}')
+        onEvent({ ...data, type })
+      })
+    }
+    return () => source.close()
+  },
+
   // Talk Starters
   getTalkStarters: async (deviceId: string, friendId: number, language: string): Promise<TalkStarters> => {
     const response = await fetch(`${API_BASE}/talk-starters`, {
@@ -137,6 +184,18 @@ export const api = {
     return handleResponse<TalkStarters>(response)
   },
 
+  getTalkStartersBatch: async (deviceId: string, friendIds: number[], language: string): Promise<TalkStartersBatch> => {
+    const response = await fetch(`${API_BASE}/talk-starters/batch`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-Device-Id': deviceId
+      },
+      body: JSON.stringify({ friend_ids: friendIds, language })
+    })
+    return handleResponse<TalkStartersBatch>(response)
+  },
+
   // Tokens
   getTokens: async (deviceId: string): Promise<TokenStatus> => {
     const response = await fetch(`${API_BASE}/tokens`, {
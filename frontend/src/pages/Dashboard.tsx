@@ -50,6 +50,19 @@ export default function Dashboard() {
     }
 
     loadData()
+
+    // Refetch when something changes instead of polling; bursts of events
+    // (e.g. a batch of interactions) cause a single refetch
+    let timer: ReturnType<typeof setTimeout> | undefined
+    const unsubscribe = api.subscribeEvents(deviceId, () => {
+      clearTimeout(timer)
+      timer = setTimeout(loadData, 300)
+    })
+
+    return () => {
+      clearTimeout(timer)
+      unsubscribe()
+    }
   }, [deviceId, t])
 
   if (isLoading) {
@@ -180,4 +180,51 @@ describe('API', () => {
       await expect(api.deleteFriend('device-1', 1)).rejects.toThrow('Failed to delete friend')
     })
   })
+
+  describe('subscribeEvents', () => {
+    class FakeEventSource {
+      static last: FakeEventSource
+      url: string
+      onopen: (() => void) | null = null
+      listeners: Record<string, (message: { data: string }) => void> = {}
+      close = vi.fn()
+
+      constructor(url: string) {
+        this.url = url
+        FakeEventSource.last = this
+      }
+
+      addEventListener(type: string, listener: (message: { data: string }) => void) {
+        this.listeners[type] = listener
+      }
+    }
+
+    beforeEach(() => {
+      vi.stubGlobal('EventSource', FakeEventSource)
+    })
+
+    it('passes events with their type and closes', () => {
+      const onEvent = vi.fn()
+      const close = api.subscribeEvents('device 1', onEvent)
+      const source = FakeEventSource.last
+
+      expect(source.url).toBe('/api/v1/events?device_id=device%201')
+      source.listeners['interaction.created']({ data: '{"friend_id": 3}' })
+      expect(onEvent).toHaveBeenCalledWith({ type: 'interaction.created', friend_id: 3 })
+
+      close()
+      expect(source.close).toHaveBeenCalled()
+    })
+
+    it('asks for a resync after reconnecting', () => {
+      const onEvent = vi.fn()
+      api.subscribeEvents('device-1', onEvent)
+      const source = FakeEventSource.last
+
+      source.onopen?.()
+      expect(onEvent).not.toHaveBeenCalled()
+      source.onopen?.()
+      expect(onEvent).toHaveBeenCalledWith({ type: 'resync' })
+    })
+  })
 })